@@ -5,7 +5,9 @@ from fastapi import APIRouter, HTTPException, status, Depends
 from datetime import datetime
 
 from app.auth.schemas import UserRegister, UserLogin, Token, UserResponse, UserUpdate
-from app.auth.utils import get_password_hash, verify_password, create_access_token, get_current_user
+from app.auth.utils import (
+    ahash_password, averify_password, create_access_token, get_current_user, invalidate_cached_user
+)
 from app.core.mongodb import users_collection
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -25,7 +27,7 @@ async def register(user_data: UserRegister):
         )
     
     # Créer le nouvel utilisateur
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await ahash_password(user_data.password)
     
     new_user = {
         "prenom": user_data.prenom,
@@ -65,16 +67,26 @@ async def login(user_credentials: UserLogin):
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Vérifier le mot de passe
-    if not verify_password(user_credentials.password, user["hashed_password"]):
+    # Vérifier le mot de passe (bcrypt hors de la boucle d'événements)
+    valid, new_hash = await averify_password(user_credentials.password, user["hashed_password"])
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou mot de passe incorrect",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Coût bcrypt modifié depuis le dernier hash : enregistrer le nouveau
+    if new_hash:
+        await users_collection.update_one(
+            {"_id": user["_id"]},
+            {"$set": {"hashed_password": new_hash, "updated_at": datetime.utcnow()}}
+        )
+        invalidate_cached_user(user["email"])
+    
     # Créer le token JWT
-    access_token = create_access_token(data={"sub": user["email"]})
+    # L'id (claim "uid") permet à get_current_user_id de se passer de la base
+    access_token = create_access_token(data={"sub": user["email"], "uid": str(user["_id"])})
     
     return Token(access_token=access_token, token_type="bearer")
 
@@ -125,6 +137,11 @@ async def update_current_user(
         {"$set": update_data}
     )
     
+    # Les requêtes suivantes doivent voir le profil à jour
+    invalidate_cached_user(current_user["email"])
+    if user_data.email:
+        invalidate_cached_user(user_data.email)
+    
     updated_user = await users_collection.find_one({"_id": current_user["_id"]})
     
     return UserResponse(
@@ -3,7 +3,7 @@ Utilitaires pour l'authentification
 """
 import os
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
@@ -11,6 +11,8 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 
 from app.auth.schemas import TokenData
+from app.core.cache import LRUCache
+from app.core.concurrency import password_executor, run_in_executor
 from app.core.mongodb import users_collection
 
 load_dotenv("../.env")
@@ -20,21 +22,53 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-this-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 jours
 
-# Context pour le hashing de mot de passe
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Cache des utilisateurs authentifiés (par sujet du token), pour éviter un find_one par requête
+USER_CACHE_TTL_SECONDS = float(os.getenv("AUTH_USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_SIZE = int(os.getenv("AUTH_USER_CACHE_SIZE", "10000"))
+
+# Mode "claims signés" : l'id de l'utilisateur contenu dans le token (claim "uid") est
+# accepté sans lecture en base par get_current_user_id. Un compte supprimé garde alors
+# l'accès à ces routes jusqu'à l'expiration de son token.
+SIGNED_CLAIMS = os.getenv("AUTH_SIGNED_CLAIMS", "false").lower() == "true"
+
+# Coût bcrypt (2^rounds itérations) : chaque +1 double le temps de calcul
+BCRYPT_ROUNDS = int(os.getenv("AUTH_BCRYPT_ROUNDS", "12"))
+
+# Context pour le hashing de mot de passe. min/max_rounds : un hash d'un autre coût
+# est signalé par needs_update et refait à la connexion suivante
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS
+)
 
 # Security scheme
 security = HTTPBearer()
 
+# Utilisateurs récemment authentifiés (email -> document utilisateur)
+user_cache = LRUCache(max_size=USER_CACHE_SIZE, ttl_seconds=USER_CACHE_TTL_SECONDS)
+
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Vérifie si le mot de passe correspond au hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+async def ahash_password(password: str) -> str:
+    """Hash un mot de passe dans le pool dédié (sans bloquer la boucle d'événements)"""
+    return await run_in_executor(password_executor, pwd_context.hash, password)
 
 
-def get_password_hash(password: str) -> str:
-    """Hash un mot de passe"""
-    return pwd_context.hash(password)
+async def averify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Vérifie un mot de passe dans le pool dédié et, s'il est correct mais haché avec
+    un autre coût que AUTH_BCRYPT_ROUNDS, calcule le nouveau hash
+
+    Args:
+        plain_password: Mot de passe saisi
+        hashed_password: Hash enregistré
+
+    Returns:
+        Tuple (mot de passe correct, nouveau hash à enregistrer ou None)
+    """
+    return await run_in_executor(password_executor, pwd_context.verify_and_update, plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -52,8 +86,19 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Récupère l'utilisateur courant depuis le token JWT"""
+def decode_access_token(token: str) -> dict:
+    """
+    Vérifie la signature et l'expiration d'un token JWT
+
+    Args:
+        token: Token JWT (Bearer)
+
+    Returns:
+        Les claims du token
+
+    Raises:
+        HTTPException: 401 si le token est invalide ou sans sujet
+    """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -61,21 +106,57 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     )
     
     try:
-        token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        
-        if email is None:
-            raise credentials_exception
-            
-        token_data = TokenData(email=email)
-        
     except JWTError:
         raise credentials_exception
     
-    user = await users_collection.find_one({"email": token_data.email})
+    if payload.get("sub") is None:
+        raise credentials_exception
     
+    return payload
+
+
+def invalidate_cached_user(email: str):
+    """Retire un utilisateur du cache (après modification de son profil)"""
+    user_cache.invalidate(email)
+
+
+async def _load_user(email: str) -> dict:
+    """Lit l'utilisateur d'un token (cache puis MongoDB) ; 401 s'il n'existe plus"""
+    user = user_cache.get(email)
     if user is None:
-        raise credentials_exception
+        user = await users_collection.find_one({"email": email})
+        
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Could not validate credentials",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        
+        user_cache.put(email, user)
+    
+    # Copie : une route qui modifie l'utilisateur ne doit pas altérer le cache
+    return dict(user)
+
+
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Récupère l'utilisateur courant depuis le token JWT (mis en cache quelques secondes)"""
+    payload = decode_access_token(credentials.credentials)
+    token_data = TokenData(email=payload.get("sub"))
+    return await _load_user(token_data.email)
+
+
+async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """
+    Récupère seulement l'id de l'utilisateur courant, pour les routes qui n'ont pas
+    besoin du reste de son profil. En mode claims signés (AUTH_SIGNED_CLAIMS=true),
+    l'id est lu dans le token sans accès à la base ; sinon (ou pour les anciens
+    tokens sans claim "uid"), il vient de l'utilisateur chargé comme dans get_current_user.
+    """
+    payload = decode_access_token(credentials.credentials)
+    if SIGNED_CLAIMS and payload.get("uid"):
+        return payload["uid"]
     
-    return user
+    user = await _load_user(payload["sub"])
+    return str(user["_id"])
@@ -0,0 +1,124 @@
+"""
+Cache de la configuration des chatbots publics (lien de partage / widget)
+
+Chaque chargement du widget et chaque message lisaient tout le document du chatbot
+(avec la liste `documents`, qui grossit à chaque upload) par `share_token`. Seuls
+quelques champs servent : ils sont lus avec une projection, gardés `public_chatbot_cache_ttl_seconds`
+et invalidés explicitement quand le chatbot ou ses documents changent.
+"""
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.cache import LRUCache
+from app.core.config import config
+from app.core.mongodb import chatbots_collection
+
+# Champs lus pour un chatbot public : au plus un élément de `documents` (présence seulement)
+PUBLIC_CHATBOT_PROJECTION = {
+    "name": 1,
+    "description": 1,
+    "system_prompt": 1,
+    "documents": {"$slice": 1}
+}
+
+
+class PublicChatbotConfig:
+    """Configuration compacte d'un chatbot public"""
+
+    __slots__ = ("id", "name", "description", "system_prompt", "has_documents")
+
+    def __init__(
+        self,
+        id: str,
+        name: str,
+        description: Optional[str],
+        system_prompt: Optional[str],
+        has_documents: bool
+    ):
+        """
+        Args:
+            id: ID du chatbot
+            name: Nom affiché par le widget
+            description: Description affichée par le widget
+            system_prompt: Prompt système personnalisé (None : celui de la config)
+            has_documents: Au moins un document est enregistré
+        """
+        self.id = id
+        self.name = name
+        self.description = description
+        self.system_prompt = system_prompt
+        self.has_documents = has_documents
+
+
+class PublicChatbotCache:
+    """Cache share_token -> PublicChatbotConfig, avec TTL et invalidation par chatbot"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        """
+        Initialise le cache
+
+        Args:
+            max_entries: Nombre maximal de chatbots en cache
+            ttl_seconds: Durée de vie d'une entrée
+        """
+        self.max_entries = max_entries
+        self._cache = LRUCache(max_size=max_entries, ttl_seconds=ttl_seconds)
+        # chatbot_id -> share_token, pour invalider depuis les routes qui ne connaissent que l'id
+        # (borné comme le cache : le plus ancien token est oublié des deux côtés)
+        self._tokens: "OrderedDict[str, str]" = OrderedDict()
+
+    async def get(self, share_token: str) -> Optional[PublicChatbotConfig]:
+        """
+        Retourne la configuration du chatbot d'un lien de partage
+
+        Args:
+            share_token: Token de partage
+
+        Returns:
+            La configuration, ou None si aucun chatbot n'a ce token
+        """
+        chatbot_config = self._cache.get(share_token)
+        if chatbot_config is not None:
+            return chatbot_config
+
+        chatbot = await chatbots_collection.find_one({"share_token": share_token}, PUBLIC_CHATBOT_PROJECTION)
+        if chatbot is None:
+            return None
+
+        chatbot_id = str(chatbot["_id"])
+        chatbot_config = PublicChatbotConfig(
+            id=chatbot_id,
+            name=chatbot["name"],
+            description=chatbot.get("description"),
+            system_prompt=chatbot.get("system_prompt"),
+            has_documents=bool(chatbot.get("documents"))
+        )
+        self._tokens[chatbot_id] = share_token
+        self._tokens.move_to_end(chatbot_id)
+        while len(self._tokens) > self.max_entries:
+            _, oldest_token = self._tokens.popitem(last=False)
+            self._cache.invalidate(oldest_token)
+        self._cache.put(share_token, chatbot_config)
+        return chatbot_config
+
+    def invalidate(self, chatbot_id: str):
+        """
+        Oublie la configuration d'un chatbot (modifié, supprimé, documents ajoutés ou retirés)
+
+        Args:
+            chatbot_id: ID du chatbot
+        """
+        share_token = self._tokens.pop(chatbot_id, None)
+        if share_token is not None:
+            self._cache.invalidate(share_token)
+
+    def get_stats(self) -> dict:
+        """Retourne les compteurs du cache"""
+        return self._cache.get_stats()
+
+
+# Instance globale du cache des chatbots publics
+public_chatbot_cache = PublicChatbotCache(
+    max_entries=config.public_chatbot_cache_size,
+    ttl_seconds=config.public_chatbot_cache_ttl_seconds
+)
@@ -11,24 +11,32 @@ import secrets
 
 from app.chatbots.schemas import (
     ChatbotCreate, ChatbotUpdate, ChatbotResponse, 
-    ChatbotQueryRequest, ChatbotQueryResponse,
-    DocumentInfo, ConversationMessage
+    ChatbotQueryRequest, ChatbotQueryResponse, ChatbotBatchQueryRequest, PublicChatbotResponse,
+    DocumentInfo, ConversationMessage, IngestionJobResponse
 )
-from app.auth.utils import get_current_user
-from app.core.mongodb import chatbots_collection, conversations_collection
+from app.auth.utils import get_current_user_id
+from app.chatbots.public_cache import public_chatbot_cache
+from app.core.mongodb import chatbots_collection, conversations_collection, ingestion_jobs_collection
 from app.documents.services.document_indexer import DocumentIndexer
 from app.documents.services.rag_service import RAGService
-from app.core.config import settings
+from app.documents.services.response_cache import response_cache
+from app.documents.services.ingestion_jobs import ingestion_queue
+from app.core.config import config, settings
 from app.core.cost_calculator import calculate_cost
+from app.core.concurrency import retrieval_executor, run_in_executor
+from app.core.write_buffer import write_buffer
 import os
 
 router = APIRouter(prefix="/chatbots", tags=["chatbots"])
 
+# Champs lus par les routes de requête (la liste `documents` peut être longue)
+QUERY_PROJECTION = {"system_prompt": 1}
+
 
 @router.post("", response_model=ChatbotResponse, status_code=status.HTTP_201_CREATED)
 async def create_chatbot(
     chatbot_data: ChatbotCreate,
-    current_user: dict = Depends(get_current_user)
+    current_user_id: str = Depends(get_current_user_id)
 ):
     """
     Créer un nouveau chatbot pour l'utilisateur connecté
@@ -40,7 +48,8 @@ async def create_chatbot(
         "name": chatbot_data.name,
         "description": chatbot_data.description,
         "system_prompt": chatbot_data.system_prompt or settings.DEFAULT_SYSTEM_PROMPT,
-        "user_id": str(current_user["_id"]),
+        "index_type": chatbot_data.index_type,
+        "user_id": current_user_id,
         "share_token": share_token,
         "documents": [],
         "total_prompt_tokens": 0,
@@ -53,6 +62,11 @@ async def create_chatbot(
     result = await chatbots_collection.insert_one(new_chatbot)
     created_chatbot = await chatbots_collection.find_one({"_id": result.inserted_id})
     
+    if chatbot_data.index_type:
+        await run_in_executor(
+            retrieval_executor, _set_index_type, str(result.inserted_id), chatbot_data.index_type
+        )
+    
     # Générer les liens de partage
     base_url = settings.FRONTEND_URL or "http://localhost:5173"
     share_link = f"{base_url}/chat/{share_token}"
@@ -71,6 +85,7 @@ async def create_chatbot(
         name=created_chatbot["name"],
         description=created_chatbot.get("description"),
         system_prompt=created_chatbot.get("system_prompt"),
+        index_type=created_chatbot.get("index_type"),
         user_id=created_chatbot["user_id"],
         share_link=share_link,
         widget_link=widget_link,
@@ -85,12 +100,17 @@ async def create_chatbot(
     )
 
 
+def _set_index_type(chatbot_id: str, index_type: str):
+    """Applique le type d'index choisi à l'index FAISS du chatbot (exécuté dans un thread)"""
+    DocumentIndexer(chatbot_id).set_index_type(index_type)
+
+
 @router.get("", response_model=List[ChatbotResponse])
-async def list_chatbots(current_user: dict = Depends(get_current_user)):
+async def list_chatbots(current_user_id: str = Depends(get_current_user_id)):
     """
     Lister tous les chatbots de l'utilisateur connecté
     """
-    chatbots_cursor = chatbots_collection.find({"user_id": str(current_user["_id"])})
+    chatbots_cursor = chatbots_collection.find({"user_id": current_user_id})
     chatbots = await chatbots_cursor.to_list(length=100)
     
     base_url = settings.FRONTEND_URL or "http://localhost:5173"
@@ -125,6 +145,7 @@ async def list_chatbots(current_user: dict = Depends(get_current_user)):
             name=chatbot["name"],
             description=chatbot.get("description"),
             system_prompt=chatbot.get("system_prompt"),
+            index_type=chatbot.get("index_type"),
             user_id=chatbot["user_id"],
             share_link=share_link,
             widget_link=widget_link,
@@ -144,7 +165,7 @@ async def list_chatbots(current_user: dict = Depends(get_current_user)):
 @router.get("/{chatbot_id}", response_model=ChatbotResponse)
 async def get_chatbot(
     chatbot_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user_id: str = Depends(get_current_user_id)
 ):
     """
     Récupérer un chatbot spécifique
@@ -152,7 +173,7 @@ async def get_chatbot(
     try:
         chatbot = await chatbots_collection.find_one({
             "_id": ObjectId(chatbot_id),
-            "user_id": str(current_user["_id"])
+            "user_id": current_user_id
         })
     except Exception:
         raise HTTPException(
@@ -195,6 +216,7 @@ async def get_chatbot(
         name=chatbot["name"],
         description=chatbot.get("description"),
         system_prompt=chatbot.get("system_prompt"),
+        index_type=chatbot.get("index_type"),
         user_id=chatbot["user_id"],
         share_link=share_link,
         widget_link=widget_link,
@@ -213,7 +235,7 @@ async def get_chatbot(
 async def update_chatbot(
     chatbot_id: str,
     chatbot_data: ChatbotUpdate,
-    current_user: dict = Depends(get_current_user)
+    current_user_id: str = Depends(get_current_user_id)
 ):
     """
     Mettre à jour un chatbot
@@ -221,7 +243,7 @@ async def update_chatbot(
     try:
         chatbot = await chatbots_collection.find_one({
             "_id": ObjectId(chatbot_id),
-            "user_id": str(current_user["_id"])
+            "user_id": current_user_id
         })
     except Exception:
         raise HTTPException(
@@ -243,11 +265,18 @@ async def update_chatbot(
         update_data["description"] = chatbot_data.description
     if chatbot_data.system_prompt is not None:
         update_data["system_prompt"] = chatbot_data.system_prompt
+    if chatbot_data.index_type is not None:
+        update_data["index_type"] = chatbot_data.index_type
     
     await chatbots_collection.update_one(
         {"_id": ObjectId(chatbot_id)},
         {"$set": update_data}
     )
+    public_chatbot_cache.invalidate(chatbot_id)
+    
+    # Changer le type d'index peut reconstruire l'index FAISS (hors boucle d'événements)
+    if chatbot_data.index_type is not None and chatbot_data.index_type != chatbot.get("index_type"):
+        await run_in_executor(retrieval_executor, _set_index_type, chatbot_id, chatbot_data.index_type)
     
     updated_chatbot = await chatbots_collection.find_one({"_id": ObjectId(chatbot_id)})
     
@@ -280,6 +309,7 @@ async def update_chatbot(
         name=updated_chatbot["name"],
         description=updated_chatbot.get("description"),
         system_prompt=updated_chatbot.get("system_prompt"),
+        index_type=updated_chatbot.get("index_type"),
         user_id=updated_chatbot["user_id"],
         share_link=share_link,
         widget_link=widget_link,
@@ -294,10 +324,15 @@ async def update_chatbot(
     )
 
 
+def _delete_chatbot_index(chatbot_id: str):
+    """Supprime l'index d'un chatbot (exécuté dans un thread)"""
+    DocumentIndexer(chatbot_id).delete_index()
+
+
 @router.delete("/{chatbot_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_chatbot(
     chatbot_id: str,
-    current_user: dict = Depends(get_current_user)
+    current_user_id: str = Depends(get_current_user_id)
 ):
     """
     Supprimer un chatbot
@@ -305,7 +340,7 @@ async def delete_chatbot(
     try:
         chatbot = await chatbots_collection.find_one({
             "_id": ObjectId(chatbot_id),
-            "user_id": str(current_user["_id"])
+            "user_id": current_user_id
         })
     except Exception:
         raise HTTPException(
@@ -321,31 +356,38 @@ async def delete_chatbot(
     
     # Supprimer le chatbot
     await chatbots_collection.delete_one({"_id": ObjectId(chatbot_id)})
+    public_chatbot_cache.invalidate(chatbot_id)
     
-    # Supprimer les conversations associées
+    # Supprimer les conversations associées (y compris celles pas encore écrites)
+    write_buffer.discard_chatbot(chatbot_id)
     await conversations_collection.delete_many({"chatbot_id": chatbot_id})
     
-    # Supprimer l'index FAISS associé si existe
-    index_path = os.path.join(settings.FAISS_INDEX_PATH, f"{chatbot_id}.faiss")
-    if os.path.exists(index_path):
-        os.remove(index_path)
+    # Supprimer l'index FAISS (segments, chunk store, cache) hors boucle d'événements
+    async with ingestion_queue.index_lock(chatbot_id):
+        await run_in_executor(retrieval_executor, _delete_chatbot_index, chatbot_id)
+    response_cache.invalidate(chatbot_id)
 
 
-@router.post("/{chatbot_id}/documents", response_model=ChatbotResponse)
+@router.post(
+    "/{chatbot_id}/documents",
+    response_model=IngestionJobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
 async def upload_document_to_chatbot(
     chatbot_id: str,
     file: UploadFile = File(...),
     chunk_size: int = Form(1000),
     chunk_overlap: int = Form(200),
-    current_user: dict = Depends(get_current_user)
+    current_user_id: str = Depends(get_current_user_id)
 ):
     """
-    Uploader et indexer un document pour un chatbot spécifique
+    Uploader un document pour un chatbot spécifique.
+    L'indexation est faite en arrière-plan : suivre sa progression via /jobs/{job_id}
     """
     try:
         chatbot = await chatbots_collection.find_one({
             "_id": ObjectId(chatbot_id),
-            "user_id": str(current_user["_id"])
+            "user_id": current_user_id
         })
     except Exception:
         raise HTTPException(
@@ -359,81 +401,251 @@ async def upload_document_to_chatbot(
             detail="Chatbot non trouvé"
         )
     
+    file_path = _document_path(chatbot_id, file.filename)
+    # Un second upload du même nom ajouterait une entrée en double : passer par PUT
+    if any(doc["filename"] == file.filename for doc in chatbot.get("documents", [])):
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Un document porte déjà ce nom (utilisez PUT pour le remplacer)"
+        )
+    
     # Créer le dossier pour ce chatbot
-    chatbot_upload_dir = os.path.join(settings.UPLOAD_DIR, chatbot_id)
-    os.makedirs(chatbot_upload_dir, exist_ok=True)
-    
-    # Sauvegarder le fichier
-    file_path = os.path.join(chatbot_upload_dir, file.filename)
-    with open(file_path, "wb") as f:
-        content = await file.read()
-        f.write(content)
-    
-    # Indexer le document
-    indexer = DocumentIndexer(chatbot_id)
-    indexation_result = indexer.index_document(
-        file_path,
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    
+    # Sauvegarder le fichier (par blocs, sans le charger en mémoire)
+    await _save_upload(file, file_path)
+    
+    # Créer le job d'indexation (exécuté par le pool de workers)
+    job = await ingestion_queue.enqueue(
+        chatbot_id=chatbot_id,
+        user_id=current_user_id,
+        filename=file.filename,
+        file_path=file_path,
         chunk_size=chunk_size,
         chunk_overlap=chunk_overlap
     )
     
-    # Ajouter le document à la liste des documents du chatbot
-    document_info = {
-        "filename": file.filename,
-        "upload_date": datetime.now(),
-        "chunks_count": indexation_result["chunks_created"]
-    }
+    return _job_to_response(job)
+
+
+async def _save_upload(file: UploadFile, file_path: str):
+    """
+    Écrit un fichier uploadé sur le disque par blocs de `upload_read_size_kb`,
+    en refusant les fichiers plus gros que `max_file_size_mb`
     
-    await chatbots_collection.update_one(
-        {"_id": ObjectId(chatbot_id)},
-        {
-            "$push": {"documents": document_info},
-            "$set": {"updated_at": datetime.now()}
-        }
-    )
+    Args:
+        file: Fichier reçu
+        file_path: Chemin de destination
+    """
+    max_size = config.max_file_size_mb * 1024 * 1024
+    read_size = config.upload_read_size_kb * 1024
+    written = 0
+    try:
+        with open(file_path, "wb") as f:
+            while True:
+                block = await file.read(read_size)
+                if not block:
+                    break
+                written += len(block)
+                if written > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Fichier trop volumineux. Taille maximale: {config.max_file_size_mb}MB"
+                    )
+                f.write(block)
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+
+
+def _document_path(chatbot_id: str, filename: str) -> str:
+    """Chemin d'un document uploadé (refuse les noms qui sortent du dossier du chatbot)"""
+    if not filename or filename in (".", "..") or os.path.basename(filename) != filename:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Nom de fichier invalide"
+        )
+    return os.path.join(settings.UPLOAD_DIR, chatbot_id, filename)
+
+
+def _delete_document_chunks(chatbot_id: str, filename: str) -> int:
+    """Retire les vecteurs d'un document de l'index du chatbot (exécuté dans un thread)"""
+    return DocumentIndexer(chatbot_id).delete_document(filename)
+
+
+async def _remove_document(chatbot_id: str, filename: str):
+    """Retire un document de l'index FAISS et de la liste des documents du chatbot"""
+    async with ingestion_queue.index_lock(chatbot_id):
+        removed_chunks = await run_in_executor(
+            retrieval_executor, _delete_document_chunks, chatbot_id, filename
+        )
+        await chatbots_collection.update_one(
+            {"_id": ObjectId(chatbot_id)},
+            {
+                "$pull": {"documents": {"filename": filename}},
+                "$set": {"updated_at": datetime.utcnow()}
+            }
+        )
+        public_chatbot_cache.invalidate(chatbot_id)
+    print(f"🗑️  Document {filename} retiré du chatbot {chatbot_id} ({removed_chunks} chunks)")
+
+
+@router.delete("/{chatbot_id}/documents/{filename}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_document_from_chatbot(
+    chatbot_id: str,
+    filename: str,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """
+    Supprimer un document d'un chatbot : ses vecteurs sont retirés de l'index
+    sans reconstruire celui-ci, puis le fichier uploadé est supprimé
+    """
+    try:
+        chatbot = await chatbots_collection.find_one({
+            "_id": ObjectId(chatbot_id),
+            "user_id": current_user_id
+        })
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ID de chatbot invalide"
+        )
     
-    updated_chatbot = await chatbots_collection.find_one({"_id": ObjectId(chatbot_id)})
+    if not chatbot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chatbot non trouvé"
+        )
     
-    documents = [
-        DocumentInfo(
-            filename=doc["filename"],
-            upload_date=doc["upload_date"],
-            chunks_count=doc.get("chunks_count")
+    file_path = _document_path(chatbot_id, filename)
+    if not any(doc["filename"] == filename for doc in chatbot.get("documents", [])):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document non trouvé"
         )
-        for doc in updated_chatbot.get("documents", [])
-    ]
     
-    # Générer les liens de partage
-    base_url = settings.FRONTEND_URL or "http://localhost:5173"
-    share_link = None
-    widget_link = None
-    embed_code = None
-    if updated_chatbot.get("share_token"):
-        share_link = f"{base_url}/chat/{updated_chatbot['share_token']}"
-        widget_link = f"{base_url}/widget/{updated_chatbot['share_token']}"
-        embed_code = f'<iframe src="{widget_link}" width="100%" height="600" frameborder="0" style="border-radius: 10px;"></iframe>'
+    await _remove_document(chatbot_id, filename)
     
-    # Calculer le coût estimé
-    prompt_tokens = updated_chatbot.get("total_prompt_tokens", 0)
-    completion_tokens = updated_chatbot.get("total_completion_tokens", 0)
-    estimated_cost = calculate_cost(prompt_tokens, completion_tokens)
+    if os.path.exists(file_path):
+        os.remove(file_path)
+
+
+@router.put(
+    "/{chatbot_id}/documents/{filename}",
+    response_model=IngestionJobResponse,
+    status_code=status.HTTP_202_ACCEPTED
+)
+async def replace_document_in_chatbot(
+    chatbot_id: str,
+    filename: str,
+    file: UploadFile = File(...),
+    chunk_size: int = Form(1000),
+    chunk_overlap: int = Form(200),
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """
+    Remplacer un document : la nouvelle version est indexée en arrière-plan (les chunks
+    inchangés ne sont pas recalculés), puis l'ancienne est retirée. Jusque-là, et si
+    l'indexation échoue, l'ancienne version reste en place. Suivre la progression via /jobs/{job_id}
+    """
+    try:
+        chatbot = await chatbots_collection.find_one({
+            "_id": ObjectId(chatbot_id),
+            "user_id": current_user_id
+        })
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ID de chatbot invalide"
+        )
     
-    return ChatbotResponse(
-        id=str(updated_chatbot["_id"]),
-        name=updated_chatbot["name"],
-        description=updated_chatbot.get("description"),
-        system_prompt=updated_chatbot.get("system_prompt"),
-        user_id=updated_chatbot["user_id"],
-        share_link=share_link,
-        widget_link=widget_link,
-        embed_code=embed_code,
-        total_prompt_tokens=prompt_tokens,
-        total_completion_tokens=completion_tokens,
-        total_tokens=updated_chatbot.get("total_tokens", 0),
-        estimated_cost=estimated_cost,
-        documents=documents,
-        created_at=updated_chatbot["created_at"],
-        updated_at=updated_chatbot["updated_at"]
+    if not chatbot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chatbot non trouvé"
+        )
+    
+    file_path = _document_path(chatbot_id, filename)
+    if not any(doc["filename"] == filename for doc in chatbot.get("documents", [])):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document non trouvé"
+        )
+    
+    # Nouvelle version écrite à côté : elle remplace l'ancienne à la fin du job
+    staged_path = f"{file_path}.{secrets.token_hex(8)}.upload"
+    await _save_upload(file, staged_path)
+    
+    job = await ingestion_queue.enqueue(
+        chatbot_id=chatbot_id,
+        user_id=current_user_id,
+        filename=filename,
+        file_path=staged_path,
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        replace=True
+    )
+    
+    return _job_to_response(job)
+
+
+@router.get("/{chatbot_id}/jobs/{job_id}", response_model=IngestionJobResponse)
+async def get_ingestion_job(
+    chatbot_id: str,
+    job_id: str,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """
+    Suivre la progression d'un job d'indexation
+    """
+    try:
+        job = await ingestion_jobs_collection.find_one({
+            "_id": ObjectId(job_id),
+            "chatbot_id": chatbot_id,
+            "user_id": current_user_id
+        })
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ID de job invalide"
+        )
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job non trouvé"
+        )
+    
+    return _job_to_response(job)
+
+
+def _job_to_response(job: dict) -> IngestionJobResponse:
+    """Convertit un job MongoDB en réponse API"""
+    total_chunks = job.get("total_chunks")
+    processed_chunks = job.get("processed_chunks", 0)
+    if job["status"] == "completed":
+        progress = 1.0
+    elif total_chunks:
+        # Le nombre total de chunks n'est connu qu'à la fin de la lecture du fichier
+        progress = processed_chunks / total_chunks * job.get("parse_progress", 1.0)
+    else:
+        progress = 0.0
+    
+    return IngestionJobResponse(
+        id=str(job["_id"]),
+        chatbot_id=job["chatbot_id"],
+        filename=job["filename"],
+        status=job["status"],
+        total_chunks=total_chunks,
+        processed_chunks=processed_chunks,
+        duplicate_chunks=job.get("duplicate_chunks", 0),
+        progress=round(progress, 4),
+        chunks_per_second=job.get("chunks_per_second"),
+        error=job.get("error"),
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        completed_at=job.get("completed_at")
     )
 
 
@@ -441,16 +653,17 @@ async def upload_document_to_chatbot(
 async def query_chatbot(
     chatbot_id: str,
     query_data: ChatbotQueryRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user_id: str = Depends(get_current_user_id)
 ):
     """
     Poser une question à un chatbot spécifique
     """
     try:
-        chatbot = await chatbots_collection.find_one({
-            "_id": ObjectId(chatbot_id),
-            "user_id": str(current_user["_id"])
-        })
+        # Seul le prompt système sert à la requête : ne pas lire la liste des documents
+        chatbot = await chatbots_collection.find_one(
+            {"_id": ObjectId(chatbot_id), "user_id": current_user_id},
+            QUERY_PROJECTION
+        )
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -463,8 +676,8 @@ async def query_chatbot(
             detail="Chatbot non trouvé"
         )
     
-    # Utiliser le service RAG pour répondre
-    rag_service = RAGService(chatbot_id)
+    # Utiliser le service RAG pour répondre (chargement de l'index hors boucle d'événements)
+    rag_service = await run_in_executor(retrieval_executor, RAGService, chatbot_id)
     
     # Vérifier si l'index existe
     if not rag_service.index_exists():
@@ -473,7 +686,7 @@ async def query_chatbot(
             detail="Aucun document indexé pour ce chatbot"
         )
     
-    result = rag_service.query(
+    result = await rag_service.aquery(
         query_data.question,
         k=query_data.k,
         system_prompt=chatbot.get("system_prompt")
@@ -482,7 +695,7 @@ async def query_chatbot(
     # Sauvegarder la conversation
     conversation_entry = {
         "chatbot_id": chatbot_id,
-        "user_id": str(current_user["_id"]),
+        "user_id": current_user_id,
         "messages": [
             {
                 "role": "user",
@@ -499,7 +712,8 @@ async def query_chatbot(
         "created_at": datetime.now()
     }
     
-    await conversations_collection.insert_one(conversation_entry)
+    write_buffer.add_usage(chatbot_id, result.get("usage"))
+    write_buffer.add_conversation(conversation_entry)
     
     return ChatbotQueryResponse(
         chatbot_id=chatbot_id,
@@ -510,20 +724,99 @@ async def query_chatbot(
     )
 
 
+@router.post("/{chatbot_id}/query/batch")
+async def query_chatbot_batch(
+    chatbot_id: str,
+    batch_data: ChatbotBatchQueryRequest,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """
+    Poser un lot de questions à un chatbot (suites d'évaluation).
+    Les résultats sont envoyés en NDJSON (une ligne JSON par question, dans l'ordre
+    d'arrivée, avec son index), puis une ligne finale {"type": "done"}.
+    Les réponses ne sont pas enregistrées comme conversations.
+    """
+    if len(batch_data.questions) > config.batch_query_max_questions:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Trop de questions (maximum {config.batch_query_max_questions})"
+        )
+    
+    try:
+        # Seul le prompt système sert à la requête : ne pas lire la liste des documents
+        chatbot = await chatbots_collection.find_one(
+            {"_id": ObjectId(chatbot_id), "user_id": current_user_id},
+            QUERY_PROJECTION
+        )
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="ID de chatbot invalide"
+        )
+    
+    if not chatbot:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Chatbot non trouvé"
+        )
+    
+    # Un seul RAGService pour tout le lot (chargement de l'index hors boucle d'événements)
+    rag_service = await run_in_executor(retrieval_executor, RAGService, chatbot_id)
+    
+    if not rag_service.index_exists():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Aucun document indexé pour ce chatbot"
+        )
+    
+    async def result_generator():
+        usage_total = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        answered = 0
+        failed = 0
+        
+        try:
+            async for result in rag_service.aquery_batch(
+                batch_data.questions,
+                k=batch_data.k,
+                system_prompt=chatbot.get("system_prompt")
+            ):
+                if "error" in result:
+                    failed += 1
+                else:
+                    answered += 1
+                    for key in usage_total:
+                        usage_total[key] += result["usage"].get(key, 0)
+                yield json.dumps({"type": "result", **result}, default=str) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "message": str(e)}) + "\n"
+        
+        yield json.dumps({"type": "done", "answered": answered, "failed": failed, "usage": usage_total}) + "\n"
+        
+        # Un seul incrément des compteurs pour tout le lot
+        write_buffer.add_usage(chatbot_id, usage_total)
+    
+    return StreamingResponse(
+        result_generator(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.post("/{chatbot_id}/query/stream")
 async def query_chatbot_stream(
     chatbot_id: str,
     query_data: ChatbotQueryRequest,
-    current_user: dict = Depends(get_current_user)
+    current_user_id: str = Depends(get_current_user_id)
 ):
     """
     Poser une question à un chatbot spécifique avec réponse en streaming
     """
     try:
-        chatbot = await chatbots_collection.find_one({
-            "_id": ObjectId(chatbot_id),
-            "user_id": str(current_user["_id"])
-        })
+        # Seul le prompt système sert à la requête : ne pas lire la liste des documents
+        chatbot = await chatbots_collection.find_one(
+            {"_id": ObjectId(chatbot_id), "user_id": current_user_id},
+            QUERY_PROJECTION
+        )
     except Exception:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -536,8 +829,8 @@ async def query_chatbot_stream(
             detail="Chatbot non trouvé"
         )
     
-    # Utiliser le service RAG pour répondre
-    rag_service = RAGService(chatbot_id)
+    # Utiliser le service RAG pour répondre (chargement de l'index hors boucle d'événements)
+    rag_service = await run_in_executor(retrieval_executor, RAGService, chatbot_id)
     
     # Vérifier si l'index existe
     if not rag_service.index_exists():
@@ -551,7 +844,7 @@ async def query_chatbot_stream(
         full_answer = ""
         
         # Obtenir le stream, les sources et le container pour les usage stats
-        response_stream, sources, usage_container = rag_service.query_stream(
+        response_stream, sources, usage_container = await rag_service.aquery_stream(
             query_data.question,
             k=query_data.k,
             system_prompt=chatbot.get("system_prompt"),
@@ -560,7 +853,7 @@ async def query_chatbot_stream(
         
         # Stream la réponse directement (sans envoyer les sources)
         try:
-            for chunk in response_stream:
+            async for chunk in response_stream:
                 if chunk:
                     full_answer += chunk
                     yield f"data: {json.dumps({'type': 'chunk', 'content': chunk})}\n\n"
@@ -571,28 +864,14 @@ async def query_chatbot_stream(
         yield f"data: {json.dumps({'type': 'done'})}\n\n"
         
         # Maintenant usage_container devrait être rempli par le stream
-        # Mettre à jour les compteurs du chatbot si on a les stats
-        if usage_container and 'total_tokens' in usage_container:
-            try:
-                await chatbots_collection.update_one(
-                    {"_id": ObjectId(chatbot_id)},
-                    {
-                        "$inc": {
-                            "total_prompt_tokens": usage_container.get('prompt_tokens', 0),
-                            "total_completion_tokens": usage_container.get('completion_tokens', 0),
-                            "total_tokens": usage_container.get('total_tokens', 0)
-                        }
-                    }
-                )
-                print(f"✅ Tokens mis à jour: {usage_container}")
-            except Exception as e:
-                print(f"❌ Erreur lors de la mise à jour des tokens: {e}")
+        # Les compteurs du chatbot sont incrémentés en lot par le write buffer
+        write_buffer.add_usage(chatbot_id, usage_container)
         
-        # Sauvegarder la conversation (en arrière-plan)
+        # Sauvegarder la conversation (en arrière-plan, par le write buffer)
         try:
             conversation_entry = {
                 "chatbot_id": chatbot_id,
-                "user_id": str(current_user["_id"]),
+                "user_id": current_user_id,
                 "messages": [
                     {
                         "role": "user",
@@ -608,7 +887,7 @@ async def query_chatbot_stream(
                 ],
                 "created_at": datetime.now()
             }
-            await conversations_collection.insert_one(conversation_entry)
+            write_buffer.add_conversation(conversation_entry)
         except Exception as e:
             print(f"Erreur lors de la sauvegarde de la conversation: {e}")
     
@@ -627,7 +906,7 @@ async def query_chatbot_stream(
 async def get_chatbot_conversations(
     chatbot_id: str,
     limit: int = 50,
-    current_user: dict = Depends(get_current_user)
+    current_user_id: str = Depends(get_current_user_id)
 ):
     """
     Récupérer l'historique des conversations d'un chatbot
@@ -635,7 +914,7 @@ async def get_chatbot_conversations(
     try:
         chatbot = await chatbots_collection.find_one({
             "_id": ObjectId(chatbot_id),
-            "user_id": str(current_user["_id"])
+            "user_id": current_user_id
         })
     except Exception:
         raise HTTPException(
@@ -662,12 +941,13 @@ async def get_chatbot_conversations(
     return conversations
 
 
-@router.get("/public/{share_token}", response_model=ChatbotResponse)
+@router.get("/public/{share_token}", response_model=PublicChatbotResponse)
 async def get_public_chatbot(share_token: str):
     """
-    Récupérer un chatbot via son token de partage (accès public)
+    Récupérer un chatbot via son token de partage (accès public).
+    Ne renvoie que ce qu'affiche le widget (ni prompt système, ni propriétaire, ni usage).
     """
-    chatbot = await chatbots_collection.find_one({"share_token": share_token})
+    chatbot = await public_chatbot_cache.get(share_token)
     
     if not chatbot:
         raise HTTPException(
@@ -675,42 +955,14 @@ async def get_public_chatbot(share_token: str):
             detail="Chatbot non trouvé"
         )
     
-    documents = [
-        DocumentInfo(
-            filename=doc["filename"],
-            upload_date=doc["upload_date"],
-            chunks_count=doc.get("chunks_count")
-        )
-        for doc in chatbot.get("documents", [])
-    ]
-    
-    # Générer le lien de partage
     base_url = settings.FRONTEND_URL or "http://localhost:5173"
-    share_link = f"{base_url}/chat/{share_token}"
-    widget_link = f"{base_url}/widget/{share_token}"
-    embed_code = f'<iframe src="{widget_link}" width="100%" height="600" frameborder="0" style="border-radius: 10px;"></iframe>'
-    
-    # Calculer le coût estimé
-    prompt_tokens = chatbot.get("total_prompt_tokens", 0)
-    completion_tokens = chatbot.get("total_completion_tokens", 0)
-    estimated_cost = calculate_cost(prompt_tokens, completion_tokens)
-    
-    return ChatbotResponse(
-        id=str(chatbot["_id"]),
-        name=chatbot["name"],
-        description=chatbot.get("description"),
-        system_prompt=chatbot.get("system_prompt"),
-        user_id=chatbot["user_id"],
-        share_link=share_link,
-        widget_link=widget_link,
-        embed_code=embed_code,
-        total_prompt_tokens=prompt_tokens,
-        total_completion_tokens=completion_tokens,
-        total_tokens=chatbot.get("total_tokens", 0),
-        estimated_cost=estimated_cost,
-        documents=documents,
-        created_at=chatbot["created_at"],
-        updated_at=chatbot["updated_at"]
+    return PublicChatbotResponse(
+        id=chatbot.id,
+        name=chatbot.name,
+        description=chatbot.description,
+        has_documents=chatbot.has_documents,
+        share_link=f"{base_url}/chat/{share_token}",
+        widget_link=f"{base_url}/widget/{share_token}"
     )
 
 
@@ -722,7 +974,8 @@ async def query_public_chatbot(
     """
     Interroger un chatbot public via son token de partage (sans authentification)
     """
-    chatbot = await chatbots_collection.find_one({"share_token": share_token})
+    # Configuration compacte en cache (jamais la liste des documents)
+    chatbot = await public_chatbot_cache.get(share_token)
     
     if not chatbot:
         raise HTTPException(
@@ -730,18 +983,18 @@ async def query_public_chatbot(
             detail="Chatbot non trouvé"
         )
     
-    chatbot_id = str(chatbot["_id"])
+    chatbot_id = chatbot.id
     
-    # Initialiser le service RAG
-    rag_service = RAGService(chatbot_id=chatbot_id)
-    
-    # Vérifier si des documents sont indexés
-    if not chatbot.get("documents") or len(chatbot["documents"]) == 0:
+    # Vérifier si des documents sont indexés (avant de charger l'index)
+    if not chatbot.has_documents:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Ce chatbot n'a pas encore de documents indexés"
         )
     
+    # Initialiser le service RAG (chargement de l'index hors boucle d'événements)
+    rag_service = await run_in_executor(retrieval_executor, RAGService, chatbot_id=chatbot_id)
+    
     # Streaming de la réponse
     async def event_generator():
         try:
@@ -749,15 +1002,15 @@ async def query_public_chatbot(
             full_answer = ""
             
             # Obtenir le stream, les sources et le container pour les usage stats
-            response_stream, sources, usage_container = rag_service.query_stream(
+            response_stream, sources, usage_container = await rag_service.aquery_stream(
                 query_request.question,
                 k=query_request.k,
-                system_prompt=chatbot.get("system_prompt"),
+                system_prompt=chatbot.system_prompt,
                 conversation_history=query_request.conversation_history
             )
             
             # Stream la réponse
-            for chunk in response_stream:
+            async for chunk in response_stream:
                 if chunk:
                     answer_chunks.append(chunk)
                     full_answer += chunk
@@ -767,24 +1020,10 @@ async def query_public_chatbot(
             yield "data: [DONE]\n\n"
             
             # Maintenant usage_container devrait être rempli par le stream
-            # Mettre à jour les compteurs du chatbot si on a les stats
-            if usage_container and 'total_tokens' in usage_container:
-                try:
-                    await chatbots_collection.update_one(
-                        {"_id": ObjectId(chatbot_id)},
-                        {
-                            "$inc": {
-                                "total_prompt_tokens": usage_container.get('prompt_tokens', 0),
-                                "total_completion_tokens": usage_container.get('completion_tokens', 0),
-                                "total_tokens": usage_container.get('total_tokens', 0)
-                            }
-                        }
-                    )
-                    print(f"✅ Tokens mis à jour (public): {usage_container}")
-                except Exception as e:
-                    print(f"❌ Erreur lors de la mise à jour des tokens (public): {e}")
+            # Les compteurs du chatbot sont incrémentés en lot par le write buffer
+            write_buffer.add_usage(chatbot_id, usage_container)
             
-            # Sauvegarder la conversation (public - sans user_id)
+            # Sauvegarder la conversation (public - sans user_id, par le write buffer)
             try:
                 conversation_entry = {
                     "chatbot_id": chatbot_id,
@@ -805,7 +1044,7 @@ async def query_public_chatbot(
                     ],
                     "created_at": datetime.now()
                 }
-                await conversations_collection.insert_one(conversation_entry)
+                write_buffer.add_conversation(conversation_entry)
             except Exception as e:
                 print(f"Erreur lors de la sauvegarde de la conversation publique: {e}")
             
@@ -2,15 +2,20 @@
 Schémas Pydantic pour les chatbots
 """
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime
 
 
+# Types d'index FAISS (voir app/documents/services/ann_index.py)
+IndexType = Literal["flat", "ivf_flat", "hnsw", "ivf_pq"]
+
+
 class ChatbotCreate(BaseModel):
     """Schéma pour créer un chatbot"""
     name: str = Field(..., min_length=1, max_length=100)
     description: Optional[str] = Field(None, max_length=500)
     system_prompt: Optional[str] = Field(None, max_length=2000)
+    index_type: Optional[IndexType] = None  # Type d'index ANN (par défaut celui de la config)
 
 
 class ChatbotUpdate(BaseModel):
@@ -18,6 +23,7 @@ class ChatbotUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=100)
     description: Optional[str] = Field(None, max_length=500)
     system_prompt: Optional[str] = Field(None, max_length=2000)
+    index_type: Optional[IndexType] = None
 
 
 class DocumentInfo(BaseModel):
@@ -41,6 +47,7 @@ class ChatbotResponse(BaseModel):
     name: str
     description: Optional[str] = None
     system_prompt: Optional[str] = None
+    index_type: Optional[str] = None
     user_id: str
     documents: List[DocumentInfo] = []
     share_link: Optional[str] = None
@@ -54,6 +61,16 @@ class ChatbotResponse(BaseModel):
     updated_at: datetime
 
 
+class PublicChatbotResponse(BaseModel):
+    """Chatbot vu via son lien de partage (widget) : seulement ce qui est affiché"""
+    id: str
+    name: str
+    description: Optional[str] = None
+    has_documents: bool = False
+    share_link: str
+    widget_link: str
+
+
 class ChatbotQueryRequest(BaseModel):
     """Requête pour interroger un chatbot"""
     question: str = Field(..., min_length=1)
@@ -61,6 +78,12 @@ class ChatbotQueryRequest(BaseModel):
     conversation_history: Optional[List[dict]] = Field(default=None, max_length=10)
 
 
+class ChatbotBatchQueryRequest(BaseModel):
+    """Lot de questions à évaluer sur un chatbot (sans historique)"""
+    questions: List[str] = Field(..., min_length=1)  # Taille maximale : RAG_BATCH_QUERY_MAX_QUESTIONS
+    k: int = Field(default=4, ge=1, le=10)
+
+
 class ChatbotQueryResponse(BaseModel):
     """Réponse d'un chatbot"""
     chatbot_id: str
@@ -68,3 +91,20 @@ class ChatbotQueryResponse(BaseModel):
     answer: str
     sources: List[dict] = []
     timestamp: datetime
+
+
+class IngestionJobResponse(BaseModel):
+    """État d'un job d'ingestion de document"""
+    id: str
+    chatbot_id: str
+    filename: str
+    status: str  # 'pending', 'running', 'completed' ou 'failed'
+    total_chunks: Optional[int] = None
+    processed_chunks: int = 0
+    duplicate_chunks: int = 0  # Chunks déjà indexés, ignorés
+    progress: float = 0.0  # Entre 0 et 1
+    chunks_per_second: Optional[float] = None  # Débit des embeddings (job terminé)
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+    completed_at: Optional[datetime] = None
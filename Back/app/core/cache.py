@@ -0,0 +1,144 @@
+"""
+Cache LRU en mémoire, thread-safe, avec budget de taille et TTL optionnel
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    """Cache LRU borné par une taille totale (nombre d'entrées ou octets)"""
+
+    def __init__(
+        self,
+        max_size: int,
+        sizeof: Optional[Callable[[Any], int]] = None,
+        ttl_seconds: Optional[float] = None
+    ):
+        """
+        Initialise le cache
+
+        Args:
+            max_size: Taille totale maximale (somme des tailles des entrées)
+            sizeof: Fonction qui calcule la taille d'une valeur (1 par entrée par défaut)
+            ttl_seconds: Durée de vie des entrées en secondes (optionnel)
+        """
+        self.max_size = max_size
+        self.sizeof = sizeof or (lambda value: 1)
+        self.ttl_seconds = ttl_seconds
+
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._current_size = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Récupère une valeur et la marque comme récemment utilisée
+
+        Args:
+            key: Clé de l'entrée
+            default: Valeur retournée si la clé est absente ou expirée
+
+        Returns:
+            La valeur en cache ou `default`
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, size: Optional[int] = None):
+        """
+        Ajoute ou remplace une entrée, puis évince les plus anciennes si besoin
+
+        Args:
+            key: Clé de l'entrée
+            value: Valeur à stocker
+            size: Taille de la valeur (calculée via `sizeof` si absente)
+        """
+        if size is None:
+            size = self.sizeof(value)
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            # Une entrée plus grande que le budget total n'est jamais mise en cache
+            if size > self.max_size:
+                return
+
+            self._entries[key] = (value, size, expires_at)
+            self._current_size += size
+
+            while self._current_size > self.max_size and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """
+        Supprime une entrée du cache
+
+        Args:
+            key: Clé de l'entrée
+
+        Returns:
+            True si une entrée a été supprimée
+        """
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                return True
+            return False
+
+    def clear(self):
+        """Vide entièrement le cache"""
+        with self._lock:
+            self._entries.clear()
+            self._current_size = 0
+
+    def _remove(self, key: Hashable):
+        """Supprime une entrée (le verrou doit être détenu)"""
+        _, size, _ = self._entries.pop(key)
+        self._current_size -= size
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_stats(self) -> dict:
+        """
+        Retourne les compteurs du cache
+
+        Returns:
+            Dictionnaire avec les statistiques
+        """
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size": self._current_size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
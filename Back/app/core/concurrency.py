@@ -0,0 +1,66 @@
+"""
+Pools d'exécution pour sortir le travail bloquant de la boucle d'événements
+"""
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+
+from app.core.config import config
+
+# Pool borné pour la recherche (chargement d'index, embedding de la requête, FAISS)
+retrieval_executor = ThreadPoolExecutor(
+    max_workers=config.retrieval_workers,
+    thread_name_prefix="retrieval"
+)
+
+# Pool borné pour le hachage et la vérification des mots de passe (bcrypt, ~100-300 ms de CPU)
+password_executor = ThreadPoolExecutor(
+    max_workers=config.password_hash_workers,
+    thread_name_prefix="password"
+)
+
+# Pool de processus pour l'extraction du texte des PDF (créé au premier usage)
+_extraction_executor: Optional[ProcessPoolExecutor] = None
+_extraction_executor_lock = threading.Lock()
+
+
+def extraction_executor() -> ProcessPoolExecutor:
+    """Retourne le pool de processus d'extraction des PDF (`pdf_extraction_workers` processus)"""
+    global _extraction_executor
+    with _extraction_executor_lock:
+        if _extraction_executor is None:
+            _extraction_executor = ProcessPoolExecutor(
+                max_workers=config.pdf_extraction_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _extraction_executor
+
+
+async def run_in_executor(executor: Executor, func, *args, **kwargs):
+    """
+    Exécute une fonction bloquante dans un pool sans bloquer la boucle d'événements
+
+    Args:
+        executor: Pool dans lequel exécuter la fonction
+        func: Fonction à appeler
+        *args, **kwargs: Arguments de la fonction
+
+    Returns:
+        Le résultat de la fonction
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+
+def shutdown_executors():
+    """Arrête les pools d'exécution (à l'arrêt de l'application)"""
+    global _extraction_executor
+    retrieval_executor.shutdown(wait=False, cancel_futures=True)
+    password_executor.shutdown(wait=False, cancel_futures=True)
+    with _extraction_executor_lock:
+        if _extraction_executor is not None:
+            _extraction_executor.shutdown(wait=False, cancel_futures=True)
+            _extraction_executor = None
@@ -23,6 +23,11 @@ class RAGConfig(BaseModel):
     # Modèle d'embeddings
     embedding_model: str = os.getenv("RAG_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
     embedding_device: str = os.getenv("RAG_EMBEDDING_DEVICE", "cpu")  # "cpu" ou "cuda"
+    embedding_batch_size: int = int(os.getenv("RAG_EMBEDDING_BATCH_SIZE", "64"))  # Chunks par lot passé au modèle
+    embedding_pool_workers: int = int(os.getenv("RAG_EMBEDDING_POOL_WORKERS", "0"))  # Processus d'encodage pour l'indexation en masse (0 = désactivé)
+    embedding_cache_enabled: bool = os.getenv("RAG_EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+    embedding_cache_path: str = os.getenv("RAG_EMBEDDING_CACHE_PATH", "data/embedding_cache.db")  # Cache persistant des embeddings (SQLite)
+    embedding_group_size: int = int(os.getenv("RAG_EMBEDDING_GROUP_SIZE", "4096"))  # Chunks regroupés entre fichiers avant encodage
     
     # Paramètres de chunking
     default_chunk_size: int = int(os.getenv("RAG_DEFAULT_CHUNK_SIZE", "1000"))
@@ -32,6 +37,107 @@ class RAGConfig(BaseModel):
     default_k_results: int = int(os.getenv("RAG_DEFAULT_K_RESULTS", "4"))
     default_score_threshold: Optional[float] = None
     
+    # Cache des index FAISS chargés en mémoire (budget total en MB)
+    index_cache_max_mb: int = int(os.getenv("RAG_INDEX_CACHE_MAX_MB", "512"))
+    chunk_store_cache_size: int = int(os.getenv("RAG_CHUNK_STORE_CACHE_SIZE", "256"))  # Chunk stores SQLite ouverts (connexions fermées au-delà)
+    
+    # Segments d'index : compactage périodique au-delà de `index_max_segments`
+    index_max_segments: int = int(os.getenv("RAG_INDEX_MAX_SEGMENTS", "8"))
+    index_compaction_interval_seconds: int = int(os.getenv("RAG_INDEX_COMPACTION_INTERVAL_SECONDS", "600"))
+    index_compaction_enabled: bool = os.getenv("RAG_INDEX_COMPACTION_ENABLED", "true").lower() == "true"  # Un seul worker compacte (verrou fichier)
+    
+    # Ouverture des segments FAISS en mmap lecture seule (pages partagées entre workers)
+    index_mmap: bool = os.getenv("RAG_INDEX_MMAP", "true").lower() == "true"
+    
+    # Index ANN : au-delà de `ann_promotion_threshold` vecteurs, l'index plat d'un chatbot
+    # est reconstruit en "ivf_flat", "hnsw" ou "ivf_pq" (réglable aussi par chatbot)
+    ann_index_type: str = os.getenv("RAG_ANN_INDEX_TYPE", "ivf_flat")
+    ann_promotion_threshold: int = int(os.getenv("RAG_ANN_PROMOTION_THRESHOLD", "50000"))
+    ann_train_sample_size: int = int(os.getenv("RAG_ANN_TRAIN_SAMPLE_SIZE", "100000"))  # Vecteurs utilisés pour l'entraînement
+    ann_nlist: int = int(os.getenv("RAG_ANN_NLIST", "0"))  # Listes IVF (0 = automatique, ~4·√n)
+    ann_nprobe: int = int(os.getenv("RAG_ANN_NPROBE", "16"))  # Listes IVF visitées par requête
+    ann_pq_m: int = int(os.getenv("RAG_ANN_PQ_M", "48"))  # Sous-quantifieurs IVF-PQ (octets par vecteur)
+    ann_hnsw_m: int = int(os.getenv("RAG_ANN_HNSW_M", "32"))  # Voisins par nœud HNSW
+    ann_hnsw_ef_construction: int = int(os.getenv("RAG_ANN_HNSW_EF_CONSTRUCTION", "80"))
+    ann_ef_search: int = int(os.getenv("RAG_ANN_EF_SEARCH", "64"))  # File de recherche HNSW
+    
+    # Comptage des tokens : "tiktoken" (estimation) ou "mistral" (tokenizer exact, paquet mistral-common)
+    tokenizer: str = os.getenv("RAG_TOKENIZER", "tiktoken")
+    tokenizer_threads: int = int(os.getenv("RAG_TOKENIZER_THREADS", "4"))  # Threads de count_tokens_batch
+    
+    # Budget de tokens du prompt envoyé au LLM (contexte + historique + question)
+    max_prompt_tokens: int = int(os.getenv("RAG_MAX_PROMPT_TOKENS", "3000"))
+    prompt_history_reserve_tokens: int = int(os.getenv("RAG_PROMPT_HISTORY_RESERVE_TOKENS", "500"))  # Gardés pour l'historique
+    prompt_min_chunk_tokens: int = int(os.getenv("RAG_PROMPT_MIN_CHUNK_TOKENS", "50"))  # Chunk coupé plus court : écarté
+    
+    # Recherche hybride : BM25 (index inversé FTS5) + vecteurs, fusionnés par Reciprocal Rank Fusion.
+    # En "keyword" et "hybrid", le score renvoyé n'est plus une distance L2 (score BM25 / RRF)
+    retrieval_mode: str = os.getenv("RAG_RETRIEVAL_MODE", "vector")  # vector, keyword ou hybrid
+    hybrid_rrf_k: int = int(os.getenv("RAG_HYBRID_RRF_K", "60"))  # Constante de la fusion RRF
+    hybrid_candidates: int = int(os.getenv("RAG_HYBRID_CANDIDATES", "20"))  # Candidats par classement avant fusion
+    bm25_max_query_terms: int = int(os.getenv("RAG_BM25_MAX_QUERY_TERMS", "16"))
+    bm25_max_df_ratio: float = float(os.getenv("RAG_BM25_MAX_DF_RATIO", "0.2"))  # Termes plus fréquents ignorés
+    bm25_max_postings: int = int(os.getenv("RAG_BM25_MAX_POSTINGS", "10000"))  # Postings lus par requête (latence bornée)
+    
+    # Caches de la recherche (nombre d'entrées)
+    query_embedding_cache_size: int = int(os.getenv("RAG_QUERY_EMBEDDING_CACHE_SIZE", "10000"))
+    retrieval_cache_size: int = int(os.getenv("RAG_RETRIEVAL_CACHE_SIZE", "10000"))
+    
+    # Cache sémantique des réponses (questions quasi identiques sur un même chatbot)
+    response_cache_enabled: bool = os.getenv("RAG_RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    response_cache_threshold: float = float(os.getenv("RAG_RESPONSE_CACHE_THRESHOLD", "0.95"))  # Similarité cosinus minimale
+    response_cache_ttl_seconds: int = int(os.getenv("RAG_RESPONSE_CACHE_TTL_SECONDS", "3600"))
+    response_cache_max_entries: int = int(os.getenv("RAG_RESPONSE_CACHE_MAX_ENTRIES", "200"))  # Par chatbot
+    response_cache_max_chatbots: int = int(os.getenv("RAG_RESPONSE_CACHE_MAX_CHATBOTS", "1000"))
+    
+    # Nombre de threads dédiés à la recherche (hors boucle d'événements)
+    retrieval_workers: int = int(os.getenv("RAG_RETRIEVAL_WORKERS", "8"))
+    
+    # Cache de la configuration des chatbots publics (widget, lien de partage)
+    public_chatbot_cache_size: int = int(os.getenv("RAG_PUBLIC_CHATBOT_CACHE_SIZE", "10000"))
+    public_chatbot_cache_ttl_seconds: int = int(os.getenv("RAG_PUBLIC_CHATBOT_CACHE_TTL_SECONDS", "60"))
+    
+    # Requêtes par lot (POST /chatbots/{id}/query/batch)
+    batch_query_max_questions: int = int(os.getenv("RAG_BATCH_QUERY_MAX_QUESTIONS", "5000"))
+    batch_query_retrieval_size: int = int(os.getenv("RAG_BATCH_QUERY_RETRIEVAL_SIZE", "256"))  # Questions encodées et cherchées ensemble
+    batch_query_concurrency: int = int(os.getenv("RAG_BATCH_QUERY_CONCURRENCY", "8"))  # Appels LLM simultanés
+    
+    # Hachage bcrypt des mots de passe (threads : bcrypt libère le GIL)
+    password_hash_workers: int = int(os.getenv("AUTH_PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+    
+    # Pool de connexions MongoDB (Motor)
+    mongo_max_pool_size: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+    mongo_min_pool_size: int = int(os.getenv("MONGODB_MIN_POOL_SIZE", "10"))  # Connexions gardées ouvertes
+    mongo_max_idle_time_ms: int = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "300000"))
+    mongo_connect_timeout_ms: int = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+    mongo_server_selection_timeout_ms: int = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+    mongo_socket_timeout_ms: int = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "20000"))
+    mongo_wait_queue_timeout_ms: int = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "5000"))  # Attente d'une connexion libre
+    mongo_read_preference: str = os.getenv("MONGODB_READ_PREFERENCE", "primary")  # primary, primaryPreferred, secondaryPreferred...
+    
+    # Mesure du temps passé dans MongoDB (par collection, opération et route)
+    mongo_monitoring: bool = os.getenv("MONGODB_MONITORING", "true").lower() == "true"
+    mongo_slow_request_ms: float = float(os.getenv("MONGODB_SLOW_REQUEST_MS", "100"))  # Requêtes HTTP loguées au-delà
+    
+    # Écritures différées des conversations et compteurs de tokens (app/core/write_buffer.py)
+    write_buffer_flush_interval_ms: int = int(os.getenv("RAG_WRITE_BUFFER_FLUSH_INTERVAL_MS", "500"))
+    write_buffer_max_batch: int = int(os.getenv("RAG_WRITE_BUFFER_MAX_BATCH", "500"))  # Vidage anticipé au-delà
+    write_buffer_max_pending: int = int(os.getenv("RAG_WRITE_BUFFER_MAX_PENDING", "50000"))  # Conversations gardées si MongoDB est indisponible
+    
+    # Jobs d'ingestion en arrière-plan
+    ingestion_workers: int = int(os.getenv("RAG_INGESTION_WORKERS", "2"))  # Jobs traités en parallèle
+    ingestion_process_workers: int = int(os.getenv("RAG_INGESTION_PROCESS_WORKERS", "2"))  # Processus pour parsing/embeddings
+    ingestion_batch_size: int = int(os.getenv("RAG_INGESTION_BATCH_SIZE", "64"))  # Chunks par lot d'embeddings
+    ingestion_window_size: int = int(os.getenv("RAG_INGESTION_WINDOW_SIZE", "2048"))  # Chunks lus puis ajoutés à l'index par étape (borne la mémoire)
+    upload_read_size_kb: int = int(os.getenv("RAG_UPLOAD_READ_SIZE_KB", "1024"))  # Taille des blocs écrits sur disque à l'upload
+    ingestion_lease_seconds: int = int(os.getenv("RAG_INGESTION_LEASE_SECONDS", "300"))  # Délai avant reprise d'un job abandonné
+    ingestion_reclaim_interval_seconds: int = int(os.getenv("RAG_INGESTION_RECLAIM_INTERVAL_SECONDS", "60"))  # Recherche des jobs abandonnés
+    
+    # Extraction parallèle du texte des PDF (plages de pages réparties sur des processus)
+    pdf_extraction_workers: int = int(os.getenv("RAG_PDF_EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+    pdf_pages_per_shard: int = int(os.getenv("RAG_PDF_PAGES_PER_SHARD", "25"))  # Pages par tâche
+    pdf_parallel_min_pages: int = int(os.getenv("RAG_PDF_PARALLEL_MIN_PAGES", "50"))  # En dessous : extraction dans le processus courant
+    
     # Types de fichiers supportés
     allowed_extensions: list = [".pdf", ".txt", ".md"]
     max_file_size_mb: int = int(os.getenv("RAG_MAX_FILE_SIZE_MB", "10"))  # Taille maximale en MB
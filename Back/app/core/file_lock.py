@@ -0,0 +1,113 @@
+"""
+Verrous exclusifs partagés entre threads et processus
+
+Les verrous `threading` / `asyncio` ne protègent qu'un processus : avec plusieurs
+workers uvicorn, deux workers pouvaient modifier en même temps le manifeste d'un
+même index. Un `FileLock` combine un RLock (threads du processus) et un
+`fcntl.flock` sur un fichier (autres processus). Sans fcntl (Windows), seul le
+verrou des threads est pris.
+"""
+import os
+import threading
+from typing import Dict
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+class FileLock:
+    """Verrou exclusif sur un fichier, réentrant pour le thread qui le détient"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Fichier de verrou (créé au besoin)
+        """
+        self.path = path
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """
+        Prend le verrou
+
+        Args:
+            blocking: Attendre que le verrou se libère (sinon, échouer tout de suite)
+
+        Returns:
+            True si le verrou est détenu
+        """
+        if not self._thread_lock.acquire(blocking=blocking):
+            return False
+        if self._depth == 0:
+            try:
+                locked = self._lock_file(blocking)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+            if not locked:
+                self._thread_lock.release()
+                return False
+        self._depth += 1
+        return True
+
+    def release(self):
+        """Rend le verrou (le fichier est déverrouillé au dernier niveau)"""
+        self._depth -= 1
+        if self._depth == 0 and self._file is not None:
+            try:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+
+    def _lock_file(self, blocking: bool) -> bool:
+        """Verrouille le fichier pour les autres processus"""
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        handle = open(self.path, "a")
+        try:
+            flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+            fcntl.flock(handle.fileno(), flags)
+        except BlockingIOError:
+            handle.close()
+            return False
+        except BaseException:
+            handle.close()
+            raise
+        self._file = handle
+        return True
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+_file_locks: Dict[str, FileLock] = {}
+_file_locks_guard = threading.Lock()
+
+
+def get_file_lock(path: str) -> FileLock:
+    """
+    Retourne le verrou associé à un fichier (une seule instance par chemin et par processus)
+
+    Args:
+        path: Fichier de verrou
+
+    Returns:
+        Le verrou
+    """
+    path = os.path.abspath(path)
+    with _file_locks_guard:
+        lock = _file_locks.get(path)
+        if lock is None:
+            lock = _file_locks[path] = FileLock(path)
+        return lock
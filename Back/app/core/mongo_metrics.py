@@ -0,0 +1,214 @@
+"""
+Mesure du temps passé dans MongoDB
+
+Un listener de commandes PyMongo alimente un histogramme de latence par collection
+et par opération (find, insert, update...). Le middleware HTTP attache à chaque
+requête un compteur (contextvar, propagé par Motor à ses threads) : le temps
+MongoDB est ainsi cumulé par route, et les requêtes au-delà de
+`mongo_slow_request_ms` sont loguées.
+"""
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+from app.core.config import config
+
+# Bornes supérieures des classes de l'histogramme (ms) ; la dernière classe est ouverte
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class LatencyHistogram:
+    """Histogramme de latences à classes fixes (non thread-safe : protégé par l'appelant)"""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, duration_ms: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+        self.count += 1
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+
+    def percentile(self, pct: float) -> float:
+        """Borne supérieure de la classe contenant le percentile demandé"""
+        if not self.count:
+            return 0.0
+        rank = pct / 100 * self.count
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= rank:
+                return float(bound)
+        return self.max_ms
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": {
+                **{f"<={bound}": count for bound, count in zip(LATENCY_BUCKETS_MS, self.counts)},
+                f">{LATENCY_BUCKETS_MS[-1]}": self.counts[-1]
+            }
+        }
+
+
+class RequestMongoTimer:
+    """Temps MongoDB cumulé pendant une requête HTTP (alimenté depuis les threads de Motor)"""
+
+    def __init__(self):
+        self.duration_ms = 0.0
+        self.commands = 0
+        self._lock = threading.Lock()
+
+    def add(self, duration_ms: float):
+        with self._lock:
+            self.duration_ms += duration_ms
+            self.commands += 1
+
+
+# Compteur de la requête HTTP en cours (None hors requête : tâches de fond, démarrage)
+current_request_timer: ContextVar[Optional[RequestMongoTimer]] = ContextVar("current_request_timer", default=None)
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Listener de commandes : latence par (collection, opération) et par route"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple, str] = {}
+        self._commands: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._failures = 0
+        self._routes: Dict[str, dict] = {}
+
+    # --- Listener PyMongo -------------------------------------------------
+
+    def started(self, event):
+        """Retient la collection visée (absente des événements de fin)"""
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        if not isinstance(collection, str):
+            collection = event.database_name
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        with self._lock:
+            self._failures += 1
+        self._finish(event)
+
+    def _finish(self, event):
+        """Enregistre la durée de la commande terminée"""
+        duration_ms = event.duration_micros / 1000
+        with self._lock:
+            collection = self._pending.pop((event.connection_id, event.request_id), event.database_name)
+            key = (collection, event.command_name)
+            histogram = self._commands.get(key)
+            if histogram is None:
+                histogram = self._commands[key] = LatencyHistogram()
+            histogram.record(duration_ms)
+
+        timer = current_request_timer.get()
+        if timer is not None:
+            timer.add(duration_ms)
+
+    # --- Attribution par route ---------------------------------------------
+
+    def record_request(self, route: str, timer: RequestMongoTimer, total_ms: float):
+        """
+        Cumule le temps MongoDB d'une requête HTTP terminée et logue les requêtes lentes
+
+        Args:
+            route: Méthode et gabarit de la route (ex: "POST /chatbots/{chatbot_id}/query")
+            timer: Compteur de la requête
+            total_ms: Durée totale de la requête
+        """
+        with self._lock:
+            stats = self._routes.get(route)
+            if stats is None:
+                stats = self._routes[route] = {
+                    "requests": 0,
+                    "commands": 0,
+                    "total_ms": 0.0,
+                    "mongo_ms": 0.0,
+                    "mongo": LatencyHistogram()
+                }
+            stats["requests"] += 1
+            stats["commands"] += timer.commands
+            stats["total_ms"] += total_ms
+            stats["mongo_ms"] += timer.duration_ms
+            stats["mongo"].record(timer.duration_ms)
+
+        if timer.duration_ms >= config.mongo_slow_request_ms:
+            print(
+                f"🐢 {route}: {timer.duration_ms:.1f} ms dans MongoDB "
+                f"({timer.commands} commandes) sur {total_ms:.1f} ms"
+            )
+
+    def get_stats(self) -> dict:
+        """Retourne les histogrammes par commande et le temps MongoDB par route"""
+        with self._lock:
+            commands = {
+                f"{collection}.{command}": histogram.to_dict()
+                for (collection, command), histogram in sorted(self._commands.items())
+            }
+            routes = {
+                route: {
+                    "requests": stats["requests"],
+                    "commands_per_request": round(stats["commands"] / stats["requests"], 2),
+                    "mongo_ms_per_request": round(stats["mongo_ms"] / stats["requests"], 3),
+                    "mongo_share": round(stats["mongo_ms"] / stats["total_ms"], 4) if stats["total_ms"] else 0.0,
+                    "mongo_p95_ms": stats["mongo"].percentile(95)
+                }
+                for route, stats in sorted(
+                    self._routes.items(), key=lambda item: item[1]["mongo_ms"], reverse=True
+                )
+            }
+            return {"failures": self._failures, "commands": commands, "routes": routes}
+
+
+async def mongo_timing_middleware(request, call_next):
+    """
+    Middleware HTTP : mesure le temps MongoDB de chaque requête, réponses
+    streamées comprises (mesure arrêtée à la fin du corps de la réponse)
+    """
+    timer = RequestMongoTimer()
+    token = current_request_timer.set(timer)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        current_request_timer.reset(token)
+
+    route = request.scope.get("route")
+    # Gabarit de la route (et non le chemin réel) pour borner le nombre de séries
+    route_name = f"{request.method} {route.path}" if route is not None else "unmatched"
+    body_iterator = response.body_iterator
+
+    async def timed_body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            command_metrics.record_request(route_name, timer, (time.perf_counter() - start) * 1000)
+
+    response.body_iterator = timed_body()
+    return response
+
+
+# Instance globale du listener (enregistrée sur le client Motor si MONGODB_MONITORING=true)
+command_metrics = MongoCommandMetrics()
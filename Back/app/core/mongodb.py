@@ -2,17 +2,38 @@
 Configuration MongoDB avec Motor (async driver)
 """
 import os
+from datetime import datetime
+from typing import Dict, List
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
 from dotenv import load_dotenv
 
+from app.core.config import config
+from app.core.mongo_metrics import command_metrics
+
 load_dotenv("../.env")
 
 # Configuration MongoDB
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 DATABASE_NAME = os.getenv("DATABASE_NAME", "chatbot_saas")
+# Vérifier au démarrage (explain) qu'aucune requête des routes ne parcourt toute une collection
+MONGODB_QUERY_AUDIT = os.getenv("MONGODB_QUERY_AUDIT", "false").lower() == "true"
 
-# Client MongoDB
-client = AsyncIOMotorClient(MONGODB_URL)
+# Client MongoDB (pool et délais configurés dans RAGConfig)
+client = AsyncIOMotorClient(
+    MONGODB_URL,
+    maxPoolSize=config.mongo_max_pool_size,
+    minPoolSize=config.mongo_min_pool_size,
+    maxIdleTimeMS=config.mongo_max_idle_time_ms,
+    connectTimeoutMS=config.mongo_connect_timeout_ms,
+    serverSelectionTimeoutMS=config.mongo_server_selection_timeout_ms,
+    socketTimeoutMS=config.mongo_socket_timeout_ms,
+    waitQueueTimeoutMS=config.mongo_wait_queue_timeout_ms,
+    readPreference=config.mongo_read_preference,
+    event_listeners=[command_metrics] if config.mongo_monitoring else []
+)
 database = client[DATABASE_NAME]
 
 # Collections
@@ -20,16 +41,119 @@ users_collection = database.get_collection("users")
 chatbots_collection = database.get_collection("chatbots")
 conversations_collection = database.get_collection("conversations")
 usage_collection = database.get_collection("usage_metrics")
+ingestion_jobs_collection = database.get_collection("ingestion_jobs")
+
+# Index requis par les requêtes des routes, par collection
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # Connexion et get_current_user (à chaque requête authentifiée)
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "chatbots": [
+        # Liste des chatbots d'un utilisateur
+        IndexModel([("user_id", ASCENDING)], name="user_id"),
+        # Chatbot public (chaque requête du widget) ; les anciens chatbots sans lien sont ignorés
+        IndexModel(
+            [("share_token", ASCENDING)],
+            name="share_token_unique",
+            unique=True,
+            partialFilterExpression={"share_token": {"$type": "string"}}
+        ),
+    ],
+    "conversations": [
+        # Historique d'un chatbot (plus récentes d'abord) et suppression de ses conversations
+        IndexModel([("chatbot_id", ASCENDING), ("created_at", DESCENDING)], name="chatbot_id_created_at"),
+    ],
+    "ingestion_jobs": [
+        # Reprise des jobs en attente ou abandonnés au démarrage
+        IndexModel([("status", ASCENDING), ("created_at", ASCENDING)], name="status_created_at"),
+    ],
+}
+
+# Requêtes représentatives des routes, vérifiées par audit_query_plans :
+# (description, collection, filtre, tri)
+AUDITED_QUERIES = [
+    ("utilisateur par email", "users", {"email": "audit@example.com"}, None),
+    ("chatbots d'un utilisateur", "chatbots", {"user_id": "000000000000000000000000"}, None),
+    ("chatbot par lien de partage", "chatbots", {"share_token": "audit"}, None),
+    ("historique des conversations", "conversations", {"chatbot_id": "audit"}, [("created_at", DESCENDING)]),
+    ("suppression des conversations", "conversations", {"chatbot_id": "audit"}, None),
+    (
+        "reprise des jobs d'ingestion",
+        "ingestion_jobs",
+        {"$or": [{"status": "pending"}, {"status": "running", "lease_expires_at": {"$lt": datetime(1970, 1, 1)}}]},
+        [("created_at", ASCENDING)]
+    ),
+]
+
+
+async def ensure_indexes():
+    """Crée les index manquants (sans effet sur ceux qui existent déjà)"""
+    for collection_name, indexes in INDEXES.items():
+        try:
+            await database[collection_name].create_indexes(indexes)
+        except OperationFailure as e:
+            # Ex: doublons existants empêchant un index unique ; l'application démarre quand même
+            print(f"⚠️  Index de {collection_name} non créés: {e}")
+    print("🗂️  Index MongoDB vérifiés")
+
+
+def _plan_stages(plan) -> List[str]:
+    """Liste récursivement les étapes (stage) d'un plan d'exécution"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+async def audit_query_plans() -> List[str]:
+    """
+    Vérifie avec explain() le plan de chaque requête de AUDITED_QUERIES
+
+    Returns:
+        Descriptions des requêtes qui parcourent toute la collection (COLLSCAN)
+    """
+    collection_scans = []
+    for description, collection_name, query, sort in AUDITED_QUERIES:
+        cursor = database[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        try:
+            explanation = await cursor.explain()
+        except Exception as e:
+            print(f"⚠️  explain() impossible pour « {description} »: {e}")
+            continue
+        winning_plan = explanation.get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _plan_stages(winning_plan):
+            collection_scans.append(description)
+            print(f"🐢 COLLSCAN: « {description} » ({collection_name} {query})")
+    if not collection_scans:
+        print("✅ Aucune requête auditée ne parcourt toute une collection")
+    return collection_scans
 
 
 async def connect_to_mongo():
-    """Connexion à MongoDB"""
+    """Connexion à MongoDB, création des index et audit optionnel des plans de requête"""
     try:
         # Ping pour vérifier la connexion
         await client.admin.command('ping')
         print("✅ Connecté à MongoDB!")
     except Exception as e:
         print(f"❌ Erreur de connexion à MongoDB: {e}")
+        return
+    
+    try:
+        await ensure_indexes()
+        if MONGODB_QUERY_AUDIT:
+            await audit_query_plans()
+    except Exception as e:
+        print(f"❌ Erreur lors de la création des index MongoDB: {e}")
 
 
 async def close_mongo_connection():
@@ -1,47 +1,169 @@
 """
 Utilitaire pour compter les tokens des messages Mistral
+
+Le tokenizer est chargé une seule fois par processus. Par défaut, tiktoken sert
+d'estimation (proche de Mistral) ; avec RAG_TOKENIZER=mistral, le tokenizer officiel
+du modèle (paquet optionnel mistral-common) donne un compte exact.
 """
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional
+
 import tiktoken
 
+from app.core.config import config
+
+# Modèle tiktoken utilisé par défaut (compatible)
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+# Pool partagé du tokenizer Mistral (créé au premier usage, `tokenizer_threads` threads).
+# Distinct de `retrieval_executor` : le contexte est préparé depuis ce pool-là
+_encode_executor: Optional[ThreadPoolExecutor] = None
+_encode_executor_lock = threading.Lock()
+
+
+def _tokenizer_executor() -> ThreadPoolExecutor:
+    """Retourne le pool de threads du tokenizer Mistral"""
+    global _encode_executor
+    with _encode_executor_lock:
+        if _encode_executor is None:
+            _encode_executor = ThreadPoolExecutor(
+                max_workers=config.tokenizer_threads,
+                thread_name_prefix="tokenizer"
+            )
+        return _encode_executor
+
+
+class MistralEncoding:
+    """Tokenizer mistral-common exposé avec l'interface de tiktoken (encode, decode, encode_batch)"""
+
+    def __init__(self, model: str):
+        """
+        Charge le tokenizer d'un modèle Mistral
+
+        Args:
+            model: Nom du modèle Mistral (ex: mistral-small-latest)
+        """
+        from mistral_common.tokens.tokenizers.mistral import MistralTokenizer
+
+        self._tokenizer = MistralTokenizer.from_model(model).instruct_tokenizer.tokenizer
+
+    def encode(self, text: str, **kwargs) -> List[int]:
+        return self._tokenizer.encode(text, bos=False, eos=False)
+
+    def decode(self, tokens: List[int]) -> str:
+        return self._tokenizer.decode(tokens)
+
+    def encode_batch(self, texts: List[str], num_threads: int = 8, **kwargs) -> List[List[int]]:
+        # `num_threads` garde l'interface de tiktoken : le pool partagé est dimensionné par la config
+        return list(_tokenizer_executor().map(self.encode, texts))
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = DEFAULT_MODEL):
+    """
+    Retourne le tokenizer (chargé une seule fois par processus)
+
+    Args:
+        model: Le modèle de tokenizer tiktoken (ignoré avec le tokenizer Mistral)
+
+    Returns:
+        L'encodage tiktoken, ou un MistralEncoding si RAG_TOKENIZER=mistral
+    """
+    if config.tokenizer == "mistral":
+        try:
+            return MistralEncoding(config.mistral_model)
+        except Exception as e:
+            print(f"⚠️  Tokenizer Mistral indisponible ({e}), utilisation de tiktoken")
+    return tiktoken.encoding_for_model(model)
+
 
-def count_tokens(text: str, model: str = "gpt-3.5-turbo") -> int:
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
     """
     Compte le nombre de tokens dans un texte.
-    Utilise le tokenizer de tiktoken (compatible avec Mistral).
-    
+    Utilise le tokenizer de tiktoken (compatible avec Mistral) ou celui de Mistral.
+
     Args:
         text: Le texte à analyser
         model: Le modèle de tokenizer (par défaut gpt-3.5-turbo, compatible)
-    
+
     Returns:
         Le nombre de tokens
     """
     try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
+        # Les tokens spéciaux éventuels du texte sont comptés comme du texte
+        return len(get_encoding(model).encode(text, disallowed_special=()))
     except Exception as e:
         # Fallback simple: approximation basée sur les caractères
         # En moyenne, 1 token ≈ 4 caractères pour le français
         return len(text) // 4
 
 
+def count_tokens_batch(texts: List[str], model: str = DEFAULT_MODEL) -> List[int]:
+    """
+    Compte les tokens de plusieurs textes en un appel (encodage réparti sur
+    `tokenizer_threads` threads, le tokenizer de tiktoken libérant le GIL).
+
+    Args:
+        texts: Les textes à analyser
+        model: Le modèle de tokenizer
+
+    Returns:
+        Le nombre de tokens de chaque texte, dans l'ordre
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    try:
+        encoded = get_encoding(model).encode_batch(
+            texts, num_threads=config.tokenizer_threads, disallowed_special=()
+        )
+        return [len(tokens) for tokens in encoded]
+    except Exception:
+        return [len(text) // 4 for text in texts]
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = DEFAULT_MODEL) -> str:
+    """
+    Coupe un texte pour qu'il ne dépasse pas un nombre de tokens.
+
+    Args:
+        text: Le texte à couper
+        max_tokens: Nombre maximum de tokens conservés
+        model: Le modèle de tokenizer
+
+    Returns:
+        Le début du texte tenant dans `max_tokens` tokens
+    """
+    if max_tokens <= 0:
+        return ""
+    try:
+        encoding = get_encoding(model)
+        tokens = encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        return encoding.decode(tokens[:max_tokens])
+    except Exception:
+        # Même approximation que count_tokens
+        return text[:max_tokens * 4]
+
+
 def count_conversation_tokens(messages: list) -> int:
     """
     Compte le nombre de tokens dans une liste de messages.
-    
+
     Args:
         messages: Liste de dictionnaires avec 'role' et 'content'
-    
+
     Returns:
         Le nombre total de tokens
     """
-    total = 0
+    # Rôles et contenus comptés en un seul appel
+    texts = []
     for msg in messages:
-        # Compte le rôle
-        total += count_tokens(msg.get('role', ''))
-        # Compte le contenu
-        total += count_tokens(msg.get('content', ''))
-        # Overhead pour le formatage (environ 4 tokens par message)
-        total += 4
-    
-    return total
+        texts.append(msg.get('role', ''))
+        texts.append(msg.get('content', ''))
+
+    # Overhead pour le formatage (environ 4 tokens par message)
+    return sum(count_tokens_batch(texts)) + 4 * len(messages)
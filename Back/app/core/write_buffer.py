@@ -0,0 +1,229 @@
+"""
+Écritures MongoDB différées : conversations et compteurs de tokens des chatbots
+
+Chaque réponse ajoutait un `insert_one` de conversation et un `update_one` `$inc`
+sur le document du chatbot : sous un trafic public en rafale, toutes les requêtes
+d'un même chatbot se disputaient ce document. Les routes déposent désormais leurs
+écritures dans ce tampon, vidé par une tâche de fond (`insert_many` + `bulk_write`
+avec un seul `$inc` cumulé par chatbot) toutes les `write_buffer_flush_interval_ms`
+ou dès que `write_buffer_max_batch` écritures attendent, et vidé une dernière fois
+à l'arrêt de l'application.
+"""
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from app.core.config import config
+from app.core.mongodb import chatbots_collection, conversations_collection
+
+# Compteurs de tokens cumulés par chatbot
+USAGE_FIELDS = {
+    "prompt_tokens": "total_prompt_tokens",
+    "completion_tokens": "total_completion_tokens",
+    "total_tokens": "total_tokens"
+}
+
+
+class WriteBuffer:
+    """Tampon en mémoire des conversations et des incréments de tokens, vidé en lots"""
+
+    def __init__(self):
+        """Initialise le tampon (la tâche de vidage est démarrée par `start`)"""
+        self._conversations: List[dict] = []
+        self._usage: Dict[str, Dict[str, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flushes = 0
+        self._flush_errors = 0
+        self._written_conversations = 0
+        self._written_usage_updates = 0
+        self._dropped_conversations = 0
+        self._last_flush_ms = 0.0
+        self._max_depth = 0
+
+    @property
+    def depth(self) -> int:
+        """Nombre d'écritures en attente (conversations + chatbots à incrémenter)"""
+        return len(self._conversations) + len(self._usage)
+
+    async def start(self):
+        """Démarre la tâche de vidage périodique"""
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        """Arrête la tâche de vidage puis écrit tout ce qui reste en attente"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self.depth:
+            print(f"⚠️  {self.depth} écritures non enregistrées à l'arrêt")
+
+    def add_conversation(self, conversation: dict):
+        """
+        Met une conversation en attente d'insertion
+
+        Args:
+            conversation: Document de la conversation
+        """
+        self._conversations.append(conversation)
+        self._on_write()
+
+    def add_usage(self, chatbot_id: str, usage: Dict):
+        """
+        Cumule l'usage d'une réponse dans l'incrément en attente du chatbot
+
+        Args:
+            chatbot_id: ID du chatbot
+            usage: Stats d'usage Mistral (prompt_tokens, completion_tokens, total_tokens)
+        """
+        if not usage or not usage.get("total_tokens"):
+            return
+        pending = self._usage.setdefault(chatbot_id, dict.fromkeys(USAGE_FIELDS, 0))
+        for key in USAGE_FIELDS:
+            pending[key] += usage.get(key, 0) or 0
+        self._on_write()
+
+    def discard_chatbot(self, chatbot_id: str):
+        """
+        Oublie les écritures en attente d'un chatbot supprimé
+
+        Args:
+            chatbot_id: ID du chatbot
+        """
+        self._conversations = [
+            conversation for conversation in self._conversations
+            if conversation.get("chatbot_id") != chatbot_id
+        ]
+        self._usage.pop(chatbot_id, None)
+
+    def _on_write(self):
+        """Réveille la tâche de vidage si le lot est plein, et borne la mémoire utilisée"""
+        self._max_depth = max(self._max_depth, self.depth)
+        # MongoDB indisponible trop longtemps : abandonner les plus anciennes conversations
+        overflow = len(self._conversations) - config.write_buffer_max_pending
+        if overflow > 0:
+            del self._conversations[:overflow]
+            self._dropped_conversations += overflow
+        if self._wakeup is not None and self.depth >= config.write_buffer_max_batch:
+            self._wakeup.set()
+
+    async def _flush_loop(self):
+        """Vide le tampon à intervalle régulier, ou plus tôt quand un lot est plein"""
+        interval = config.write_buffer_flush_interval_ms / 1000
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if not await self.flush():
+                # MongoDB en erreur : attendre un intervalle complet avant de réessayer
+                await asyncio.sleep(interval)
+
+    async def flush(self) -> bool:
+        """
+        Écrit les conversations (insert_many) et les incréments de tokens (bulk_write)
+
+        Returns:
+            False si une écriture a échoué (elle reste en attente)
+        """
+        if not self.depth:
+            return True
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            # Échanger les tampons : les nouvelles écritures partent dans des listes neuves
+            conversations, self._conversations = self._conversations, []
+            usage, self._usage = self._usage, {}
+            errors = self._flush_errors
+            start = time.perf_counter()
+
+            for offset in range(0, len(conversations), config.write_buffer_max_batch):
+                batch = conversations[offset:offset + config.write_buffer_max_batch]
+                try:
+                    await conversations_collection.insert_many(batch, ordered=False)
+                    self._written_conversations += len(batch)
+                except Exception as e:
+                    self._flush_errors += 1
+                    print(f"❌ Erreur lors de l'enregistrement des conversations: {e}")
+                    # Remettre en attente ce qui n'a pas été écrit. insert_many pose l'_id
+                    # des documents : une conversation déjà insérée ne peut pas être dupliquée
+                    failed = self._failed_indexes(e, len(batch))
+                    self._written_conversations += len(batch) - len(failed)
+                    self._conversations[:0] = [batch[i] for i in failed] + conversations[offset + len(batch):]
+                    break
+
+            if usage:
+                chatbot_ids = list(usage)
+                operations = [
+                    UpdateOne(
+                        {"_id": ObjectId(chatbot_id)},
+                        {"$inc": {field: usage[chatbot_id][key] for key, field in USAGE_FIELDS.items()}}
+                    )
+                    for chatbot_id in chatbot_ids
+                ]
+                try:
+                    await chatbots_collection.bulk_write(operations, ordered=False)
+                    self._written_usage_updates += len(operations)
+                except Exception as e:
+                    self._flush_errors += 1
+                    print(f"❌ Erreur lors de la mise à jour des tokens: {e}")
+                    failed = self._failed_indexes(e, len(operations))
+                    self._written_usage_updates += len(operations) - len(failed)
+                    for i in failed:
+                        pending = self._usage.setdefault(chatbot_ids[i], dict.fromkeys(USAGE_FIELDS, 0))
+                        for key in USAGE_FIELDS:
+                            pending[key] += usage[chatbot_ids[i]][key]
+
+            self._flushes += 1
+            self._last_flush_ms = (time.perf_counter() - start) * 1000
+            return self._flush_errors == errors
+
+    @staticmethod
+    def _failed_indexes(error: Exception, count: int) -> List[int]:
+        """
+        Positions des écritures d'un lot non ordonné à réessayer
+
+        Args:
+            error: Exception levée par insert_many / bulk_write
+            count: Taille du lot
+
+        Returns:
+            Toutes les positions si l'erreur ne détaille pas le lot (réseau...),
+            sinon celles en erreur, hors doublons de clé (déjà écrites)
+        """
+        details = getattr(error, "details", None)
+        if not isinstance(details, dict) or "writeErrors" not in details:
+            return list(range(count))
+        return [
+            write_error["index"]
+            for write_error in details["writeErrors"]
+            if write_error.get("code") != 11000
+        ]
+
+    def get_stats(self) -> dict:
+        """Retourne la profondeur du tampon et les compteurs d'écriture"""
+        return {
+            "pending_conversations": len(self._conversations),
+            "pending_usage_updates": len(self._usage),
+            "max_depth": self._max_depth,
+            "flushes": self._flushes,
+            "flush_errors": self._flush_errors,
+            "written_conversations": self._written_conversations,
+            "written_usage_updates": self._written_usage_updates,
+            "dropped_conversations": self._dropped_conversations,
+            "last_flush_ms": round(self._last_flush_ms, 2)
+        }
+
+
+# Instance globale du tampon d'écriture
+write_buffer = WriteBuffer()
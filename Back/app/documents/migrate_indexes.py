@@ -0,0 +1,42 @@
+"""
+Conversion des index à l'ancien format (FAISS LangChain + docstore picklé)
+vers les segments IndexIDMap et le chunk store SQLite
+
+Usage (depuis le dossier Back, serveur arrêté de préférence):
+    python -m app.documents.migrate_indexes
+"""
+import os
+
+from app.core.config import config
+from app.documents.services.document_indexer import DocumentIndexer
+
+
+def migrate_all_indexes(index_path: str = None) -> int:
+    """
+    Convertit tous les index des chatbots restés à l'ancien format
+
+    Args:
+        index_path: Dossier contenant les index des chatbots
+
+    Returns:
+        Nombre d'index convertis
+    """
+    index_path = index_path or config.index_path
+    if not os.path.isdir(index_path):
+        return 0
+
+    migrated = 0
+    for chatbot_id in sorted(os.listdir(index_path)):
+        if not os.path.isdir(os.path.join(index_path, chatbot_id)):
+            continue
+        try:
+            if DocumentIndexer(chatbot_id, index_path=index_path).migrate_legacy():
+                migrated += 1
+        except Exception as e:
+            print(f"❌ Erreur lors de la conversion de l'index {chatbot_id}: {e}")
+
+    return migrated
+
+
+if __name__ == "__main__":
+    print(f"✅ {migrate_all_indexes()} index converti(s)")
@@ -0,0 +1,242 @@
+"""
+Index FAISS approximatifs (ANN) : IVF-Flat, HNSW et IVF-PQ
+
+Un index plat (recherche exacte) est linéaire en nombre de chunks ; au-delà de
+`ann_promotion_threshold` vecteurs, l'index d'un chatbot est reconstruit avec le
+type choisi (config globale ou réglage du chatbot), entraîné sur un échantillon.
+"""
+import math
+from typing import Optional, Tuple
+
+import faiss
+import numpy as np
+
+from app.core.config import config
+
+INDEX_FLAT = "flat"
+INDEX_IVF_FLAT = "ivf_flat"
+INDEX_HNSW = "hnsw"
+INDEX_IVF_PQ = "ivf_pq"
+
+INDEX_TYPES = (INDEX_FLAT, INDEX_IVF_FLAT, INDEX_HNSW, INDEX_IVF_PQ)
+
+# Nombre minimum de points d'entraînement par centroïde recommandé par FAISS
+_MIN_POINTS_PER_CENTROID = 39
+
+# Bits par sous-quantifieur PQ (256 centroïdes par sous-espace)
+_PQ_NBITS = 8
+
+
+def unwrap(index: faiss.Index) -> faiss.Index:
+    """Index interne d'un IndexIDMap (ou l'index lui-même), sous son type concret"""
+    index = faiss.downcast_index(index)
+    if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        index = faiss.downcast_index(index.index)
+    return index
+
+
+def index_type_of(index: faiss.Index) -> str:
+    """
+    Type d'un index FAISS
+
+    Args:
+        index: Index FAISS
+
+    Returns:
+        Un des INDEX_TYPES
+    """
+    index = unwrap(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return INDEX_HNSW
+    if isinstance(index, faiss.IndexIVFPQ):
+        return INDEX_IVF_PQ
+    if isinstance(index, faiss.IndexIVF):
+        return INDEX_IVF_FLAT
+    return INDEX_FLAT
+
+
+def is_lossy(index: faiss.Index) -> bool:
+    """Les vecteurs d'origine ne sont pas récupérables exactement (quantification PQ)"""
+    return index_type_of(index) == INDEX_IVF_PQ
+
+
+def target_index_type(index_type: Optional[str], ntotal: int) -> str:
+    """
+    Type d'index à utiliser pour un nombre de vecteurs donné
+
+    Args:
+        index_type: Type choisi (réglage du chatbot), ou None pour celui de la config
+        ntotal: Nombre de vecteurs de l'index
+
+    Returns:
+        Le type choisi au-delà du seuil de promotion, sinon un index plat
+    """
+    index_type = index_type or config.ann_index_type
+    if ntotal < config.ann_promotion_threshold:
+        return INDEX_FLAT
+    return index_type
+
+
+def _auto_nlist(ntotal: int, train_size: int) -> int:
+    """Nombre de listes IVF : ~4·√n, borné par la taille de l'échantillon d'entraînement"""
+    nlist = config.ann_nlist or int(4 * math.sqrt(ntotal))
+    return max(1, min(nlist, train_size // _MIN_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Plus grand diviseur de la dimension ne dépassant pas `ann_pq_m`"""
+    for m in range(min(config.ann_pq_m, dimension), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def sample_training_vectors(vectors: np.ndarray, sample_size: int = None, seed: int = 0) -> np.ndarray:
+    """
+    Échantillon aléatoire des vecteurs pour l'entraînement des quantifieurs
+
+    Args:
+        vectors: Matrice (n, d) des vecteurs
+        sample_size: Taille maximale de l'échantillon (par défaut celle de la config)
+        seed: Graine du tirage (reconstructions reproductibles)
+
+    Returns:
+        Matrice de l'échantillon
+    """
+    sample_size = sample_size or config.ann_train_sample_size
+    if len(vectors) <= sample_size:
+        return vectors
+    rng = np.random.default_rng(seed)
+    positions = rng.choice(len(vectors), size=sample_size, replace=False)
+    return vectors[np.sort(positions)]
+
+
+def build_index(
+    vectors: np.ndarray,
+    index_type: str,
+    metric: int = faiss.METRIC_L2,
+    ids: Optional[np.ndarray] = None
+) -> faiss.Index:
+    """
+    Construit un index du type demandé et y ajoute les vecteurs
+
+    Args:
+        vectors: Matrice (n, d) float32 des vecteurs
+        index_type: Un des INDEX_TYPES
+        metric: Métrique FAISS (celle de l'index d'origine)
+        ids: Ids des vecteurs (ids des chunks) ; l'index est alors un IndexIDMap
+
+    Returns:
+        L'index FAISS entraîné et rempli
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Type d'index inconnu: {index_type}")
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ntotal, dimension = vectors.shape
+
+    if index_type == INDEX_FLAT:
+        index = faiss.IndexFlat(dimension, metric)
+
+    elif index_type == INDEX_HNSW:
+        index = faiss.IndexHNSWFlat(dimension, config.ann_hnsw_m, metric)
+        index.hnsw.efConstruction = config.ann_hnsw_ef_construction
+
+    else:
+        train = sample_training_vectors(vectors)
+        nlist = _auto_nlist(ntotal, len(train))
+        quantizer = faiss.IndexFlat(dimension, metric)
+        if index_type == INDEX_IVF_PQ:
+            if len(train) < 2 ** _PQ_NBITS:
+                raise ValueError("Pas assez de vecteurs pour entraîner un index IVF-PQ")
+            index = faiss.IndexIVFPQ(
+                quantizer, dimension, nlist, _pq_subquantizers(dimension), _PQ_NBITS, metric
+            )
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, metric)
+        # L'index doit garder une référence au quantifieur
+        index.own_fields = True
+        quantizer.this.disown()
+        index.train(train)
+
+    configure_search(index)
+    if ids is not None:
+        index = faiss.IndexIDMap(index)
+        if ntotal:
+            index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+    elif ntotal:
+        index.add(vectors)
+    return index
+
+
+def configure_search(index: faiss.Index, nprobe: int = None, ef_search: int = None):
+    """
+    Applique les paramètres de recherche (compromis rappel / latence)
+
+    Args:
+        index: Index FAISS
+        nprobe: Listes IVF visitées par requête (par défaut `ann_nprobe`)
+        ef_search: Taille de la file HNSW à la recherche (par défaut `ann_ef_search`)
+    """
+    index = unwrap(index)
+    index_type = index_type_of(index)
+    if index_type in (INDEX_IVF_FLAT, INDEX_IVF_PQ):
+        index.nprobe = nprobe or config.ann_nprobe
+    elif index_type == INDEX_HNSW:
+        index.hnsw.efSearch = ef_search or config.ann_ef_search
+
+
+def extract_vectors(index: faiss.Index) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """
+    Récupère tous les vecteurs d'un index, dans l'ordre des positions
+
+    Args:
+        index: Index FAISS (éventuellement un IndexIDMap)
+
+    Returns:
+        Tuple (matrice (ntotal, d) float32, ids des vecteurs ou None sans IndexIDMap).
+        Les vecteurs sont approximatifs pour un index PQ.
+    """
+    ids = None
+    outer = faiss.downcast_index(index)
+    if isinstance(outer, (faiss.IndexIDMap, faiss.IndexIDMap2)):
+        ids = faiss.vector_to_array(outer.id_map).astype(np.int64)
+
+    inner = unwrap(index)
+    if inner.ntotal == 0:
+        return np.zeros((0, inner.d), dtype=np.float32), ids
+    if isinstance(inner, faiss.IndexIVF):
+        # La reconstruction par position d'un index IVF nécessite la table directe
+        inner.make_direct_map()
+    return inner.reconstruct_n(0, inner.ntotal), ids
+
+
+def contains_ids(index: faiss.Index, ids: np.ndarray) -> bool:
+    """Indique si un IndexIDMap contient au moins un des ids donnés"""
+    outer = faiss.downcast_index(index)
+    return bool(np.isin(faiss.vector_to_array(outer.id_map), ids).any())
+
+
+def remove_vectors(index: faiss.Index, ids: np.ndarray) -> faiss.Index:
+    """
+    Retire des vecteurs d'un IndexIDMap modifiable (pas un index projeté en mémoire)
+
+    Args:
+        index: Index FAISS (IndexIDMap)
+        ids: Ids des vecteurs à retirer
+
+    Returns:
+        L'index sans ces vecteurs (reconstruit pour HNSW, qui ne sait pas supprimer)
+    """
+    ids = np.asarray(ids, dtype=np.int64)
+    if index_type_of(index) == INDEX_HNSW:
+        vectors, index_ids = extract_vectors(index)
+        keep = ~np.isin(index_ids, ids)
+        return build_index(vectors[keep], INDEX_HNSW, metric=index.metric_type, ids=index_ids[keep])
+
+    inner = unwrap(index)
+    if isinstance(inner, faiss.IndexIVF):
+        # La suppression n'est pas compatible avec la table directe (tableau)
+        inner.make_direct_map(False)
+    index.remove_ids(ids)
+    return index
@@ -0,0 +1,121 @@
+"""
+Calcul des embeddings par lots, sur un pool multi-processus sentence-transformers si configuré
+"""
+import threading
+import time
+from typing import List
+
+from app.core.config import config
+from app.documents.services.embedding_registry import embedding_registry
+
+# Débit cumulé des embeddings calculés dans ce processus
+_throughput_lock = threading.Lock()
+_throughput = {"chunks": 0, "seconds": 0.0, "batches": 0}
+
+
+def _record_throughput(chunks: int, seconds: float):
+    with _throughput_lock:
+        _throughput["chunks"] += chunks
+        _throughput["seconds"] += seconds
+        _throughput["batches"] += 1
+
+
+def get_throughput_stats() -> dict:
+    """
+    Retourne le débit cumulé des embeddings de ce processus
+
+    Returns:
+        Dictionnaire avec le nombre de chunks, la durée et les chunks/sec
+    """
+    with _throughput_lock:
+        seconds = _throughput["seconds"]
+        return {
+            "chunks": _throughput["chunks"],
+            "batches": _throughput["batches"],
+            "seconds": round(seconds, 3),
+            "chunks_per_second": round(_throughput["chunks"] / seconds, 1) if seconds else 0.0
+        }
+
+
+class BatchEmbedder:
+    """Encode des chunks par lots de taille configurable"""
+
+    def __init__(
+        self,
+        model_name: str = None,
+        device: str = None,
+        batch_size: int = None,
+        pool_workers: int = 0
+    ):
+        """
+        Initialise l'encodeur
+
+        Args:
+            model_name: Modèle d'embeddings (par défaut celui de la config)
+            device: Device d'exécution (par défaut celui de la config)
+            batch_size: Nombre de chunks par lot passé au modèle
+            pool_workers: Nombre de processus d'encodage (0 = encodage dans le processus courant)
+        """
+        self.model_name = model_name or config.embedding_model
+        self.device = device or config.embedding_device
+        self.batch_size = batch_size or config.embedding_batch_size
+        self.pool_workers = pool_workers
+        self._pool = None
+
+    @property
+    def model(self):
+        """Modèle SentenceTransformer sous-jacent (partagé via le registre)"""
+        return embedding_registry.get(self.model_name, self.device).client
+
+    def start_pool(self):
+        """Démarre le pool multi-processus de sentence-transformers"""
+        if self.pool_workers > 0 and self._pool is None:
+            self._pool = self.model.start_multi_process_pool(
+                target_devices=[self.device] * self.pool_workers
+            )
+
+    def stop_pool(self):
+        """Arrête le pool multi-processus"""
+        if self._pool is not None:
+            self.model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+    def __enter__(self):
+        self.start_pool()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop_pool()
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Calcule les embeddings normalisés d'une liste de textes
+
+        Args:
+            texts: Textes à encoder
+
+        Returns:
+            Liste des vecteurs, dans l'ordre des textes
+        """
+        if not texts:
+            return []
+
+        start = time.perf_counter()
+        if self._pool is not None:
+            vectors = self.model.encode_multi_process(
+                texts,
+                self._pool,
+                batch_size=self.batch_size,
+                normalize_embeddings=True
+            )
+        else:
+            vectors = self.model.encode(
+                texts,
+                batch_size=self.batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            )
+        _record_throughput(len(texts), time.perf_counter() - start)
+
+        return vectors.tolist()
@@ -0,0 +1,485 @@
+"""
+Stockage des chunks d'un index (texte + métadonnées) dans SQLite, lus à la demande
+
+Les ids des chunks sont aussi les ids des vecteurs dans les segments FAISS
+(IndexIDMap) : une recherche retourne directement les ids à lire ici, et seuls
+les k résultats sont lus. Le fichier source, la page et les positions du chunk
+sont des colonnes (indexées pour le fichier) ; les autres métadonnées restent en JSON.
+
+Un chunk dédupliqué peut appartenir à plusieurs documents (`chunk_sources`) : supprimer
+un document ne retire que les chunks qu'aucun autre document ne référence.
+
+Le texte des chunks est aussi indexé dans `chunks_fts` (FTS5, BM25) pour la recherche
+lexicale, mis à jour dans les mêmes transactions que la table `chunks`. La fréquence
+documentaire de chaque terme est tenue à jour dans `term_stats` (lecture en O(log n),
+quand la table fts5vocab parcourt toute la liste de postings du terme).
+"""
+import json
+import os
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.config import config
+from app.documents.services.keyword_index import (
+    FTS_TOKENIZER, match_expression, query_terms, select_terms, tokenize
+)
+
+CHUNKS_DB = "chunks.db"
+
+# Métadonnées stockées dans des colonnes dédiées
+_COLUMNS = ("filename", "page", "start_index", "end_index")
+
+
+class ChunkStore:
+    """Chunks d'un index, partagés entre threads et processus (SQLite en WAL)"""
+
+    def __init__(self, db_path: str):
+        """
+        Initialise le store (la base est ouverte au premier accès)
+
+        Args:
+            db_path: Chemin du fichier SQLite
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        # Connexions ouvertes par tous les threads, fermées ensemble par `close`
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._generation = 0
+        # Désactivée si SQLite est compilé sans FTS5
+        self.keyword_search_enabled = True
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connexion SQLite propre au thread courant (rouverte après `close`)"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.generation != self._generation:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            # Utilisée par un seul thread, mais fermée par celui qui appelle `close`
+            connection = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            with self._connections_lock:
+                self._connections.append(connection)
+                self._local.generation = self._generation
+            self._local.published_count = None
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            # AUTOINCREMENT : un id supprimé n'est jamais réattribué (ids FAISS stables)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " content_hash TEXT,"
+                " filename TEXT,"
+                " page INTEGER,"
+                " start_index INTEGER,"
+                " end_index INTEGER,"
+                " text TEXT NOT NULL,"
+                " metadata TEXT NOT NULL,"
+                " committed INTEGER NOT NULL DEFAULT 0"
+                ")"
+            )
+            # Bases créées avant l'ajout des colonnes de position
+            existing = {row[1] for row in connection.execute("PRAGMA table_info(chunks)")}
+            for column in _COLUMNS:
+                if column not in existing:
+                    column_type = "TEXT" if column == "filename" else "INTEGER"
+                    connection.execute(f"ALTER TABLE chunks ADD COLUMN {column} {column_type}")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_chunks_hash ON chunks (content_hash)")
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_chunks_filename ON chunks (filename)")
+            has_sources = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunk_sources'"
+            ).fetchone()
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS chunk_sources ("
+                " chunk_id INTEGER NOT NULL,"
+                " filename TEXT NOT NULL,"
+                " PRIMARY KEY (chunk_id, filename)"
+                ") WITHOUT ROWID"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_sources_filename ON chunk_sources (filename)")
+            if not has_sources:
+                # Bases existantes : chaque chunk appartient au fichier qui l'a créé
+                with connection:
+                    connection.execute(
+                        "INSERT OR IGNORE INTO chunk_sources (chunk_id, filename)"
+                        " SELECT id, filename FROM chunks WHERE filename IS NOT NULL"
+                    )
+            self._create_keyword_index(connection)
+            self._local.connection = connection
+        return connection
+
+    def close(self):
+        """Ferme les connexions de tous les threads (un accès ultérieur en rouvre une)"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for connection in connections:
+            try:
+                connection.close()
+            except sqlite3.Error:
+                pass
+
+    def _create_keyword_index(self, connection: sqlite3.Connection):
+        """Crée l'index inversé FTS5 (contenu externe : le texte reste dans `chunks`)"""
+        has_fts = connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chunks_fts'"
+        ).fetchone()
+        try:
+            connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5("
+                f" text, content='chunks', content_rowid='id', tokenize='{FTS_TOKENIZER}'"
+                ")"
+            )
+            # Fréquence documentaire de chaque terme
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS term_stats ("
+                " term TEXT PRIMARY KEY,"
+                " df INTEGER NOT NULL"
+                ") WITHOUT ROWID"
+            )
+        except sqlite3.OperationalError as e:
+            if self.keyword_search_enabled:
+                print(f"⚠️  Recherche lexicale indisponible (FTS5): {e}")
+            self.keyword_search_enabled = False
+            return
+        if not has_fts:
+            # Bases existantes : indexer les chunks déjà présents
+            with connection:
+                connection.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+                cursor = connection.execute("SELECT text FROM chunks")
+                while True:
+                    rows = cursor.fetchmany(1000)
+                    if not rows:
+                        break
+                    self._update_term_stats(connection, (text for (text,) in rows), 1)
+
+    @staticmethod
+    def _update_term_stats(connection: sqlite3.Connection, texts: Iterable[str], sign: int):
+        """
+        Met à jour la fréquence documentaire des termes de chunks ajoutés (+1) ou supprimés (-1)
+
+        Args:
+            connection: Connexion (transaction en cours)
+            texts: Textes des chunks
+            sign: 1 pour un ajout, -1 pour une suppression
+        """
+        frequencies = Counter()
+        for text in texts:
+            frequencies.update(set(tokenize(text)))
+        if sign > 0:
+            connection.executemany(
+                "INSERT INTO term_stats (term, df) VALUES (?, ?)"
+                " ON CONFLICT (term) DO UPDATE SET df = df + excluded.df",
+                frequencies.items()
+            )
+        else:
+            connection.executemany(
+                "UPDATE term_stats SET df = df - ? WHERE term = ?",
+                [(df, term) for term, df in frequencies.items()]
+            )
+            connection.execute("DELETE FROM term_stats WHERE df <= 0")
+
+    def add(self, texts: List[str], metadatas: List[dict], source: Optional[str] = None) -> List[int]:
+        """
+        Enregistre des chunks (non validés tant que leur segment n'est pas publié)
+
+        Args:
+            texts: Textes des chunks
+            metadatas: Métadonnées de chaque chunk
+            source: Document auquel rattacher les chunks (par défaut, leur `filename`)
+
+        Returns:
+            Ids attribués, dans l'ordre des textes
+        """
+        connection = self._connection()
+        ids = []
+        with connection:
+            for text, metadata in zip(texts, metadatas):
+                extra = {key: value for key, value in metadata.items() if key not in _COLUMNS}
+                start_index = metadata.get("start_index")
+                cursor = connection.execute(
+                    "INSERT INTO chunks"
+                    " (content_hash, filename, page, start_index, end_index, text, metadata)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        metadata.get("content_hash"),
+                        metadata.get("filename"),
+                        metadata.get("page"),
+                        start_index,
+                        start_index + len(text) if start_index is not None else None,
+                        text,
+                        json.dumps(extra, default=str)
+                    )
+                )
+                ids.append(cursor.lastrowid)
+                if self.keyword_search_enabled:
+                    connection.execute(
+                        "INSERT INTO chunks_fts (rowid, text) VALUES (?, ?)",
+                        (cursor.lastrowid, text)
+                    )
+                chunk_source = source or metadata.get("filename")
+                if chunk_source is not None:
+                    connection.execute(
+                        "INSERT OR IGNORE INTO chunk_sources (chunk_id, filename) VALUES (?, ?)",
+                        (cursor.lastrowid, chunk_source)
+                    )
+            if self.keyword_search_enabled:
+                self._update_term_stats(connection, texts, 1)
+        return ids
+
+    def commit(self, ids: List[int]):
+        """
+        Marque des chunks comme publiés (leur segment est référencé par le manifeste).
+        Un chunk jamais validé (crash entre les deux étapes) est ignoré par la déduplication.
+
+        Args:
+            ids: Ids des chunks
+        """
+        connection = self._connection()
+        with connection:
+            connection.executemany("UPDATE chunks SET committed = 1 WHERE id = ?", [(i,) for i in ids])
+
+    def get_many(self, ids: List[int]) -> Dict[int, Document]:
+        """
+        Lit les chunks demandés
+
+        Args:
+            ids: Ids des chunks
+
+        Returns:
+            Dictionnaire {id: Document}
+        """
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        rows = self._connection().execute(
+            "SELECT id, filename, page, start_index, end_index, text, metadata"
+            f" FROM chunks WHERE id IN ({placeholders})",
+            [int(i) for i in ids]
+        )
+        documents = {}
+        for chunk_id, filename, page, start_index, end_index, text, metadata in rows:
+            metadata = json.loads(metadata)
+            for key, value in zip(_COLUMNS, (filename, page, start_index, end_index)):
+                if value is not None:
+                    metadata[key] = value
+            documents[chunk_id] = Document(page_content=text, metadata=metadata)
+        return documents
+
+    def find_hashes(self, hashes: List[str]) -> set:
+        """
+        Empreintes déjà publiées parmi celles données (recherche indexée)
+
+        Args:
+            hashes: Empreintes candidates
+
+        Returns:
+            Ensemble des empreintes présentes
+        """
+        found = set()
+        connection = self._connection()
+        unique_hashes = list(dict.fromkeys(hashes))
+        # SQLite limite le nombre de paramètres par requête
+        for start in range(0, len(unique_hashes), 500):
+            batch = unique_hashes[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = connection.execute(
+                f"SELECT content_hash FROM chunks WHERE committed = 1 AND content_hash IN ({placeholders})",
+                batch
+            )
+            found.update(chunk_hash for (chunk_hash,) in rows)
+        return found
+
+    def link_sources(self, filename: str, hashes: List[str]):
+        """
+        Rattache à un document tous ses chunks publiés, y compris ceux
+        dédupliqués parce qu'un autre document les contenait déjà
+
+        Args:
+            filename: Nom du document
+            hashes: Empreintes de tous les chunks du document
+        """
+        connection = self._connection()
+        unique_hashes = list(dict.fromkeys(hashes))
+        with connection:
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                connection.execute(
+                    "INSERT OR IGNORE INTO chunk_sources (chunk_id, filename)"
+                    f" SELECT id, ? FROM chunks WHERE committed = 1 AND content_hash IN ({placeholders})",
+                    [filename, *batch]
+                )
+
+    def orphaned_by(self, filename: str) -> List[int]:
+        """
+        Chunks qui n'appartiennent qu'à ce document
+
+        Args:
+            filename: Nom du document
+
+        Returns:
+            Ids des chunks à retirer de l'index si le document est supprimé
+        """
+        rows = self._connection().execute(
+            "SELECT s.chunk_id FROM chunk_sources s"
+            " WHERE s.filename = ? AND NOT EXISTS ("
+            "  SELECT 1 FROM chunk_sources o WHERE o.chunk_id = s.chunk_id AND o.filename != ?"
+            " )",
+            (filename, filename)
+        )
+        return [chunk_id for (chunk_id,) in rows]
+
+    def rename_source(self, old_filename: str, new_filename: str):
+        """
+        Rattache à `new_filename` tous les chunks de `old_filename` (nouvelle version d'un document)
+
+        Args:
+            old_filename: Nom sous lequel les chunks ont été rattachés
+            new_filename: Nom du document
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO chunk_sources (chunk_id, filename)"
+                " SELECT chunk_id, ? FROM chunk_sources WHERE filename = ?",
+                (new_filename, old_filename)
+            )
+            connection.execute("DELETE FROM chunk_sources WHERE filename = ?", (old_filename,))
+
+    def remove_source(self, filename: str, chunk_ids: List[int]):
+        """
+        Détache un document de ses chunks et supprime ceux qui n'ont plus de document
+
+        Args:
+            filename: Nom du document
+            chunk_ids: Chunks orphelins (déjà retirés des segments FAISS)
+        """
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM chunk_sources WHERE filename = ?", (filename,))
+            for start in range(0, len(chunk_ids), 500):
+                batch = [int(i) for i in chunk_ids[start:start + 500]]
+                placeholders = ",".join("?" * len(batch))
+                if self.keyword_search_enabled:
+                    # Contenu externe : FTS5 a besoin du texte supprimé pour retirer ses postings
+                    connection.execute(
+                        "INSERT INTO chunks_fts (chunks_fts, rowid, text)"
+                        f" SELECT 'delete', id, text FROM chunks WHERE id IN ({placeholders})",
+                        batch
+                    )
+                    removed_texts = connection.execute(
+                        f"SELECT text FROM chunks WHERE id IN ({placeholders})", batch
+                    )
+                    self._update_term_stats(connection, (text for (text,) in removed_texts), -1)
+                connection.execute(f"DELETE FROM chunks WHERE id IN ({placeholders})", batch)
+
+    def count(self) -> int:
+        """Nombre de chunks publiés"""
+        return self._connection().execute("SELECT COUNT(*) FROM chunks WHERE committed = 1").fetchone()[0]
+
+    def _published_count(self, connection: sqlite3.Connection) -> int:
+        """
+        Nombre de chunks publiés (seuil de fréquence des termes), relu seulement si la base
+        a changé : `PRAGMA data_version` change après les écritures des autres connexions
+        (autres threads et autres processus), `total_changes` après celles de celle-ci
+        """
+        version = (connection.execute("PRAGMA data_version").fetchone()[0], connection.total_changes)
+        cached = getattr(self._local, "published_count", None)
+        if cached is None or cached[0] != version:
+            count = connection.execute("SELECT COUNT(*) FROM chunks WHERE committed = 1").fetchone()[0]
+            cached = self._local.published_count = (version, count)
+        return cached[1]
+
+    def keyword_search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """
+        Recherche lexicale BM25 dans les chunks publiés
+
+        Args:
+            query: Requête de l'utilisateur
+            k: Nombre de résultats
+
+        Returns:
+            Liste de tuples (id du chunk, score BM25), du plus pertinent au moins pertinent
+        """
+        terms = query_terms(query, config.bm25_max_query_terms)
+        if not terms:
+            return []
+        connection = self._connection()
+        if not self.keyword_search_enabled:
+            return []
+
+        # Écarter les termes absents ou trop fréquents (listes de postings les plus longues)
+        placeholders = ",".join("?" * len(terms))
+        frequencies = dict.fromkeys(terms, 0)
+        frequencies.update(connection.execute(
+            f"SELECT term, df FROM term_stats WHERE term IN ({placeholders})",
+            terms
+        ))
+        terms = select_terms(
+            frequencies, self._published_count(connection), config.bm25_max_df_ratio, config.bm25_max_postings
+        )
+        if not terms:
+            return []
+
+        # bm25() est négatif : plus petit = plus pertinent
+        rows = connection.execute(
+            "SELECT rowid, bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ?"
+            " ORDER BY rank LIMIT ?",
+            (match_expression(terms), k)
+        ).fetchall()
+        if not rows:
+            return []
+
+        # Ignorer les chunks pas encore publiés (segment FAISS en cours d'écriture)
+        ids = [chunk_id for chunk_id, _ in rows]
+        placeholders = ",".join("?" * len(ids))
+        committed = {
+            chunk_id for (chunk_id,) in connection.execute(
+                f"SELECT id FROM chunks WHERE committed = 1 AND id IN ({placeholders})", ids
+            )
+        }
+        return [(chunk_id, -score) for chunk_id, score in rows if chunk_id in committed]
+
+
+# Un store par fichier, partagé par les indexeurs du processus. Borné comme le cache des
+# index : le store le moins récemment utilisé est fermé (ses connexions avec lui)
+_stores: "OrderedDict[str, ChunkStore]" = OrderedDict()
+_stores_lock = threading.Lock()
+
+
+def get_chunk_store(index_path: str) -> ChunkStore:
+    """
+    Retourne le store des chunks d'un index
+
+    Args:
+        index_path: Dossier de l'index
+
+    Returns:
+        Le ChunkStore associé
+    """
+    db_path = os.path.join(index_path, CHUNKS_DB)
+    evicted = []
+    with _stores_lock:
+        store = _stores.get(db_path)
+        if store is None:
+            store = ChunkStore(db_path)
+            _stores[db_path] = store
+            while len(_stores) > config.chunk_store_cache_size:
+                _, oldest = _stores.popitem(last=False)
+                evicted.append(oldest)
+        else:
+            _stores.move_to_end(db_path)
+    for oldest in evicted:
+        oldest.close()
+    return store
+
+
+def release_chunk_store(index_path: str):
+    """Oublie le store d'un index supprimé et ferme ses connexions"""
+    with _stores_lock:
+        store = _stores.pop(os.path.join(index_path, CHUNKS_DB), None)
+    if store is not None:
+        store.close()
@@ -0,0 +1,219 @@
+"""
+Construction du prompt dans un budget de tokens (`max_prompt_tokens`)
+
+Les tokens du prompt sont facturés et allongent le temps de réponse : les chunks
+retrouvés sont ajoutés par ordre de pertinence tant qu'ils tiennent dans le budget
+(le dernier est coupé au besoin), les chunks voisins d'un même fichier qui se
+chevauchent (chunk_overlap) sont fusionnés, puis l'historique de conversation
+remplit ce qui reste, en commençant par les messages les plus récents.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from app.core.config import config
+from app.core.token_counter import count_tokens, count_tokens_batch, truncate_to_tokens
+
+# Tokens du gabarit de prompt hors contenu (intitulés "Contexte", "Question", "Réponse"...)
+PROMPT_OVERHEAD_TOKENS = 40
+
+# Formatage d'un message d'historique (rôle, séparateurs), comme count_conversation_tokens
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+class PackedContext:
+    """Résultat du packing : contexte, historique ajusté et chunks retenus"""
+
+    def __init__(self, context: str, history: List[Dict], results: List[tuple], tokens: int):
+        """
+        Args:
+            context: Texte du contexte des documents
+            history: Messages d'historique conservés (ordre chronologique)
+            results: Tuples (ids des chunks fusionnés, document, score) dans le contexte
+            tokens: Estimation des tokens du prompt complet
+        """
+        self.context = context
+        self.history = history
+        self.results = results
+        self.tokens = tokens
+
+    @property
+    def chunk_ids(self) -> List[int]:
+        """Ids de tous les chunks utilisés dans le contexte"""
+        return [chunk_id for ids, _, _ in self.results for chunk_id in ids]
+
+
+class ContextPacker:
+    """Assemble contexte et historique sans dépasser le budget de tokens du prompt"""
+
+    def __init__(
+        self,
+        max_prompt_tokens: Optional[int] = None,
+        history_reserve_tokens: Optional[int] = None,
+        min_chunk_tokens: Optional[int] = None
+    ):
+        """
+        Initialise le packer (valeurs par défaut : config)
+
+        Args:
+            max_prompt_tokens: Budget total du prompt
+            history_reserve_tokens: Part du budget gardée pour l'historique avant d'ajouter les chunks
+            min_chunk_tokens: Taille minimale d'un chunk coupé (en dessous, il est écarté)
+        """
+        self.max_prompt_tokens = max_prompt_tokens or config.max_prompt_tokens
+        self.history_reserve_tokens = (
+            history_reserve_tokens if history_reserve_tokens is not None else config.prompt_history_reserve_tokens
+        )
+        self.min_chunk_tokens = min_chunk_tokens or config.prompt_min_chunk_tokens
+
+    def pack(
+        self,
+        results: List[tuple],
+        question: str,
+        system_prompt: str = "",
+        conversation_history: Optional[List[Dict]] = None
+    ) -> PackedContext:
+        """
+        Construit le contexte et l'historique dans le budget
+
+        Args:
+            results: Tuples (id du chunk, document, score), du plus pertinent au moins pertinent
+            question: Question de l'utilisateur
+            system_prompt: Prompt système utilisé
+            conversation_history: Historique de conversation (liste de {role, content})
+
+        Returns:
+            Le PackedContext
+        """
+        history = conversation_history or []
+        fixed_tokens = count_tokens(system_prompt or "") + count_tokens(question) + PROMPT_OVERHEAD_TOKENS
+
+        # Chunks et messages comptés en un seul appel au tokenizer
+        merged = self.merge_overlapping(results)
+        counts = count_tokens_batch(
+            [doc.page_content for _, doc, _ in merged] + [message.get("content", "") for message in history]
+        )
+        chunk_counts, message_counts = counts[:len(merged)], counts[len(merged):]
+
+        # L'historique complet peut être plus petit que la réserve : ne garder que le nécessaire
+        history_tokens = sum(tokens + MESSAGE_OVERHEAD_TOKENS for tokens in message_counts)
+        context_budget = self.max_prompt_tokens - fixed_tokens - min(history_tokens, self.history_reserve_tokens)
+
+        parts = []
+        packed_results = []
+        context_tokens = 0
+        for (ids, doc, score), tokens in zip(merged, chunk_counts):
+            header = f"Document {len(parts) + 1}:\n"
+            header_tokens = count_tokens(header) + 1
+            remaining = context_budget - context_tokens - header_tokens
+            # Au-delà du premier chunk, un chunk coupé sous `min_chunk_tokens` est écarté ;
+            # le premier est gardé (coupé si besoin) tant qu'il reste du budget, et omis
+            # si le prompt système et la question remplissent déjà tout le budget
+            if remaining < self.min_chunk_tokens and (parts or remaining <= 0):
+                break
+
+            text = doc.page_content
+            if tokens > remaining:
+                text = truncate_to_tokens(text, remaining)
+                tokens = remaining
+
+            parts.append(header + text)
+            packed_results.append((ids, doc, score))
+            context_tokens += header_tokens + tokens
+
+        history, history_tokens = self._fit_history(
+            history, message_counts, self.max_prompt_tokens - fixed_tokens - context_tokens
+        )
+        return PackedContext(
+            "\n\n".join(parts),
+            history,
+            packed_results,
+            fixed_tokens + context_tokens + history_tokens
+        )
+
+    @staticmethod
+    def merge_overlapping(results: List[tuple]) -> List[Tuple[List[int], Document, float]]:
+        """
+        Fusionne les chunks d'un même fichier (et d'une même page) dont les positions
+        se chevauchent ou se touchent, et écarte les textes identiques
+
+        Args:
+            results: Tuples (id du chunk, document, score), du plus pertinent au moins pertinent
+
+        Returns:
+            Tuples (ids fusionnés, document, meilleur score), dans l'ordre du plus pertinent
+        """
+        merged = []
+        for chunk_id, doc, score in results:
+            metadata = doc.metadata
+            key = (metadata.get("filename") or metadata.get("source"), metadata.get("page"))
+            start, end = metadata.get("start_index"), metadata.get("end_index")
+
+            target = None
+            for entry in merged:
+                entry_doc = entry[1]
+                if entry_doc.page_content == doc.page_content:
+                    target = entry
+                    break
+                entry_start = entry_doc.metadata.get("start_index")
+                entry_end = entry_doc.metadata.get("end_index")
+                if (
+                    start is not None and end is not None
+                    and entry_start is not None and entry_end is not None
+                    and entry[3] == key and start <= entry_end and entry_start <= end
+                ):
+                    target = entry
+                    break
+
+            if target is None:
+                merged.append([[chunk_id], doc, score, key])
+                continue
+
+            target[0].append(chunk_id)
+            entry_doc = target[1]
+            if entry_doc.page_content == doc.page_content:
+                continue
+
+            # Recoller les deux textes à partir de leurs positions dans la page
+            first, second = sorted((entry_doc, doc), key=lambda d: d.metadata["start_index"])
+            first_start, first_end = first.metadata["start_index"], first.metadata["end_index"]
+            second_start, second_end = second.metadata["start_index"], second.metadata["end_index"]
+            text = first.page_content
+            if second_end > first_end:
+                text += second.page_content[first_end - second_start:]
+            target[1] = Document(
+                page_content=text,
+                metadata={**entry_doc.metadata, "start_index": first_start, "end_index": max(first_end, second_end)}
+            )
+
+        return [(ids, doc, score) for ids, doc, score, _ in merged]
+
+    def _fit_history(self, history: List[Dict], counts: List[int], budget: int) -> Tuple[List[Dict], int]:
+        """
+        Garde les messages les plus récents qui tiennent dans le budget restant
+
+        Args:
+            history: Messages (ordre chronologique)
+            counts: Tokens du contenu de chaque message
+            budget: Tokens disponibles
+
+        Returns:
+            Tuple (messages conservés dans l'ordre chronologique, tokens utilisés)
+        """
+        kept = []
+        used = 0
+        for message, tokens in zip(reversed(history), reversed(counts)):
+            content = message.get("content", "")
+            remaining = budget - used - MESSAGE_OVERHEAD_TOKENS
+            if tokens <= remaining:
+                kept.append(message)
+                used += tokens + MESSAGE_OVERHEAD_TOKENS
+                continue
+            # Message trop long : garder son début s'il en reste assez
+            if remaining >= self.min_chunk_tokens:
+                kept.append({**message, "content": truncate_to_tokens(content, remaining) + "..."})
+                used += remaining + MESSAGE_OVERHEAD_TOKENS
+            break
+
+        kept.reverse()
+        return kept, used
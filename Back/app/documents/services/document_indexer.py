@@ -1,15 +1,61 @@
 """
 Service d'indexation de documents pour RAG avec FAISS
 """
+import asyncio
 import os
-import pickle
-from typing import List, Optional
+import shutil
+import time
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
 from pathlib import Path
 
+import numpy as np
+from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.document_loaders import PyPDFLoader, TextLoader
+from langchain_community.document_loaders import TextLoader
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+
+from app.core.config import config
+from app.core.file_lock import FileLock, get_file_lock
+from app.documents.services.ann_index import (
+    INDEX_FLAT, build_index, contains_ids, extract_vectors, is_lossy, remove_vectors,
+    target_index_type
+)
+from app.documents.services.batch_embedder import BatchEmbedder
+from app.documents.services.chunk_store import get_chunk_store, release_chunk_store
+from app.documents.services.embedding_cache import content_hash, embedding_cache
+from app.documents.services.embedding_registry import embedding_registry
+from app.documents.services.index_cache import index_cache
+from app.documents.services.keyword_index import reciprocal_rank_fusion
+from app.documents.services.pdf_extraction import iter_pdf_pages
+from app.documents.services.retrieval_cache import normalize_query, query_embedding_cache, retrieval_cache
+from app.documents.services.index_manifest import (
+    INDEX_FORMAT, LEGACY_SEGMENT, allocate_segment, manifest_version, new_manifest,
+    read_manifest, write_manifest
+)
+from app.documents.services.vector_index import (
+    Segment, VectorIndex, read_segment_index, write_segment_index
+)
+
+# Modes de recherche acceptés par `search` / `retrieve`
+SEARCH_MODES = ("vector", "keyword", "hybrid")
+
+# Taille (en caractères) des sections lues d'un fichier texte avant découpage
+TEXT_SECTION_CHARS = 1_000_000
+
+# Dossier des fichiers de verrou, à côté des index (conservé quand un index est supprimé)
+LOCKS_DIR = ".locks"
+
+
+def _write_lock(index_path: str) -> FileLock:
+    """
+    Retourne le verrou d'écriture d'un index (ajout de segment, compactage, suppression),
+    partagé par les threads et par les workers qui écrivent dans le même dossier
+    """
+    index_path = os.path.abspath(index_path)
+    return get_file_lock(
+        os.path.join(os.path.dirname(index_path), LOCKS_DIR, f"{os.path.basename(index_path)}.lock")
+    )
 
 
 class DocumentIndexer:
@@ -19,7 +65,7 @@ class DocumentIndexer:
         self, 
         chatbot_id: str = None,
         index_path: str = "data/faiss_index",
-        embedding_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+        embedding_model: str = None
     ):
         """
         Initialise l'indexeur de documents
@@ -27,45 +73,162 @@ class DocumentIndexer:
         Args:
             chatbot_id: ID du chatbot (pour des index séparés par chatbot)
             index_path: Chemin de base où sauvegarder l'index FAISS
-            embedding_model: Modèle d'embeddings à utiliser
+            embedding_model: Modèle d'embeddings à utiliser (par défaut celui de la config)
         """
         # Si un chatbot_id est fourni, créer un index spécifique
         if chatbot_id:
             self.index_path = os.path.join(index_path, chatbot_id)
         else:
             self.index_path = index_path
+        
+        # Clé du cache d'index partagé entre les requêtes
+        self.cache_key = chatbot_id or self.index_path
             
-        self.embedding_model = embedding_model
+        self.embedding_model = embedding_model or config.embedding_model
         
         # Créer le dossier si nécessaire
         os.makedirs(self.index_path, exist_ok=True)
         
-        # Initialiser les embeddings
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=embedding_model,
-            model_kwargs={'device': 'cpu'},
-            encode_kwargs={'normalize_embeddings': True}
-        )
+        # Récupérer le modèle d'embeddings partagé (chargé une seule fois par processus)
+        self.embeddings = embedding_registry.get(self.embedding_model, config.embedding_device)
+        
+        # Textes et métadonnées des chunks, lus à la demande
+        self.chunk_store = get_chunk_store(self.index_path)
         
         # Charger l'index existant ou en créer un nouveau
+        self._loaded_version: Optional[str] = None
         self.vector_store = self._load_or_create_index()
+    
+    @property
+    def index_version(self) -> Optional[str]:
+        """Version courante de l'index sur disque (None s'il n'existe pas)"""
+        return manifest_version(read_manifest(self.index_path))
+    
+    @property
+    def loaded_version(self) -> Optional[str]:
+        """Version de l'index actuellement chargé en mémoire"""
+        return self._loaded_version
+    
+    def write_lock(self) -> FileLock:
+        """Verrou d'écriture de cet index, à détenir pour enchaîner plusieurs écritures"""
+        return _write_lock(self.index_path)
+    
+    def _segment_dir(self, segment: str) -> str:
+        """Chemin absolu d'un segment"""
+        return os.path.normpath(os.path.join(self.index_path, segment))
+        
+    def _load_from_disk(self) -> Tuple[Optional[VectorIndex], Optional[dict]]:
+        """
+        Ouvre tous les segments de l'index depuis le disque, sans passer par le cache.
+        Les fichiers FAISS sont projetés en mémoire en lecture seule (RAG_INDEX_MMAP) :
+        les workers partagent leurs pages via le cache de l'OS.
         
-    def _load_or_create_index(self) -> Optional[FAISS]:
-        """Charge l'index FAISS existant ou retourne None"""
-        index_file = os.path.join(self.index_path, "index.faiss")
-        if os.path.exists(index_file):
+        Returns:
+            Tuple (index chargé, manifeste chargé), ou (None, None)
+        """
+        last_error = None
+        for _ in range(2):
+            manifest = read_manifest(self.index_path)
+            if manifest is None or not manifest["segments"]:
+                return None, None
+            
             try:
-                return FAISS.load_local(
-                    self.index_path, 
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
+                if manifest.get("format") != INDEX_FORMAT:
+                    # Le chargement ne désérialise jamais de pickle : conversion hors ligne
+                    print(
+                        f"⚠️  Index {self.cache_key} à l'ancien format (pickle LangChain) : "
+                        f"lancer `python -m app.documents.migrate_indexes`"
+                    )
+                    return None, None
+                
+                segments = [
+                    Segment(segment, read_segment_index(self._segment_dir(segment)), config.index_mmap)
+                    for segment in manifest["segments"]
+                ]
+                return VectorIndex(segments, self.chunk_store), manifest
             except Exception as e:
-                print(f"Erreur lors du chargement de l'index: {e}")
-                return None
-        return None
+                # Un compactage concurrent a pu remplacer des segments : relire le manifeste
+                last_error = e
+        
+        print(f"Erreur lors du chargement de l'index: {last_error}")
+        return None, None
+    
+    def _current_manifest(self) -> dict:
+        """
+        Manifeste courant au format actuel, ou un nouveau manifeste
+        (le verrou d'écriture doit être détenu)
+        """
+        manifest = read_manifest(self.index_path)
+        if manifest is None:
+            return new_manifest()
+        if manifest["segments"] and manifest.get("format") != INDEX_FORMAT:
+            raise ValueError(
+                "Index à l'ancien format : lancer `python -m app.documents.migrate_indexes`"
+            )
+        return manifest
+    
+    def migrate_legacy(self) -> bool:
+        """
+        Convertit les segments LangChain (index FAISS + docstore picklé) au format actuel :
+        chunks dans le chunk store, vecteurs dans un segment IndexIDMap.
+        Seule étape qui désérialise encore un pickle ; à lancer hors ligne, sur des
+        fichiers produits par l'application.
+        
+        Returns:
+            True si l'index a été converti
+        """
+        with _write_lock(self.index_path):
+            manifest = read_manifest(self.index_path)
+            if manifest is None or not manifest["segments"] or manifest.get("format") == INDEX_FORMAT:
+                return False
+            self._convert_legacy_segments(manifest)
+            return True
     
-    def load_document(self, file_path: str) -> List:
+    def _convert_legacy_segments(self, manifest: dict):
+        """Écrit les chunks et vecteurs des segments LangChain au format actuel (verrou détenu)"""
+        texts, metadatas, vectors = [], [], []
+        for segment in manifest["segments"]:
+            store = FAISS.load_local(
+                self._segment_dir(segment),
+                self.embeddings,
+                allow_dangerous_deserialization=True
+            )
+            segment_vectors, _ = extract_vectors(store.index)
+            vectors.append(segment_vectors)
+            for position in range(store.index.ntotal):
+                doc = store.docstore.search(store.index_to_docstore_id[position])
+                texts.append(doc.page_content)
+                metadatas.append(doc.metadata)
+        
+        ids = self.chunk_store.add(texts, metadatas)
+        index = build_index(
+            np.vstack(vectors),
+            target_index_type(manifest.get("index_type"), len(ids)),
+            ids=np.asarray(ids, dtype=np.int64)
+        )
+        self._write_snapshot(index, manifest)
+        self.chunk_store.commit(ids)
+        print(f"📦 Index {self.cache_key} converti au format segmenté ({len(ids)} chunks)")
+    
+    def _load_or_create_index(self) -> Optional[VectorIndex]:
+        """Charge l'index depuis le cache ou le disque, ou retourne None"""
+        version = self.index_version
+        if version is None:
+            return None
+        
+        vector_store = index_cache.get(self.cache_key, version)
+        if vector_store is not None:
+            self._loaded_version = version
+            return vector_store
+        
+        vector_store, manifest = self._load_from_disk()
+        if vector_store is not None:
+            self._loaded_version = manifest_version(manifest)
+            index_cache.put(self.cache_key, self._loaded_version, vector_store)
+        return vector_store
+    
+    @staticmethod
+    def load_document(file_path: str) -> List:
         """
         Charge un document depuis un fichier
         
@@ -78,7 +241,8 @@ class DocumentIndexer:
         file_extension = Path(file_path).suffix.lower()
         
         if file_extension == '.pdf':
-            loader = PyPDFLoader(file_path)
+            # Pages extraites en parallèle (plages de pages), restituées dans l'ordre
+            return list(iter_pdf_pages(file_path))
         elif file_extension in ['.txt', '.md']:
             loader = TextLoader(file_path, encoding='utf-8')
         else:
@@ -86,8 +250,95 @@ class DocumentIndexer:
         
         return loader.load()
     
+    @staticmethod
+    def iter_pages(file_path: str, progress: Optional[dict] = None) -> Iterator[Tuple[int, Document]]:
+        """
+        Lit un document page par page (PDF) ou par sections (texte),
+        sans jamais le charger entièrement en mémoire
+        
+        Args:
+            file_path: Chemin du fichier à lire
+            progress: Dictionnaire optionnel mis à jour au fil de la lecture
+                ("pages" lues, "fraction" du fichier parcourue)
+            
+        Yields:
+            Tuples (position du début de la page dans le fichier, page)
+        """
+        file_extension = Path(file_path).suffix.lower()
+        progress = progress if progress is not None else {}
+        progress.setdefault("pages", 0)
+        
+        if file_extension == '.pdf':
+            # Les positions des chunks d'un PDF sont relatives à leur page
+            for page in iter_pdf_pages(file_path, progress):
+                yield 0, page
+        elif file_extension in ['.txt', '.md']:
+            for offset, section in DocumentIndexer._iter_text_sections(file_path, progress):
+                progress["pages"] += 1
+                yield offset, section
+        else:
+            raise ValueError(f"Type de fichier non supporté: {file_extension}")
+    
+    @staticmethod
+    def _iter_text_sections(file_path: str, progress: dict) -> Iterator[Tuple[int, Document]]:
+        """
+        Découpe un fichier texte en sections d'environ TEXT_SECTION_CHARS caractères,
+        coupées de préférence entre deux paragraphes
+        
+        Args:
+            file_path: Chemin du fichier texte
+            progress: Dictionnaire de progression (clé "fraction")
+            
+        Yields:
+            Tuples (position en caractères du début de la section, section)
+        """
+        file_size = os.path.getsize(file_path) or 1
+        characters_read = 0
+        offset = 0
+        buffer = ""
+        
+        with open(file_path, encoding="utf-8") as handle:
+            while True:
+                block = handle.read(TEXT_SECTION_CHARS)
+                characters_read += len(block)
+                buffer += block
+                
+                if block:
+                    # Couper après le dernier paragraphe (ou la dernière ligne) de la seconde moitié
+                    cut = -1
+                    for separator in ("\n\n", "\n"):
+                        position = buffer.rfind(separator, len(buffer) // 2)
+                        if position != -1:
+                            cut = position + len(separator)
+                            break
+                    if cut == -1:
+                        cut = len(buffer)
+                    section, buffer = buffer[:cut], buffer[cut:]
+                else:
+                    section, buffer = buffer, ""
+                
+                if section:
+                    progress["fraction"] = min(1.0, characters_read / file_size)
+                    yield offset, Document(page_content=section, metadata={"source": file_path})
+                    offset += len(section)
+                
+                if not block:
+                    break
+    
+    @staticmethod
+    def _text_splitter(chunk_size: int, chunk_overlap: int) -> RecursiveCharacterTextSplitter:
+        """Découpeur utilisé pour tous les documents"""
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            separators=["\n\n", "\n", " ", ""],
+            # Position du chunk dans sa page (conservée dans le chunk store)
+            add_start_index=True
+        )
+    
+    @staticmethod
     def split_documents(
-        self, 
         documents: List,
         chunk_size: int = 1000,
         chunk_overlap: int = 200
@@ -103,14 +354,37 @@ class DocumentIndexer:
         Returns:
             Liste de chunks de documents
         """
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", " ", ""]
-        )
+        return DocumentIndexer._text_splitter(chunk_size, chunk_overlap).split_documents(documents)
+    
+    @staticmethod
+    def iter_chunks(
+        file_path: str,
+        chunk_size: int = 1000,
+        chunk_overlap: int = 200,
+        metadata: Optional[dict] = None,
+        progress: Optional[dict] = None
+    ) -> Iterator[Document]:
+        """
+        Découpe un document en chunks au fil de la lecture de ses pages
         
-        return text_splitter.split_documents(documents)
+        Args:
+            file_path: Chemin du document
+            chunk_size: Taille des chunks
+            chunk_overlap: Chevauchement entre chunks
+            metadata: Métadonnées additionnelles à ajouter à chaque chunk
+            progress: Dictionnaire de progression (voir `iter_pages`)
+            
+        Yields:
+            Chunks du document, dans l'ordre
+        """
+        text_splitter = DocumentIndexer._text_splitter(chunk_size, chunk_overlap)
+        for offset, page in DocumentIndexer.iter_pages(file_path, progress):
+            if metadata:
+                page.metadata.update(metadata)
+            for chunk in text_splitter.split_documents([page]):
+                if offset:
+                    chunk.metadata["start_index"] += offset
+                yield chunk
     
     def index_document(
         self,
@@ -120,7 +394,9 @@ class DocumentIndexer:
         metadata: Optional[dict] = None
     ) -> dict:
         """
-        Indexe un document dans FAISS
+        Indexe un document dans FAISS.
+        Le document est lu, encodé et ajouté à l'index par fenêtres de
+        `ingestion_window_size` chunks : la mémoire utilisée ne dépend pas de sa taille.
         
         Args:
             file_path: Chemin du document à indexer
@@ -132,33 +408,40 @@ class DocumentIndexer:
             Dictionnaire avec les statistiques d'indexation
         """
         try:
-            # Charger le document
-            documents = self.load_document(file_path)
+            # Le nom du fichier identifie le document
+            metadata = {"filename": Path(file_path).name, **(metadata or {})}
+            progress = {}
+            chunks = self.iter_chunks(file_path, chunk_size, chunk_overlap, metadata, progress)
+            embedder = BatchEmbedder(self.embedding_model)
             
-            # Ajouter les métadonnées personnalisées
-            if metadata:
-                for doc in documents:
-                    doc.metadata.update(metadata)
-            
-            # Diviser en chunks
-            chunks = self.split_documents(documents, chunk_size, chunk_overlap)
-            
-            # Créer ou mettre à jour l'index FAISS
-            if self.vector_store is None:
-                self.vector_store = FAISS.from_documents(chunks, self.embeddings)
-            else:
-                # Ajouter les nouveaux documents à l'index existant
-                new_vector_store = FAISS.from_documents(chunks, self.embeddings)
-                self.vector_store.merge_from(new_vector_store)
-            
-            # Sauvegarder l'index
-            self.save_index()
+            total_chunks = 0
+            created_chunks = 0
+            while True:
+                window = list(islice(chunks, config.ingestion_window_size))
+                if not window:
+                    break
+                total_chunks += len(window)
+                
+                # Ignorer les chunks déjà présents dans l'index (fenêtres précédentes comprises)
+                texts, metadatas, hashes = self.deduplicate_chunks(
+                    [chunk.page_content for chunk in window],
+                    [chunk.metadata for chunk in window],
+                    chunk_size,
+                    chunk_overlap
+                )
+                
+                # Calculer les embeddings (cache d'abord) et ajouter la fenêtre à l'index
+                if texts:
+                    embeddings = embedding_cache.embed(texts, hashes, embedder.embed)
+                    created_chunks += self.add_embedded_chunks(texts, embeddings, metadatas)
+                self.link_document(metadata["filename"], [chunk.page_content for chunk in window], chunk_size, chunk_overlap)
             
             return {
                 "status": "success",
                 "file": file_path,
-                "chunks_created": len(chunks),
-                "total_documents": len(documents)
+                "chunks_created": created_chunks,
+                "duplicate_chunks": total_chunks - created_chunks,
+                "total_documents": progress.get("pages", 0)
             }
             
         except Exception as e:
@@ -168,6 +451,390 @@ class DocumentIndexer:
                 "error": str(e)
             }
     
+    def deduplicate_chunks(
+        self,
+        texts: List[str],
+        metadatas: List[dict],
+        chunk_size: int,
+        chunk_overlap: int,
+        seen: Optional[set] = None
+    ) -> Tuple[List[str], List[dict], List[str]]:
+        """
+        Calcule l'empreinte de chaque chunk et écarte ceux déjà indexés
+        (ou répétés dans le lot)
+        
+        Args:
+            texts: Textes des chunks
+            metadatas: Métadonnées des chunks (complétées avec `content_hash`)
+            chunk_size: Taille des chunks utilisée pour le découpage
+            chunk_overlap: Chevauchement utilisé pour le découpage
+            seen: Empreintes déjà vues dans le lot en cours (mis à jour)
+            
+        Returns:
+            Tuple (textes, métadonnées, empreintes) des chunks à indexer
+        """
+        if seen is None:
+            seen = set()
+        
+        hashes = [content_hash(text, self.embedding_model, chunk_size, chunk_overlap) for text in texts]
+        # Seules les empreintes candidates sont cherchées dans le chunk store (index SQLite)
+        indexed = self.chunk_store.find_hashes(hashes) if self.vector_store is not None else set()
+        
+        kept_texts, kept_metadatas, kept_hashes = [], [], []
+        for text, metadata, chunk_hash in zip(texts, metadatas, hashes):
+            if chunk_hash in indexed or chunk_hash in seen:
+                continue
+            seen.add(chunk_hash)
+            kept_texts.append(text)
+            kept_metadatas.append({**metadata, "content_hash": chunk_hash})
+            kept_hashes.append(chunk_hash)
+        
+        return kept_texts, kept_metadatas, kept_hashes
+    
+    def add_embedded_chunks(
+        self,
+        texts: List[str],
+        embeddings: List[List[float]],
+        metadatas: List[dict],
+        source: Optional[str] = None
+    ) -> int:
+        """
+        Ajoute à l'index des chunks dont les embeddings sont déjà calculés.
+        Les empreintes (`content_hash`) sont vérifiées à nouveau sous le verrou d'écriture :
+        un autre job, éventuellement dans un autre processus, a pu indexer les mêmes
+        chunks depuis `deduplicate_chunks`.
+        
+        Args:
+            texts: Textes des chunks
+            embeddings: Vecteurs correspondants
+            metadatas: Métadonnées de chaque chunk
+            source: Document auquel rattacher les chunks (par défaut, leur `filename`)
+            
+        Returns:
+            Nombre de chunks ajoutés (hors doublons)
+        """
+        if not texts:
+            return 0
+        
+        with self.write_lock():
+            indexed = self.chunk_store.find_hashes(
+                [metadata["content_hash"] for metadata in metadatas if metadata.get("content_hash")]
+            )
+            chunks = [
+                (text, embedding, metadata)
+                for text, embedding, metadata in zip(texts, embeddings, metadatas)
+                if metadata.get("content_hash") not in indexed
+            ]
+            if not chunks:
+                return 0
+            
+            self._append(
+                [(text, embedding) for text, embedding, _ in chunks],
+                [metadata for _, _, metadata in chunks],
+                source
+            )
+            return len(chunks)
+    
+    def _append(
+        self,
+        text_embeddings: List[Tuple[str, List[float]]],
+        metadatas: List[dict],
+        source: Optional[str] = None
+    ):
+        """
+        Ajoute des chunks à l'index sans réécrire les segments existants.
+        Les chunks sont écrits dans le chunk store, leurs vecteurs dans un nouveau
+        segment référencé par le manifeste ; en mémoire, ce segment s'ajoute à la liste
+        des segments de l'index publié, qui remplace l'entrée du cache.
+        
+        Args:
+            text_embeddings: Liste de tuples (texte, vecteur)
+            metadatas: Métadonnées de chaque chunk
+            source: Document auquel rattacher les chunks (par défaut, leur `filename`)
+        """
+        with _write_lock(self.index_path):
+            manifest = self._current_manifest()
+            previous_version = manifest_version(manifest) if manifest["segments"] else None
+            
+            # 1. Chunks (non validés) puis segment sur disque : coût proportionnel à l'upload
+            ids = self.chunk_store.add([text for text, _ in text_embeddings], metadatas, source)
+            index = build_index(
+                np.asarray([vector for _, vector in text_embeddings], dtype=np.float32),
+                INDEX_FLAT,
+                ids=np.asarray(ids, dtype=np.int64)
+            )
+            segment = allocate_segment(manifest)
+            write_segment_index(self._segment_dir(segment), index)
+            
+            manifest["segments"].append(segment)
+            manifest["version"] += 1
+            write_manifest(self.index_path, manifest)
+            self.chunk_store.commit(ids)
+            
+            # 2. Index en mémoire
+            if self._loaded_version == previous_version:
+                base_store = self.vector_store
+            else:
+                base_store = index_cache.get(self.cache_key, previous_version)
+            
+            new_segment = Segment(segment, index, mmapped=False)
+            if previous_version is None:
+                vector_store = VectorIndex([new_segment], self.chunk_store)
+            elif base_store is not None:
+                # L'index publié reste intact pour les requêtes en cours
+                vector_store = base_store.with_segment(new_segment)
+            else:
+                # L'index a été modifié par un autre processus : tout recharger
+                vector_store, manifest = self._load_from_disk()
+            
+            # Promotion vers un index ANN si le seuil de vecteurs est franchi
+            if vector_store is not None and self._desired_index_type(vector_store, manifest) != vector_store.index_type:
+                self._write_snapshot(self._merge_segments(vector_store, manifest), manifest)
+                return
+            
+            self.vector_store = vector_store
+            self._loaded_version = manifest_version(manifest)
+            index_cache.put(self.cache_key, self._loaded_version, vector_store)
+    
+    def link_document(self, filename: str, texts: List[str], chunk_size: int, chunk_overlap: int):
+        """
+        Enregistre qu'un document contient ces chunks (même ceux écartés comme doublons),
+        pour pouvoir le supprimer plus tard sans toucher aux autres documents
+        
+        Args:
+            filename: Nom du document
+            texts: Textes de tous les chunks du document
+            chunk_size: Taille des chunks utilisée pour le découpage
+            chunk_overlap: Chevauchement utilisé pour le découpage
+        """
+        hashes = [content_hash(text, self.embedding_model, chunk_size, chunk_overlap) for text in texts]
+        self.chunk_store.link_sources(filename, hashes)
+    
+    def delete_document(self, filename: str) -> int:
+        """
+        Retire de l'index les vecteurs d'un document, sans reconstruire l'index :
+        seuls les segments qui contiennent ses chunks sont réécrits
+        
+        Args:
+            filename: Nom du document
+            
+        Returns:
+            Nombre de chunks supprimés
+        """
+        with _write_lock(self.index_path):
+            manifest = self._current_manifest()
+            if not manifest["segments"]:
+                return 0
+            
+            # Les chunks partagés avec un autre document restent dans l'index
+            chunk_ids = self.chunk_store.orphaned_by(filename)
+            if chunk_ids:
+                self._remove_vectors(manifest, np.asarray(chunk_ids, dtype=np.int64))
+            self.chunk_store.remove_source(filename, chunk_ids)
+            return len(chunk_ids)
+    
+    def replace_document(self, filename: str, staged_filename: str) -> int:
+        """
+        Remplace un document par sa nouvelle version, indexée sous un nom provisoire :
+        les chunks propres à l'ancienne version sont retirés, puis ceux de la nouvelle
+        sont rattachés au nom du document
+        
+        Args:
+            filename: Nom du document
+            staged_filename: Nom sous lequel la nouvelle version a été indexée
+            
+        Returns:
+            Nombre de chunks de l'ancienne version supprimés
+        """
+        with self.write_lock():
+            # Les chunks communs aux deux versions sont aussi rattachés au nom provisoire
+            removed = self.delete_document(filename)
+            self.chunk_store.rename_source(staged_filename, filename)
+            return removed
+    
+    def _remove_vectors(self, manifest: dict, ids: np.ndarray):
+        """
+        Réécrit les segments contenant ces ids, sans eux (le verrou d'écriture doit être détenu)
+        
+        Args:
+            manifest: Manifeste courant
+            ids: Ids des chunks à retirer
+        """
+        if self._loaded_version == manifest_version(manifest) and self.vector_store is not None:
+            vector_store = self.vector_store
+        else:
+            vector_store, manifest = self._load_from_disk()
+            if vector_store is None:
+                return
+        
+        segments, stale_segments = [], []
+        for segment in vector_store.segments:
+            if not contains_ids(segment.index, ids):
+                segments.append(segment.name)
+                continue
+            
+            # Copie modifiable du segment (la version projetée en mémoire est en lecture seule)
+            index = remove_vectors(read_segment_index(self._segment_dir(segment.name), mmap=False), ids)
+            stale_segments.append(segment.name)
+            if index.ntotal:
+                new_segment = allocate_segment(manifest)
+                write_segment_index(self._segment_dir(new_segment), index)
+                segments.append(new_segment)
+        
+        manifest["segments"] = segments
+        manifest["version"] += 1
+        write_manifest(self.index_path, manifest)
+        
+        for stale_segment in stale_segments:
+            shutil.rmtree(self._segment_dir(stale_segment), ignore_errors=True)
+        
+        self.vector_store, loaded_manifest = self._load_from_disk()
+        self._loaded_version = manifest_version(loaded_manifest)
+        if self.vector_store is not None:
+            index_cache.put(self.cache_key, self._loaded_version, self.vector_store)
+        else:
+            index_cache.invalidate(self.cache_key)
+    
+    def compact(self) -> bool:
+        """
+        Fusionne tous les segments de l'index en un seul (et change son type si besoin)
+        
+        Returns:
+            True si l'index a été compacté
+        """
+        with _write_lock(self.index_path):
+            manifest = read_manifest(self.index_path)
+            if manifest is None or not manifest["segments"]:
+                return False
+            
+            vector_store, manifest = self._load_from_disk()
+            if vector_store is None:
+                return False
+            
+            if len(manifest["segments"]) <= 1 and self._desired_index_type(vector_store, manifest) == vector_store.index_type:
+                return False
+            
+            self._write_snapshot(self._merge_segments(vector_store, manifest), manifest)
+            return True
+    
+    def _desired_index_type(self, vector_store: VectorIndex, manifest: dict) -> str:
+        """
+        Type d'index voulu (réglage du chatbot ou config, selon le nombre de vecteurs)
+        
+        Args:
+            vector_store: Index chargé
+            manifest: Manifeste courant (porte le réglage `index_type` du chatbot)
+            
+        Returns:
+            Le type d'index à utiliser pour le segment principal
+        """
+        desired_type = target_index_type(manifest.get("index_type"), vector_store.ntotal)
+        current_type = vector_store.index_type
+        if desired_type != current_type and is_lossy(vector_store.segments[0].index):
+            # Les vecteurs quantifiés ne permettent pas de reconstruire un index fidèle
+            print(f"⚠️  Index {self.cache_key} en {current_type} : conversion en {desired_type} ignorée")
+            return current_type
+        return desired_type
+    
+    def _merge_segments(self, vector_store: VectorIndex, manifest: dict):
+        """
+        Fusionne les segments en un seul index FAISS du type voulu
+        
+        Args:
+            vector_store: Index chargé
+            manifest: Manifeste courant
+            
+        Returns:
+            L'index FAISS fusionné (en mémoire)
+        """
+        desired_type = self._desired_index_type(vector_store, manifest)
+        current_type = vector_store.index_type
+        start = time.perf_counter()
+        
+        if desired_type == current_type and desired_type != INDEX_FLAT:
+            # Garder les quantifieurs déjà entraînés : copie modifiable du segment
+            # principal, puis ajout des vecteurs des segments récents
+            merged = read_segment_index(self._segment_dir(vector_store.segments[0].name), mmap=False)
+            for segment in vector_store.segments[1:]:
+                vectors, ids = extract_vectors(segment.index)
+                merged.add_with_ids(vectors, ids)
+            return merged
+        
+        parts = [extract_vectors(segment.index) for segment in vector_store.segments]
+        merged = build_index(
+            np.vstack([vectors for vectors, _ in parts]),
+            desired_type,
+            metric=vector_store.metric_type,
+            ids=np.concatenate([ids for _, ids in parts])
+        )
+        if desired_type != current_type:
+            print(
+                f"🔁 Index {self.cache_key} reconstruit: {current_type} → {desired_type} "
+                f"({merged.ntotal} vecteurs, {time.perf_counter() - start:.1f}s)"
+            )
+        return merged
+    
+    def set_index_type(self, index_type: Optional[str]) -> bool:
+        """
+        Enregistre le type d'index choisi pour ce chatbot et reconstruit l'index si besoin
+        
+        Args:
+            index_type: Type d'index (None = celui de la config)
+            
+        Returns:
+            True si l'index a été reconstruit
+        """
+        with _write_lock(self.index_path):
+            manifest = self._current_manifest()
+            if manifest.get("index_type") == index_type:
+                return False
+            manifest["index_type"] = index_type
+            write_manifest(self.index_path, manifest)
+            
+            if not manifest["segments"]:
+                return False
+            return self.compact()
+    
+    def _write_snapshot(self, index, manifest: Optional[dict]):
+        """
+        Écrit un index FAISS complet comme unique segment et supprime les anciens
+        (le verrou d'écriture doit être détenu)
+        
+        Args:
+            index: Index FAISS complet (IndexIDMap sur les ids des chunks)
+            manifest: Manifeste courant (None si l'index n'existe pas encore)
+        """
+        if manifest is None:
+            manifest = new_manifest()
+        old_segments = manifest["segments"]
+        
+        segment = allocate_segment(manifest)
+        segment_dir = self._segment_dir(segment)
+        write_segment_index(segment_dir, index)
+        
+        manifest["segments"] = [segment]
+        manifest["format"] = INDEX_FORMAT
+        manifest["version"] += 1
+        write_manifest(self.index_path, manifest)
+        
+        # Les anciens segments ne sont plus référencés : on peut les supprimer
+        # (les workers qui les projettent en mémoire gardent leurs pages jusqu'au rechargement)
+        for old_segment in old_segments:
+            if old_segment == LEGACY_SEGMENT:
+                for filename in ("index.faiss", "index.pkl"):
+                    path = os.path.join(self.index_path, filename)
+                    if os.path.exists(path):
+                        os.remove(path)
+            else:
+                shutil.rmtree(self._segment_dir(old_segment), ignore_errors=True)
+        
+        # Rouvrir le segment projeté en mémoire : la copie construite ici est libérée
+        if config.index_mmap:
+            index = read_segment_index(segment_dir)
+        self.vector_store = VectorIndex([Segment(segment, index, config.index_mmap)], self.chunk_store)
+        self._loaded_version = manifest_version(manifest)
+        index_cache.put(self.cache_key, self._loaded_version, self.vector_store)
+    
     def index_multiple_documents(
         self,
         file_paths: List[str],
@@ -175,7 +842,9 @@ class DocumentIndexer:
         chunk_overlap: int = 200
     ) -> List[dict]:
         """
-        Indexe plusieurs documents
+        Indexe plusieurs documents.
+        Les chunks de plusieurs fichiers sont regroupés pour être encodés ensemble,
+        par lots, sur le pool multi-processus (RAG_EMBEDDING_POOL_WORKERS).
         
         Args:
             file_paths: Liste des chemins de fichiers
@@ -183,55 +852,352 @@ class DocumentIndexer:
             chunk_overlap: Chevauchement entre chunks
             
         Returns:
-            Liste des résultats d'indexation
+            Liste des résultats d'indexation (dans l'ordre des fichiers)
         """
-        results = []
-        for file_path in file_paths:
-            result = self.index_document(file_path, chunk_size, chunk_overlap)
-            results.append(result)
+        results = [None] * len(file_paths)
+        pending = []
+        pending_chunks = 0
+        
+        with BatchEmbedder(self.embedding_model, pool_workers=config.embedding_pool_workers) as embedder:
+            for position, file_path in enumerate(file_paths):
+                try:
+                    documents = self.load_document(file_path)
+                    for doc in documents:
+                        doc.metadata.setdefault("filename", Path(file_path).name)
+                    chunks = self.split_documents(documents, chunk_size, chunk_overlap)
+                except Exception as e:
+                    results[position] = {"status": "error", "file": file_path, "error": str(e)}
+                    continue
+                
+                pending.append((position, file_path, len(documents), chunks))
+                pending_chunks += len(chunks)
+                
+                # Encoder dès qu'un groupe de chunks assez grand est prêt (mémoire bornée)
+                if pending_chunks >= config.embedding_group_size:
+                    self._index_group(pending, embedder, results, chunk_size, chunk_overlap)
+                    pending = []
+                    pending_chunks = 0
+            
+            if pending:
+                self._index_group(pending, embedder, results, chunk_size, chunk_overlap)
         
         return results
     
+    def _index_group(
+        self,
+        group: List[tuple],
+        embedder: BatchEmbedder,
+        results: List[Optional[dict]],
+        chunk_size: int,
+        chunk_overlap: int
+    ):
+        """
+        Encode ensemble les chunks d'un groupe de fichiers puis les ajoute à l'index
+        
+        Args:
+            group: Liste de tuples (position, chemin, nombre de pages, chunks)
+            embedder: Encodeur par lots à utiliser
+            results: Liste des résultats à compléter (par position)
+            chunk_size: Taille des chunks utilisée pour le découpage
+            chunk_overlap: Chevauchement utilisé pour le découpage
+        """
+        # Écarter les doublons (déjà indexés, ou présents dans un autre fichier du groupe)
+        seen = set()
+        files = []
+        for position, file_path, documents_count, chunks in group:
+            texts, metadatas, hashes = self.deduplicate_chunks(
+                [chunk.page_content for chunk in chunks],
+                [chunk.metadata for chunk in chunks],
+                chunk_size,
+                chunk_overlap,
+                seen=seen
+            )
+            files.append((position, file_path, documents_count, [chunk.page_content for chunk in chunks], texts, metadatas, hashes))
+        
+        all_texts = [text for file in files for text in file[4]]
+        all_hashes = [chunk_hash for file in files for chunk_hash in file[6]]
+        
+        start = time.perf_counter()
+        embeddings = embedding_cache.embed(all_texts, all_hashes, embedder.embed)
+        elapsed = time.perf_counter() - start
+        chunks_per_second = len(all_texts) / elapsed if elapsed > 0 else 0.0
+        print(f"⚡ {len(all_texts)} chunks encodés en {elapsed:.2f}s ({chunks_per_second:.0f} chunks/s)")
+        
+        offset = 0
+        for position, file_path, documents_count, chunk_texts, texts, metadatas, _ in files:
+            file_embeddings = embeddings[offset:offset + len(texts)]
+            offset += len(texts)
+            
+            try:
+                if texts:
+                    self._append(list(zip(texts, file_embeddings)), metadatas)
+                self.link_document(Path(file_path).name, chunk_texts, chunk_size, chunk_overlap)
+                results[position] = {
+                    "status": "success",
+                    "file": file_path,
+                    "chunks_created": len(texts),
+                    "duplicate_chunks": len(chunk_texts) - len(texts),
+                    "total_documents": documents_count,
+                    "chunks_per_second": round(chunks_per_second, 1)
+                }
+            except Exception as e:
+                results[position] = {"status": "error", "file": file_path, "error": str(e)}
+    
     def search(
         self,
         query: str,
         k: int = 4,
-        score_threshold: Optional[float] = None
+        score_threshold: Optional[float] = None,
+        mode: str = "vector"
+    ) -> List[tuple]:
+        """
+        Recherche dans l'index FAISS et/ou l'index lexical
+        
+        Args:
+            query: Requête de recherche
+            k: Nombre de résultats à retourner
+            score_threshold: Score minimum des candidats vectoriels (optionnel ;
+                ignoré en "keyword", appliqué avant la fusion en "hybrid")
+            mode: "vector" (FAISS), "keyword" (BM25) ou "hybrid" (fusion RRF des deux)
+            
+        Returns:
+            Liste de tuples (document, score) ; le score est une distance L2 en "vector",
+            un score BM25 en "keyword" et un score RRF (plus grand = meilleur) en "hybrid"
+        """
+        if self.vector_store is None:
+            return []
+        
+        results = self.retrieve(query, k=k, score_threshold=score_threshold, mode=mode)
+        return [(doc, score) for _, doc, score in results]
+    
+    def retrieve(
+        self,
+        query: str,
+        k: int = 4,
+        score_threshold: Optional[float] = None,
+        embedding: Optional[List[float]] = None,
+        mode: str = "vector"
     ) -> List[tuple]:
         """
-        Recherche dans l'index FAISS
+        Recherche avec cache exact (requête normalisée, k, mode, version de l'index).
+        La version change à chaque ajout de segment ou suppression de l'index,
+        ce qui rend obsolètes les résultats calculés sur l'ancien index.
+        
+        Args:
+            query: Requête de recherche
+            k: Nombre de résultats à retourner
+            score_threshold: Score minimum des candidats vectoriels (optionnel ;
+                ignoré en "keyword", appliqué avant la fusion en "hybrid")
+            embedding: Embedding de la requête s'il est déjà calculé (optionnel)
+            mode: "vector", "keyword" ou "hybrid" (scores RRF)
+            
+        Returns:
+            Liste de tuples (id du chunk, document, score)
+        """
+        if self.vector_store is None:
+            return []
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Mode de recherche inconnu: {mode}")
+        
+        key = (self.cache_key, self._loaded_version, normalize_query(query), k, score_threshold, mode)
+        hits = retrieval_cache.get(key)
+        if hits is None:
+            if mode == "keyword":
+                hits = self.chunk_store.keyword_search(query, k)
+            else:
+                if embedding is None:
+                    embedding = self.embed_query(query)
+                if mode == "hybrid":
+                    hits = self._hybrid_search_ids(query, embedding, k, score_threshold)
+                else:
+                    hits = self._search_ids(embedding, k, score_threshold)
+            retrieval_cache.put(key, hits)
+        
+        return self._resolve(hits)
+    
+    def _hybrid_search_ids(
+        self,
+        query: str,
+        embedding: List[float],
+        k: int,
+        score_threshold: Optional[float]
+    ) -> List[Tuple[int, float]]:
+        """
+        Fusionne par Reciprocal Rank Fusion les classements vectoriel et BM25
+        (codes produit, numéros d'erreur, noms propres que l'embedding rate)
+        """
+        candidates = max(k, config.hybrid_candidates)
+        vector_hits = self._search_ids(embedding, candidates, score_threshold)
+        return self._fuse_keyword_hits(query, vector_hits, k)
+    
+    def _fuse_keyword_hits(self, query: str, vector_hits: List[Tuple[int, float]], k: int) -> List[Tuple[int, float]]:
+        """Ajoute les candidats BM25 de la requête au classement vectoriel (fusion RRF)"""
+        candidates = max(k, config.hybrid_candidates)
+        keyword_hits = self.chunk_store.keyword_search(query, candidates)
+        fused = reciprocal_rank_fusion(
+            [[chunk_id for chunk_id, _ in vector_hits], [chunk_id for chunk_id, _ in keyword_hits]],
+            config.hybrid_rrf_k
+        )
+        return fused[:k]
+    
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        k: int = 4,
+        score_threshold: Optional[float] = None,
+        mode: str = "vector"
+    ) -> List[List[tuple]]:
+        """
+        Version par lot de retrieve : les requêtes absentes du cache sont encodées
+        en un seul appel au modèle et cherchées en une seule recherche FAISS multi-requêtes
+        
+        Args:
+            queries: Requêtes de recherche
+            k: Nombre de résultats par requête
+            score_threshold: Score minimum des candidats vectoriels (optionnel ;
+                ignoré en "keyword", appliqué avant la fusion en "hybrid")
+            mode: "vector", "keyword" ou "hybrid" (scores RRF)
+            
+        Returns:
+            Pour chaque requête, liste de tuples (id du chunk, document, score)
+        """
+        if self.vector_store is None:
+            return [[] for _ in queries]
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Mode de recherche inconnu: {mode}")
+        
+        keys = [
+            (self.cache_key, self._loaded_version, normalize_query(query), k, score_threshold, mode)
+            for query in queries
+        ]
+        all_hits = [retrieval_cache.get(key) for key in keys]
+        missing = [i for i, hits in enumerate(all_hits) if hits is None]
+        
+        if missing and mode == "keyword":
+            for i in missing:
+                all_hits[i] = self.chunk_store.keyword_search(queries[i], k)
+        elif missing:
+            embeddings = self.embed_queries([queries[i] for i in missing])
+            candidates = max(k, config.hybrid_candidates) if mode == "hybrid" else k
+            batch_hits = self.vector_store.search_batch(embeddings, candidates)
+            for i, hits in zip(missing, batch_hits):
+                if score_threshold is not None:
+                    hits = [(chunk_id, score) for chunk_id, score in hits if score >= score_threshold]
+                if mode == "hybrid":
+                    hits = self._fuse_keyword_hits(queries[i], hits, k)
+                all_hits[i] = hits
+        
+        for i in missing:
+            retrieval_cache.put(keys[i], all_hits[i])
+        
+        # Une seule lecture du chunk store pour tous les résultats
+        documents = self.vector_store.get_documents(
+            list({chunk_id for hits in all_hits for chunk_id, _ in hits})
+        )
+        return [
+            [(chunk_id, documents[chunk_id], score) for chunk_id, score in hits if chunk_id in documents]
+            for hits in all_hits
+        ]
+    
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Calcule l'embedding d'une requête (mis en cache par requête normalisée)
         
         Args:
             query: Requête de recherche
+            
+        Returns:
+            Vecteur normalisé
+        """
+        key = (self.embedding_model, normalize_query(query))
+        embedding = query_embedding_cache.get(key)
+        if embedding is None:
+            embedding = self.embeddings.embed_query(query)
+            query_embedding_cache.put(key, embedding)
+        return embedding
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Calcule les embeddings de plusieurs requêtes : celles absentes du cache
+        sont encodées en un seul appel au modèle
+        
+        Args:
+            queries: Requêtes de recherche
+            
+        Returns:
+            Vecteurs normalisés, dans l'ordre des requêtes
+        """
+        keys = [(self.embedding_model, normalize_query(query)) for query in queries]
+        embeddings = [query_embedding_cache.get(key) for key in keys]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            computed = self.embeddings.embed_documents([queries[i] for i in missing])
+            for i, embedding in zip(missing, computed):
+                embeddings[i] = embedding
+                query_embedding_cache.put(keys[i], embedding)
+        return embeddings
+    
+    def search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        score_threshold: Optional[float] = None
+    ) -> List[tuple]:
+        """
+        Recherche dans l'index FAISS à partir d'un embedding déjà calculé
+        
+        Args:
+            embedding: Embedding de la requête
             k: Nombre de résultats à retourner
             score_threshold: Seuil de score minimum (optionnel)
             
         Returns:
-            Liste de tuples (document, score)
+            Liste de tuples (id du chunk, document, score)
         """
         if self.vector_store is None:
             return []
         
+        return self._resolve(self._search_ids(embedding, k, score_threshold))
+    
+    def _search_ids(
+        self,
+        embedding: List[float],
+        k: int,
+        score_threshold: Optional[float]
+    ) -> List[Tuple[int, float]]:
+        """Recherche FAISS brute (tous segments) : retourne les ids des chunks et leurs scores"""
+        hits = self.vector_store.search(embedding, k)
+        # Filtrer par seuil de score
         if score_threshold is not None:
-            results = self.vector_store.similarity_search_with_score(query, k=k)
-            # Filtrer par seuil de score
-            results = [(doc, score) for doc, score in results if score >= score_threshold]
-        else:
-            results = self.vector_store.similarity_search_with_score(query, k=k)
-        
-        return results
+            hits = [(chunk_id, score) for chunk_id, score in hits if score >= score_threshold]
+        return hits
+    
+    def _resolve(self, hits: List[Tuple[int, float]]) -> List[tuple]:
+        """Lit dans le chunk store les documents des résultats (seulement ceux-là)"""
+        documents = self.vector_store.get_documents([chunk_id for chunk_id, _ in hits])
+        return [
+            (chunk_id, documents[chunk_id], score)
+            for chunk_id, score in hits
+            if chunk_id in documents
+        ]
     
     def save_index(self):
-        """Sauvegarde l'index FAISS sur le disque"""
+        """Réécrit l'index chargé comme unique segment et met à jour le cache"""
         if self.vector_store is not None:
-            self.vector_store.save_local(self.index_path)
+            with _write_lock(self.index_path):
+                manifest = self._current_manifest()
+                self._write_snapshot(self._merge_segments(self.vector_store, manifest), manifest)
     
     def delete_index(self):
-        """Supprime l'index FAISS"""
-        if os.path.exists(self.index_path):
-            import shutil
-            shutil.rmtree(self.index_path)
-        self.vector_store = None
+        """Supprime l'index FAISS et ses chunks"""
+        with _write_lock(self.index_path):
+            # Fermer les connexions SQLite avant de supprimer leurs fichiers
+            release_chunk_store(self.index_path)
+            if os.path.exists(self.index_path):
+                shutil.rmtree(self.index_path)
+            index_cache.invalidate(self.cache_key)
+            self.vector_store = None
+            self._loaded_version = None
     
     def get_index_stats(self) -> dict:
         """
@@ -246,9 +1212,74 @@ class DocumentIndexer:
                 "total_vectors": 0
             }
         
+        manifest = read_manifest(self.index_path)
         return {
             "indexed": True,
-            "total_vectors": self.vector_store.index.ntotal,
-            "embedding_dimension": self.vector_store.index.d,
-            "index_path": self.index_path
+            "total_vectors": self.vector_store.ntotal,
+            "embedding_dimension": self.vector_store.d,
+            "index_type": self.vector_store.index_type,
+            "mmap": config.index_mmap,
+            "index_path": self.index_path,
+            "segments": len(manifest["segments"]) if manifest else 0,
+            "index_version": manifest_version(manifest)
         }
+
+
+def compact_all_indexes(index_path: str = None, max_segments: int = None) -> int:
+    """
+    Compacte les index dont le nombre de segments dépasse le seuil
+    
+    Args:
+        index_path: Dossier contenant les index des chatbots
+        max_segments: Nombre de segments au-delà duquel un index est compacté
+        
+    Returns:
+        Nombre d'index compactés
+    """
+    index_path = index_path or config.index_path
+    max_segments = max_segments or config.index_max_segments
+    if not os.path.isdir(index_path):
+        return 0
+    
+    compacted = 0
+    for chatbot_id in os.listdir(index_path):
+        manifest = read_manifest(os.path.join(index_path, chatbot_id))
+        if manifest is None or len(manifest["segments"]) <= max_segments:
+            continue
+        try:
+            if DocumentIndexer(chatbot_id, index_path=index_path).compact():
+                compacted += 1
+        except Exception as e:
+            print(f"❌ Erreur lors du compactage de l'index {chatbot_id}: {e}")
+    
+    return compacted
+
+
+async def run_compaction_loop(interval_seconds: int = None):
+    """
+    Compacte périodiquement les index en arrière-plan (tâche asyncio).
+    Un seul processus compacte : celui qui détient le verrou `.locks/compaction.lock`
+    (les autres workers retentent à chaque intervalle, au cas où il s'arrête).
+    """
+    if not config.index_compaction_enabled:
+        return
+    interval_seconds = interval_seconds or config.index_compaction_interval_seconds
+    leader_lock = get_file_lock(os.path.join(config.index_path, LOCKS_DIR, "compaction.lock"))
+    is_leader = False
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            if not is_leader:
+                is_leader = leader_lock.acquire(blocking=False)
+                if not is_leader:
+                    continue
+            try:
+                compacted = await loop.run_in_executor(None, compact_all_indexes)
+                if compacted:
+                    print(f"🗜️  {compacted} index compacté(s)")
+            except Exception as e:
+                print(f"❌ Erreur lors du compactage des index: {e}")
+    finally:
+        if is_leader:
+            leader_lock.release()
@@ -0,0 +1,160 @@
+"""
+Cache persistant des embeddings, indexé par empreinte du contenu des chunks
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from app.core.config import config
+
+
+def content_hash(text: str, model_name: str, chunk_size: int, chunk_overlap: int) -> str:
+    """
+    Empreinte d'un chunk : même texte, même modèle et même découpage = même embedding
+
+    Args:
+        text: Texte du chunk
+        model_name: Modèle d'embeddings
+        chunk_size: Taille des chunks utilisée pour le découpage
+        chunk_overlap: Chevauchement utilisé pour le découpage
+
+    Returns:
+        Empreinte SHA-256 hexadécimale
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{model_name}\x00{chunk_size}\x00{chunk_overlap}\x00".encode("utf-8"))
+    digest.update(text.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """Cache SQLite (hash du chunk -> vecteur), partagé entre processus"""
+
+    def __init__(self, db_path: str):
+        """
+        Initialise le cache (la base est ouverte au premier accès)
+
+        Args:
+            db_path: Chemin du fichier SQLite
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connexion SQLite propre au thread courant"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            # WAL : lectures concurrentes pendant les écritures d'autres processus
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " hash TEXT PRIMARY KEY,"
+                " vector BLOB NOT NULL"
+                ")"
+            )
+            self._local.connection = connection
+        return connection
+
+    def get_many(self, hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        Récupère les embeddings connus
+
+        Args:
+            hashes: Empreintes recherchées
+
+        Returns:
+            Dictionnaire {hash: vecteur} pour les empreintes présentes
+        """
+        found = {}
+        connection = self._connection()
+        unique_hashes = list(dict.fromkeys(hashes))
+        # SQLite limite le nombre de paramètres par requête
+        for start in range(0, len(unique_hashes), 500):
+            batch = unique_hashes[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            rows = connection.execute(
+                f"SELECT hash, vector FROM embeddings WHERE hash IN ({placeholders})",
+                batch
+            )
+            for chunk_hash, vector in rows:
+                found[chunk_hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+
+        self.hits += len(found)
+        self.misses += len(unique_hashes) - len(found)
+        return found
+
+    def put_many(self, vectors: Dict[str, List[float]]):
+        """
+        Enregistre des embeddings
+
+        Args:
+            vectors: Dictionnaire {hash: vecteur}
+        """
+        if not vectors:
+            return
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO embeddings (hash, vector) VALUES (?, ?)",
+                [
+                    (chunk_hash, np.asarray(vector, dtype=np.float32).tobytes())
+                    for chunk_hash, vector in vectors.items()
+                ]
+            )
+
+    def embed(
+        self,
+        texts: List[str],
+        hashes: List[str],
+        embed_fn: Callable[[List[str]], List[List[float]]]
+    ) -> List[List[float]]:
+        """
+        Retourne les embeddings des textes en n'encodant que ceux absents du cache
+
+        Args:
+            texts: Textes des chunks
+            hashes: Empreintes correspondantes
+            embed_fn: Fonction d'encodage appelée sur les textes manquants
+
+        Returns:
+            Liste des vecteurs, dans l'ordre des textes
+        """
+        if not config.embedding_cache_enabled:
+            return embed_fn(texts)
+
+        cached = self.get_many(hashes)
+
+        missing = {}
+        for text, chunk_hash in zip(texts, hashes):
+            if chunk_hash not in cached and chunk_hash not in missing:
+                missing[chunk_hash] = text
+
+        if missing:
+            new_vectors = embed_fn(list(missing.values()))
+            computed = dict(zip(missing.keys(), new_vectors))
+            self.put_many(computed)
+            cached.update(computed)
+
+        return [cached[chunk_hash] for chunk_hash in hashes]
+
+    def get_stats(self) -> dict:
+        """Retourne les compteurs du cache pour ce processus"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Instance globale du cache d'embeddings
+embedding_cache = EmbeddingCache(config.embedding_cache_path)
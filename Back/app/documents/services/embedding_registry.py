@@ -0,0 +1,91 @@
+"""
+Registre des modèles d'embeddings partagé par tout le processus
+"""
+import threading
+import time
+from typing import Dict, Tuple
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+
+
+class EmbeddingRegistry:
+    """Garde une seule instance de modèle d'embeddings par (modèle, device)"""
+
+    def __init__(self):
+        """Initialise le registre (vide, les modèles sont chargés à la demande)"""
+        self._models: Dict[Tuple[str, str], HuggingFaceEmbeddings] = {}
+        self._lock = threading.Lock()
+        self._cold_loads = 0
+        self._cold_load_seconds = 0.0
+        self._hits = 0
+
+    def get(self, model_name: str, device: str = "cpu") -> HuggingFaceEmbeddings:
+        """
+        Retourne le modèle d'embeddings, en le chargeant au premier appel
+
+        Args:
+            model_name: Nom du modèle sentence-transformers
+            device: Device d'exécution ("cpu" ou "cuda")
+
+        Returns:
+            Instance partagée de HuggingFaceEmbeddings
+        """
+        key = (model_name, device)
+        embeddings = self._models.get(key)
+        if embeddings is not None:
+            self._hits += 1
+            return embeddings
+
+        with self._lock:
+            # Un autre thread a pu charger le modèle pendant l'attente du verrou
+            embeddings = self._models.get(key)
+            if embeddings is not None:
+                self._hits += 1
+                return embeddings
+
+            start = time.perf_counter()
+            embeddings = HuggingFaceEmbeddings(
+                model_name=model_name,
+                model_kwargs={'device': device},
+                encode_kwargs={'normalize_embeddings': True}
+            )
+            elapsed = time.perf_counter() - start
+
+            self._models[key] = embeddings
+            self._cold_loads += 1
+            self._cold_load_seconds += elapsed
+            print(f"🧠 Modèle d'embeddings chargé: {model_name} ({device}) en {elapsed:.2f}s")
+            return embeddings
+
+    def warmup(self, model_name: str, device: str = "cpu") -> HuggingFaceEmbeddings:
+        """
+        Charge le modèle et exécute un premier encodage pour initialiser les poids
+
+        Args:
+            model_name: Nom du modèle sentence-transformers
+            device: Device d'exécution ("cpu" ou "cuda")
+
+        Returns:
+            Instance partagée de HuggingFaceEmbeddings
+        """
+        embeddings = self.get(model_name, device)
+        embeddings.embed_query("warmup")
+        return embeddings
+
+    def get_stats(self) -> dict:
+        """
+        Retourne les métriques du registre
+
+        Returns:
+            Dictionnaire avec les statistiques
+        """
+        return {
+            "loaded_models": [f"{model}@{device}" for model, device in self._models],
+            "cold_loads": self._cold_loads,
+            "cold_load_seconds": round(self._cold_load_seconds, 3),
+            "hits": self._hits
+        }
+
+
+# Instance globale du registre
+embedding_registry = EmbeddingRegistry()
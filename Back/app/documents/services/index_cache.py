@@ -0,0 +1,81 @@
+"""
+Cache en mémoire des index FAISS chargés, par chatbot
+"""
+from typing import Optional, Tuple
+
+from app.core.cache import LRUCache
+from app.core.config import config
+from app.documents.services.vector_index import VectorIndex
+
+
+def estimate_index_bytes(entry: Tuple[object, VectorIndex]) -> int:
+    """
+    Estime l'empreinte mémoire d'un index chargé (les textes restent sur disque)
+
+    Args:
+        entry: Tuple (signature, vector_store) stocké dans le cache
+
+    Returns:
+        Taille estimée en octets
+    """
+    _, vector_store = entry
+    return vector_store.memory_bytes()
+
+
+class IndexCache:
+    """Cache LRU des index chargés, borné par un budget mémoire"""
+
+    def __init__(self, max_bytes: int):
+        """
+        Initialise le cache
+
+        Args:
+            max_bytes: Budget mémoire total en octets
+        """
+        self._cache = LRUCache(max_size=max_bytes, sizeof=estimate_index_bytes)
+
+    def get(self, chatbot_id: str, signature: object) -> Optional[VectorIndex]:
+        """
+        Retourne l'index en cache s'il correspond encore à la version sur disque
+
+        Args:
+            chatbot_id: ID du chatbot
+            signature: Signature de l'index sur disque (changement = entrée périmée)
+
+        Returns:
+            Le vector store en cache, ou None
+        """
+        entry = self._cache.get(chatbot_id)
+        if entry is None:
+            return None
+
+        cached_signature, vector_store = entry
+        if cached_signature != signature:
+            # L'index a été modifié (par exemple par un autre worker)
+            self._cache.invalidate(chatbot_id)
+            return None
+
+        return vector_store
+
+    def put(self, chatbot_id: str, signature: object, vector_store: VectorIndex):
+        """
+        Ajoute ou remplace (de façon atomique) l'index d'un chatbot
+
+        Args:
+            chatbot_id: ID du chatbot
+            signature: Signature de l'index sur disque
+            vector_store: Vector store chargé
+        """
+        self._cache.put(chatbot_id, (signature, vector_store))
+
+    def invalidate(self, chatbot_id: str):
+        """Retire l'index d'un chatbot du cache"""
+        self._cache.invalidate(chatbot_id)
+
+    def get_stats(self) -> dict:
+        """Retourne les compteurs du cache (hits, misses, évictions...)"""
+        return self._cache.get_stats()
+
+
+# Instance globale du cache
+index_cache = IndexCache(max_bytes=config.index_cache_max_mb * 1024 * 1024)
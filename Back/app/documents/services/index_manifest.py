@@ -0,0 +1,100 @@
+"""
+Manifeste des segments d'un index FAISS (format sur disque en ajout seul)
+
+Chaque upload écrit un nouveau segment (`segments/seg_000001/`) contenant uniquement
+ses vecteurs ; le manifeste liste les segments actifs et porte la version de l'index.
+Les textes des chunks sont dans le chunk store (`chunks.db`), commun aux segments.
+"""
+import json
+import os
+import uuid
+from typing import Optional
+
+MANIFEST_FILE = "manifest.json"
+SEGMENTS_DIR = "segments"
+
+# Format des segments : index FAISS brut (IndexIDMap sur les ids des chunks).
+# Les manifestes sans ce numéro référencent des segments LangChain (index.faiss + index.pkl).
+INDEX_FORMAT = 2
+
+# Segment de l'ancien format (index.faiss / index.pkl à la racine du dossier)
+LEGACY_SEGMENT = "."
+
+
+def new_manifest() -> dict:
+    """Crée un manifeste vide (nouvelle génération d'index)"""
+    return {
+        "generation": uuid.uuid4().hex,
+        "format": INDEX_FORMAT,
+        "version": 0,
+        "next_segment": 1,
+        "segments": []
+    }
+
+
+def read_manifest(index_path: str) -> Optional[dict]:
+    """
+    Lit le manifeste d'un index
+
+    Args:
+        index_path: Dossier de l'index
+
+    Returns:
+        Le manifeste, un manifeste synthétique pour un index à l'ancien format,
+        ou None si aucun index n'existe
+    """
+    manifest_file = os.path.join(index_path, MANIFEST_FILE)
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        pass
+
+    # Index à l'ancien format : un seul segment à la racine
+    if os.path.exists(os.path.join(index_path, "index.faiss")):
+        return {
+            "generation": "legacy",
+            "version": 0,
+            "next_segment": 1,
+            "segments": [LEGACY_SEGMENT]
+        }
+    return None
+
+
+def write_manifest(index_path: str, manifest: dict):
+    """
+    Écrit le manifeste de façon atomique (fichier temporaire + renommage)
+
+    Args:
+        index_path: Dossier de l'index
+        manifest: Manifeste à écrire
+    """
+    manifest_file = os.path.join(index_path, MANIFEST_FILE)
+    tmp_file = f"{manifest_file}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, manifest_file)
+
+
+def manifest_version(manifest: Optional[dict]) -> Optional[str]:
+    """Version de l'index décrite par un manifeste (change à chaque mutation)"""
+    if manifest is None:
+        return None
+    return f"{manifest['generation']}:{manifest['version']}"
+
+
+def allocate_segment(manifest: dict) -> str:
+    """
+    Réserve le nom du prochain segment dans le manifeste
+
+    Args:
+        manifest: Manifeste (modifié en place)
+
+    Returns:
+        Chemin relatif du segment
+    """
+    segment = f"{SEGMENTS_DIR}/seg_{manifest['next_segment']:06d}"
+    manifest["next_segment"] += 1
+    return segment
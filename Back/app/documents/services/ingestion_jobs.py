@@ -0,0 +1,496 @@
+"""
+File d'attente des jobs d'ingestion de documents (parsing, chunking, embeddings, indexation)
+"""
+import asyncio
+import multiprocessing
+import os
+import socket
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, Optional, Set
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from app.chatbots.public_cache import public_chatbot_cache
+from app.core.concurrency import retrieval_executor, run_in_executor
+from app.core.config import config
+from app.core.mongodb import chatbots_collection, ingestion_jobs_collection
+from app.documents.services import ingestion_worker
+from app.documents.services.document_indexer import DocumentIndexer
+
+# Statuts possibles d'un job
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class IngestionQueue:
+    """File de jobs d'ingestion persistée dans MongoDB et exécutée par un pool de workers"""
+
+    def __init__(self):
+        """Initialise la file (les workers sont démarrés par `start`)"""
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._reclaim_task: Optional[asyncio.Task] = None
+        # Jobs déjà dans la file locale (la reprise périodique ne les ajoute pas deux fois)
+        self._queued: Set[ObjectId] = set()
+        # Un seul job du processus à la fois écrit dans l'index d'un chatbot donné
+        # (entre processus : verrou fichier de l'index, voir `_add_to_index`).
+        # chatbot_id -> [verrou, tâches qui le détiennent ou l'attendent]
+        self._index_locks: Dict[str, list] = {}
+
+    async def start(self):
+        """Démarre le pool de processus, les workers, et la reprise des jobs non terminés"""
+        self._queue = asyncio.Queue()
+        self._process_pool = ProcessPoolExecutor(
+            max_workers=config.ingestion_process_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=ingestion_worker.init_worker,
+            initargs=(config.embedding_model, config.embedding_device)
+        )
+        self._tasks = [
+            asyncio.create_task(self._worker_loop())
+            for _ in range(config.ingestion_workers)
+        ]
+        await self.resume_unfinished()
+        self._reclaim_task = asyncio.create_task(self._reclaim_loop())
+
+    async def stop(self):
+        """Arrête les workers ; les jobs en cours seront repris à l'expiration de leur bail"""
+        tasks = self._tasks + ([self._reclaim_task] if self._reclaim_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._reclaim_task = None
+        self._queued.clear()
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+    async def enqueue(
+        self,
+        chatbot_id: str,
+        user_id: str,
+        filename: str,
+        file_path: str,
+        chunk_size: int,
+        chunk_overlap: int,
+        replace: bool = False
+    ) -> dict:
+        """
+        Crée un job d'ingestion et le place dans la file
+
+        Args:
+            chatbot_id: ID du chatbot
+            user_id: ID du propriétaire du chatbot
+            filename: Nom du fichier uploadé
+            file_path: Chemin du fichier sur le disque
+            chunk_size: Taille des chunks
+            chunk_overlap: Chevauchement entre chunks
+            replace: Nouvelle version d'un document existant (fichier provisoire dans `file_path`) :
+                l'ancienne version reste en place jusqu'à la fin du job
+
+        Returns:
+            Le document du job créé
+        """
+        now = datetime.utcnow()
+        job = {
+            "chatbot_id": chatbot_id,
+            "user_id": user_id,
+            "filename": filename,
+            "file_path": file_path,
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "replace": replace,
+            "status": JOB_PENDING,
+            "total_chunks": None,
+            "processed_chunks": 0,
+            "parse_progress": 0.0,
+            "error": None,
+            "attempts": 0,
+            "worker_id": None,
+            "lease_expires_at": None,
+            "created_at": now,
+            "updated_at": now,
+            "completed_at": None
+        }
+        result = await ingestion_jobs_collection.insert_one(job)
+        job["_id"] = result.inserted_id
+        await self._put(result.inserted_id)
+        return job
+
+    async def _put(self, job_id: ObjectId) -> bool:
+        """Place un job dans la file locale s'il n'y est pas déjà"""
+        if job_id in self._queued:
+            return False
+        self._queued.add(job_id)
+        await self._queue.put(job_id)
+        return True
+
+    async def resume_unfinished(self):
+        """
+        Remet en file les jobs en attente ou abandonnés (bail expiré : worker arrêté ou planté).
+        Un job remis en file par plusieurs processus n'est exécuté qu'une fois (`_claim`).
+        """
+        cursor = ingestion_jobs_collection.find(
+            {
+                "$or": [
+                    {"status": JOB_PENDING},
+                    {"status": JOB_RUNNING, "lease_expires_at": {"$lt": datetime.utcnow()}}
+                ]
+            },
+            {"_id": 1}
+        ).sort("created_at", 1)
+
+        resumed = 0
+        async for job in cursor:
+            if await self._put(job["_id"]):
+                resumed += 1
+
+        if resumed:
+            print(f"🔁 {resumed} job(s) d'ingestion repris")
+
+    async def _reclaim_loop(self):
+        """Reprend périodiquement les jobs dont le bail a expiré, dans tous les processus"""
+        while True:
+            await asyncio.sleep(config.ingestion_reclaim_interval_seconds)
+            try:
+                await self.resume_unfinished()
+            except Exception as e:
+                print(f"❌ Erreur lors de la reprise des jobs d'ingestion: {e}")
+
+    async def _worker_loop(self):
+        """Boucle d'un worker : récupère et exécute les jobs un par un"""
+        while True:
+            job_id = await self._queue.get()
+            self._queued.discard(job_id)
+            try:
+                job = await self._claim(job_id)
+                if job is not None:
+                    await self._run_job(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"❌ Erreur du worker d'ingestion: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _claim(self, job_id: ObjectId) -> Optional[dict]:
+        """Réserve un job de façon atomique (évite qu'un autre worker le traite aussi)"""
+        now = datetime.utcnow()
+        return await ingestion_jobs_collection.find_one_and_update(
+            {
+                "_id": job_id,
+                "$or": [
+                    {"status": JOB_PENDING},
+                    {"status": JOB_RUNNING, "lease_expires_at": {"$lt": now}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": JOB_RUNNING,
+                    "worker_id": self.worker_id,
+                    "processed_chunks": 0,
+                    "parse_progress": 0.0,
+                    "lease_expires_at": self._lease_deadline(),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def _lease_deadline() -> datetime:
+        return datetime.utcnow() + timedelta(seconds=config.ingestion_lease_seconds)
+
+    async def _update(self, job_id: ObjectId, fields: dict):
+        """Met à jour un job et prolonge son bail"""
+        fields = {**fields, "updated_at": datetime.utcnow(), "lease_expires_at": self._lease_deadline()}
+        await ingestion_jobs_collection.update_one({"_id": job_id}, {"$set": fields})
+
+    async def _run_job(self, job: dict):
+        """
+        Exécute un job par fenêtres de `ingestion_window_size` chunks : lecture et découpage,
+        embeddings par lots, puis ajout à l'index. La mémoire ne dépend pas de la taille du fichier.
+        """
+        job_id = job["_id"]
+        chatbot_id = job["chatbot_id"]
+        source = self._source(job)
+        loop = asyncio.get_running_loop()
+        
+        progress = {}
+        chunks = DocumentIndexer.iter_chunks(
+            job["file_path"],
+            job["chunk_size"],
+            job["chunk_overlap"],
+            {"filename": job["filename"]},
+            progress
+        )
+        total_chunks = 0
+        duplicate_chunks = 0
+        indexed_chunks = 0
+        embedding_seconds = 0.0
+
+        try:
+            # 1. Lecture et découpage (thread) de la première fenêtre
+            next_window = loop.run_in_executor(None, self._take, chunks, config.ingestion_window_size)
+            while True:
+                window = await next_window
+                if not window:
+                    break
+                total_chunks += len(window)
+                # La fenêtre suivante est lue pendant le traitement de celle-ci
+                next_window = loop.run_in_executor(None, self._take, chunks, config.ingestion_window_size)
+
+                # 2. Écarter les chunks déjà présents dans l'index (ré-upload, fenêtres précédentes...)
+                texts, metadatas, hashes = await run_in_executor(
+                    retrieval_executor,
+                    self._deduplicate,
+                    chatbot_id,
+                    window,
+                    job["chunk_size"],
+                    job["chunk_overlap"]
+                )
+                duplicate_chunks += len(window) - len(texts)
+
+                # 3. Embeddings par lots répartis sur le pool (cache d'embeddings consulté
+                #    dans chaque processus), progression au niveau des chunks
+                batch_size = config.ingestion_batch_size
+                embedding_start = time.perf_counter()
+                batch_futures = [
+                    loop.run_in_executor(
+                        self._process_pool,
+                        ingestion_worker.embed_texts,
+                        config.embedding_model,
+                        config.embedding_device,
+                        texts[start:start + batch_size],
+                        hashes[start:start + batch_size]
+                    )
+                    for start in range(0, len(texts), batch_size)
+                ]
+                embeddings = []
+                for future in batch_futures:
+                    embeddings.extend(await future)
+                    await self._update(job_id, {
+                        "total_chunks": total_chunks,
+                        "processed_chunks": duplicate_chunks + indexed_chunks + len(embeddings),
+                        "duplicate_chunks": duplicate_chunks,
+                        "parse_progress": progress.get("fraction", 0.0)
+                    })
+                embedding_seconds += time.perf_counter() - embedding_start
+
+                # 4. Ajout de la fenêtre à l'index FAISS du chatbot (un seul écrivain par chatbot)
+                async with self.index_lock(chatbot_id):
+                    added = await run_in_executor(
+                        retrieval_executor,
+                        self._add_to_index,
+                        chatbot_id,
+                        source,
+                        texts,
+                        embeddings,
+                        metadatas,
+                        [text for text, _ in window],
+                        job["chunk_size"],
+                        job["chunk_overlap"]
+                    )
+                # Chunks indexés entre-temps par un autre job : comptés comme doublons
+                duplicate_chunks += len(texts) - added
+                indexed_chunks += added
+                await self._update(job_id, {
+                    "total_chunks": total_chunks,
+                    "processed_chunks": duplicate_chunks + indexed_chunks,
+                    "duplicate_chunks": duplicate_chunks,
+                    "parse_progress": progress.get("fraction", 0.0)
+                })
+
+            chunks_per_second = indexed_chunks / embedding_seconds if embedding_seconds > 0 else 0.0
+
+            # 5. Enregistrer le document dans le chatbot
+            replaced = False
+            if job.get("replace"):
+                # Nouvelle version complète : retirer l'ancienne, puis prendre sa place
+                async with self.index_lock(chatbot_id):
+                    await run_in_executor(
+                        retrieval_executor, self._replace_document, chatbot_id, job["filename"], source
+                    )
+                    os.replace(job["file_path"], os.path.join(os.path.dirname(job["file_path"]), job["filename"]))
+                    result = await chatbots_collection.update_one(
+                        {"_id": ObjectId(chatbot_id), "documents.filename": job["filename"]},
+                        {"$set": {
+                            "documents.$.upload_date": datetime.now(),
+                            "documents.$.chunks_count": indexed_chunks,
+                            "updated_at": datetime.now()
+                        }}
+                    )
+                # Document supprimé pendant le job : la nouvelle version est ajoutée
+                replaced = result.matched_count > 0
+            if not replaced:
+                await chatbots_collection.update_one(
+                    {"_id": ObjectId(chatbot_id)},
+                    {
+                        "$push": {"documents": {
+                            "filename": job["filename"],
+                            "upload_date": datetime.now(),
+                            "chunks_count": indexed_chunks
+                        }},
+                        "$set": {"updated_at": datetime.now()}
+                    }
+                )
+            public_chatbot_cache.invalidate(chatbot_id)
+
+            await self._update(job_id, {
+                "status": JOB_COMPLETED,
+                "total_chunks": total_chunks,
+                "processed_chunks": total_chunks,
+                "duplicate_chunks": duplicate_chunks,
+                "parse_progress": 1.0,
+                "chunks_per_second": round(chunks_per_second, 1),
+                "completed_at": datetime.utcnow(),
+                "lease_expires_at": None
+            })
+            print(
+                f"✅ Job d'ingestion terminé: {job['filename']} "
+                f"({indexed_chunks} chunks, {duplicate_chunks} doublons, {chunks_per_second:.0f} chunks/s)"
+            )
+
+        except Exception as e:
+            print(f"❌ Échec du job d'ingestion {job_id}: {e}")
+            await ingestion_jobs_collection.update_one(
+                {"_id": job_id},
+                {"$set": {
+                    "status": JOB_FAILED,
+                    "error": str(e),
+                    "lease_expires_at": None,
+                    "updated_at": datetime.utcnow()
+                }}
+            )
+            await self._discard_partial(job, indexed=total_chunks > 0)
+
+    async def _discard_partial(self, job: dict, indexed: bool = True):
+        """
+        Retire les fenêtres déjà indexées et le fichier uploadé d'un document dont
+        l'ingestion a échoué (pour un remplacement, l'ancienne version est conservée telle quelle)
+
+        Args:
+            job: Job en échec
+            indexed: Des fenêtres ont pu être ajoutées à l'index
+        """
+        chatbot_id = job["chatbot_id"]
+        filename = job["filename"]
+        try:
+            if not job.get("replace"):
+                # Un document déjà enregistré (autre upload du même nom) est conservé
+                registered = await chatbots_collection.find_one(
+                    {"_id": ObjectId(chatbot_id), "documents.filename": filename},
+                    {"_id": 1}
+                )
+                if registered is not None:
+                    return
+            removed = 0
+            if indexed:
+                async with self.index_lock(chatbot_id):
+                    removed = await run_in_executor(
+                        retrieval_executor, self._delete_document, chatbot_id, self._source(job)
+                    )
+            if os.path.exists(job["file_path"]):
+                os.remove(job["file_path"])
+            if removed:
+                print(f"🧹 {removed} chunks partiels de {filename} retirés de l'index")
+        except Exception as e:
+            print(f"⚠️  Impossible de retirer les chunks partiels de {filename}: {e}")
+
+    @staticmethod
+    def _source(job: dict) -> str:
+        """
+        Nom sous lequel les chunks du job sont rattachés : celui du document, ou un nom
+        provisoire pour une nouvelle version (un nom de document ne contient jamais "/")
+        """
+        if job.get("replace"):
+            return f"{job['_id']}/{job['filename']}"
+        return job["filename"]
+
+    @staticmethod
+    def _take(chunks, size: int) -> list:
+        """Lit les `size` chunks suivants (exécuté dans un thread) sous forme (texte, métadonnées)"""
+        return [(chunk.page_content, chunk.metadata) for chunk in islice(chunks, size)]
+
+    @staticmethod
+    def _deduplicate(chatbot_id: str, chunks, chunk_size: int, chunk_overlap: int):
+        """Écarte les chunks déjà indexés pour ce chatbot (exécuté dans un thread)"""
+        indexer = DocumentIndexer(chatbot_id)
+        return indexer.deduplicate_chunks(
+            [text for text, _ in chunks],
+            [metadata for _, metadata in chunks],
+            chunk_size,
+            chunk_overlap
+        )
+
+    @staticmethod
+    def _add_to_index(
+        chatbot_id: str,
+        source: str,
+        texts,
+        embeddings,
+        metadatas,
+        window_texts,
+        chunk_size: int,
+        chunk_overlap: int
+    ) -> int:
+        """
+        Ajoute les chunks calculés à l'index du chatbot et rattache au document tous les
+        chunks de la fenêtre, doublons compris (exécuté dans un thread). Le verrou fichier
+        de l'index sérialise ces écritures avec celles des autres processus.
+        """
+        indexer = DocumentIndexer(chatbot_id)
+        with indexer.write_lock():
+            added = indexer.add_embedded_chunks(texts, embeddings, metadatas, source)
+            indexer.link_document(source, window_texts, chunk_size, chunk_overlap)
+        return added
+
+    @staticmethod
+    def _replace_document(chatbot_id: str, filename: str, source: str) -> int:
+        """Remplace l'ancienne version d'un document par celle indexée sous `source` (exécuté dans un thread)"""
+        return DocumentIndexer(chatbot_id).replace_document(filename, source)
+
+    @staticmethod
+    def _delete_document(chatbot_id: str, filename: str) -> int:
+        """Retire les chunks d'un document de l'index du chatbot (exécuté dans un thread)"""
+        return DocumentIndexer(chatbot_id).delete_document(filename)
+
+    @asynccontextmanager
+    async def index_lock(self, chatbot_id: str):
+        """
+        Verrou des écritures sur l'index d'un chatbot dans ce processus (ajouts et suppressions
+        de documents), à utiliser avec `async with` ; oublié dès que plus aucune tâche ne l'utilise
+        """
+        entry = self._index_locks.get(chatbot_id)
+        if entry is None:
+            entry = self._index_locks[chatbot_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._index_locks[chatbot_id]
+
+    def get_stats(self) -> dict:
+        """Retourne l'état de la file locale"""
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "workers": len(self._tasks)
+        }
+
+
+# Instance globale de la file d'ingestion
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,29 @@
+"""
+Fonctions exécutées dans les processus du pool d'ingestion (embeddings)
+"""
+from typing import List
+
+from app.documents.services.batch_embedder import BatchEmbedder
+from app.documents.services.embedding_cache import embedding_cache
+from app.documents.services.embedding_registry import embedding_registry
+
+
+def init_worker(model_name: str, device: str):
+    """Charge le modèle d'embeddings une fois au démarrage du processus"""
+    embedding_registry.warmup(model_name, device)
+
+
+def embed_texts(model_name: str, device: str, texts: List[str], hashes: List[str]) -> List[List[float]]:
+    """
+    Calcule les embeddings d'un lot de textes (en réutilisant ceux du cache persistant)
+
+    Args:
+        model_name: Nom du modèle d'embeddings
+        device: Device d'exécution
+        texts: Textes à encoder
+        hashes: Empreintes des chunks (clés du cache d'embeddings)
+
+    Returns:
+        Liste des vecteurs
+    """
+    return embedding_cache.embed(texts, hashes, BatchEmbedder(model_name, device).embed)
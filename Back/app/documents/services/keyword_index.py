@@ -0,0 +1,120 @@
+"""
+Recherche lexicale (BM25) et fusion avec la recherche vectorielle
+
+L'index inversé de chaque chatbot est une table SQLite FTS5 à contenu externe, dans
+le chunk store : elle est alimentée dans la même transaction que les chunks (donc en
+même temps que les segments FAISS) et ne duplique pas leur texte. Les listes de
+postings FTS5 sont compressées (deltas d'ids encodés en varint).
+
+Pour une latence stable sur de gros index, les termes trop fréquents (mots vides,
+termes présents dans plus de `bm25_max_df_ratio` des chunks) sont écartés de la
+requête : leur IDF est quasi nulle mais leurs listes de postings sont les plus longues.
+Les termes restants sont pris du plus rare au plus fréquent dans la limite de
+`bm25_max_postings` postings lus par requête.
+"""
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Tuple
+
+# Même découpage que le tokenizer FTS5 `unicode61 remove_diacritics 2`
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+STOPWORDS = frozenset("""
+a au aux avec ce ces comment dans de des du elle en est et il ils je la le les leur lui ma mais me
+mes moi mon ne nos notre nous on ou par pas pour qu que quel quelle qui sa se ses son sur ta te tes
+toi ton tu un une vos votre vous y c d j l m n s t
+an and are as at be by do does for from how i in is it of on or that the this to was what when
+where which who why with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Découpe un texte en termes comme le fait l'index FTS5
+    (minuscules, sans accents, séparation sur la ponctuation)
+
+    Args:
+        text: Texte à découper
+
+    Returns:
+        Liste des termes, dans l'ordre
+    """
+    decomposed = unicodedata.normalize("NFD", text.lower())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _TOKEN_PATTERN.findall(stripped)
+
+
+def query_terms(query: str, max_terms: int) -> List[str]:
+    """
+    Termes utiles d'une requête : sans mots vides ni doublons
+
+    Args:
+        query: Requête de l'utilisateur
+        max_terms: Nombre maximum de termes conservés
+
+    Returns:
+        Liste des termes, dans l'ordre de la requête
+    """
+    terms = [term for term in tokenize(query) if term not in STOPWORDS]
+    return list(dict.fromkeys(terms))[:max_terms]
+
+
+def select_terms(
+    document_frequencies: Dict[str, int],
+    total_chunks: int,
+    max_df_ratio: float,
+    max_postings: int
+) -> List[str]:
+    """
+    Écarte les termes absents de l'index et ceux présents dans trop de chunks, puis
+    garde les plus rares tant que le total de leurs postings reste dans le budget
+    (le coût d'une requête ne croît donc pas avec la taille de l'index)
+
+    Args:
+        document_frequencies: Nombre de chunks contenant chaque terme de la requête
+        total_chunks: Nombre de chunks de l'index
+        max_df_ratio: Proportion maximale de chunks contenant un terme conservé
+        max_postings: Nombre maximum de postings lus pour la requête
+
+    Returns:
+        Termes à chercher (le plus rare est toujours conservé)
+    """
+    present = sorted(
+        ((df, term) for term, df in document_frequencies.items() if df > 0)
+    )
+    if not present:
+        return []
+    limit = max(1, int(max_df_ratio * total_chunks))
+    selected = []
+    postings = 0
+    for df, term in present:
+        if df > limit or (selected and postings + df > max_postings):
+            break
+        selected.append(term)
+        postings += df
+    return selected or [present[0][1]]
+
+
+def match_expression(terms: Iterable[str]) -> str:
+    """Expression MATCH FTS5 : disjonction des termes (entre guillemets)"""
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def reciprocal_rank_fusion(rankings: List[List[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Fusionne plusieurs classements par Reciprocal Rank Fusion : score = Σ 1 / (k + rang)
+
+    Args:
+        rankings: Listes d'ids de chunks, chacune du plus pertinent au moins pertinent
+        k: Constante d'atténuation des rangs
+
+    Returns:
+        Liste de tuples (id du chunk, score RRF), du meilleur au moins bon
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -41,44 +41,34 @@ Réponse:""",
             input_variables=["system_prompt", "context", "question"]
         )
     
-    def generate_response_stream(self, context: str, question: str, system_prompt: str = None, conversation_history: List[Dict] = None):
+    def build_prompt(self, context: str, question: str, system_prompt: str = None, conversation_history: List[Dict] = None) -> str:
         """
-        Génère une réponse en streaming basée sur le contexte et la question
+        Construit le prompt complet envoyé au modèle
         
         Args:
             context: Contexte extrait des documents
             question: Question de l'utilisateur
             system_prompt: Prompt système personnalisé (optionnel)
-            conversation_history: Historique de conversation (optionnel) - Limité aux 3 derniers échanges
+            conversation_history: Historique de conversation (optionnel), déjà ajusté au budget de tokens
             
         Returns:
-            Tuple[Iterator[str], Dict]: (chunks de réponse, usage_container)
-            Le usage_container sera rempli après la fin du stream
+            Le prompt formaté
         """
         # Utiliser le prompt personnalisé ou celui par défaut
         prompt_to_use = system_prompt if system_prompt else config.system_prompt
         
-        # Construire l'historique si présent (limité aux 2-3 derniers échanges)
+        # Historique déjà ajusté au budget de tokens par le ContextPacker
         history_text = ""
-        if conversation_history and len(conversation_history) > 0:
-            # Garder seulement les 4 derniers messages (2 échanges)
-            recent_history = conversation_history[-4:] if len(conversation_history) > 4 else conversation_history
-            
+        if conversation_history:
             history_parts = []
-            for msg in recent_history:
+            for msg in conversation_history:
                 role = "Utilisateur" if msg.get("role") == "user" else "Assistant"
-                content = msg.get("content", "")
-                # Limiter la longueur de chaque message à 500 caractères pour ne pas surcharger
-                if len(content) > 500:
-                    content = content[:500] + "..."
-                history_parts.append(f"{role}: {content}")
-            
-            if history_parts:
-                history_text = "\n\nHistorique récent de la conversation:\n" + "\n".join(history_parts)
+                history_parts.append(f"{role}: {msg.get('content', '')}")
+            history_text = "\n\nHistorique récent de la conversation:\n" + "\n".join(history_parts)
         
         # Générer le prompt avec ou sans historique
         if history_text:
-            full_prompt = f"""{prompt_to_use}
+            return f"""{prompt_to_use}
 
 Contexte des documents:
 {context}
@@ -87,12 +77,121 @@ Contexte des documents:
 Question actuelle: {question}
 
 Réponse:"""
-        else:
-            full_prompt = self.prompt_template.format(
-                system_prompt=prompt_to_use,
-                context=context,
-                question=question
-            )
+        
+        return self.prompt_template.format(
+            system_prompt=prompt_to_use,
+            context=context,
+            question=question
+        )
+    
+    @staticmethod
+    def _extract_event(event, usage_container: Dict) -> Optional[str]:
+        """
+        Extrait le texte d'un événement de stream et enregistre l'usage final
+        
+        Args:
+            event: Événement renvoyé par le client Mistral
+            usage_container: Dictionnaire rempli avec les stats d'usage
+            
+        Returns:
+            Le fragment de texte de l'événement, ou None
+        """
+        content = None
+        
+        # Chunk de contenu
+        if event.data and hasattr(event.data, 'choices') and len(event.data.choices) > 0:
+            delta = event.data.choices[0].delta
+            if hasattr(delta, 'content') and delta.content:
+                content = delta.content
+        
+        # Événement de fin avec usage
+        if hasattr(event, 'data') and hasattr(event.data, 'usage') and event.data.usage:
+            usage_container['prompt_tokens'] = event.data.usage.prompt_tokens
+            usage_container['completion_tokens'] = event.data.usage.completion_tokens
+            usage_container['total_tokens'] = event.data.usage.total_tokens
+            print(f"📊 Usage Mistral détecté: {usage_container}")
+        
+        return content
+    
+    @staticmethod
+    def _extract_completion(response) -> Tuple[str, Dict]:
+        """
+        Extrait le texte et l'usage d'une réponse complète (non streamée)
+        
+        Args:
+            response: Réponse renvoyée par le client Mistral
+            
+        Returns:
+            Tuple (texte de la réponse, usage)
+        """
+        answer = response.choices[0].message.content if response.choices else ""
+        usage = {}
+        if getattr(response, 'usage', None):
+            usage = {
+                'prompt_tokens': response.usage.prompt_tokens,
+                'completion_tokens': response.usage.completion_tokens,
+                'total_tokens': response.usage.total_tokens
+            }
+        return answer or "", usage
+    
+    def generate_response(self, context: str, question: str, system_prompt: str = None, conversation_history: List[Dict] = None) -> Tuple[str, Dict]:
+        """
+        Génère une réponse complète basée sur le contexte et la question
+        
+        Args:
+            context: Contexte extrait des documents
+            question: Question de l'utilisateur
+            system_prompt: Prompt système personnalisé (optionnel)
+            conversation_history: Historique de conversation (optionnel), déjà ajusté au budget de tokens
+            
+        Returns:
+            Tuple (réponse, usage)
+        """
+        full_prompt = self.build_prompt(context, question, system_prompt, conversation_history)
+        response = self.client.chat.complete(
+            model=config.mistral_model,
+            messages=[{"role": "user", "content": full_prompt}],
+            temperature=0.3
+        )
+        return self._extract_completion(response)
+    
+    async def agenerate_response(self, context: str, question: str, system_prompt: str = None, conversation_history: List[Dict] = None) -> Tuple[str, Dict]:
+        """
+        Version asynchrone de generate_response (client Mistral async) : plusieurs
+        générations peuvent être en cours sans bloquer la boucle d'événements
+        
+        Args:
+            context: Contexte extrait des documents
+            question: Question de l'utilisateur
+            system_prompt: Prompt système personnalisé (optionnel)
+            conversation_history: Historique de conversation (optionnel)
+            
+        Returns:
+            Tuple (réponse, usage)
+        """
+        full_prompt = self.build_prompt(context, question, system_prompt, conversation_history)
+        response = await self.client.chat.complete_async(
+            model=config.mistral_model,
+            messages=[{"role": "user", "content": full_prompt}],
+            temperature=0.3
+        )
+        return self._extract_completion(response)
+    
+    def generate_response_stream(self, context: str, question: str, system_prompt: str = None, conversation_history: List[Dict] = None):
+        """
+        Génère une réponse en streaming basée sur le contexte et la question
+        
+        Args:
+            context: Contexte extrait des documents
+            question: Question de l'utilisateur
+            system_prompt: Prompt système personnalisé (optionnel)
+            conversation_history: Historique de conversation (optionnel), déjà ajusté au budget de tokens
+            
+        Returns:
+            Tuple[Iterator[str], Dict]: (chunks de réponse, usage_container)
+            Le usage_container sera rempli après la fin du stream
+        """
+        full_prompt = self.build_prompt(context, question, system_prompt, conversation_history)
         
         # Container qui sera rempli après le stream
         usage_container = {}
@@ -105,18 +204,43 @@ Réponse:"""
             )
             
             for event in stream_response:
-                # Chunk de contenu
-                if event.data and hasattr(event.data, 'choices') and len(event.data.choices) > 0:
-                    delta = event.data.choices[0].delta
-                    if hasattr(delta, 'content') and delta.content:
-                        yield delta.content
-                
-                # Événement de fin avec usage
-                if hasattr(event, 'data') and hasattr(event.data, 'usage') and event.data.usage:
-                    usage_container['prompt_tokens'] = event.data.usage.prompt_tokens
-                    usage_container['completion_tokens'] = event.data.usage.completion_tokens
-                    usage_container['total_tokens'] = event.data.usage.total_tokens
-                    print(f"📊 Usage Mistral détecté: {usage_container}")
+                content = self._extract_event(event, usage_container)
+                if content:
+                    yield content
+        
+        return stream_generator(), usage_container
+    
+    def generate_response_stream_async(self, context: str, question: str, system_prompt: str = None, conversation_history: List[Dict] = None):
+        """
+        Version asynchrone de generate_response_stream (client Mistral async).
+        Le stream ne bloque pas la boucle d'événements pendant l'attente des tokens.
+        
+        Args:
+            context: Contexte extrait des documents
+            question: Question de l'utilisateur
+            system_prompt: Prompt système personnalisé (optionnel)
+            conversation_history: Historique de conversation (optionnel)
+            
+        Returns:
+            Tuple[AsyncIterator[str], Dict]: (chunks de réponse, usage_container)
+            Le usage_container sera rempli après la fin du stream
+        """
+        full_prompt = self.build_prompt(context, question, system_prompt, conversation_history)
+        
+        # Container qui sera rempli après le stream
+        usage_container = {}
+        
+        async def stream_generator():
+            stream_response = await self.client.chat.stream_async(
+                model=config.mistral_model,
+                messages=[{"role": "user", "content": full_prompt}],
+                temperature=0.3
+            )
+            
+            async for event in stream_response:
+                content = self._extract_event(event, usage_container)
+                if content:
+                    yield content
         
         return stream_generator(), usage_container
     
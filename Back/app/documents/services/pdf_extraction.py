@@ -0,0 +1,91 @@
+"""
+Extraction du texte des PDF, répartie par plages de pages sur un pool de processus
+
+pypdf analyse les pages en Python pur, une par une : pour les gros manuels c'est
+l'étape la plus lente de l'ingestion. Au-delà de `pdf_parallel_min_pages` pages, le
+document est découpé en plages de `pdf_pages_per_shard` pages extraites en parallèle,
+puis les pages sont restituées dans l'ordre. Le nombre de plages en cours est borné
+(lecture en flux, mémoire indépendante de la taille du document).
+"""
+from collections import deque
+from concurrent.futures import Executor
+from typing import Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+from pypdf import PdfReader
+
+from app.core.concurrency import extraction_executor
+from app.core.config import config
+
+
+def extract_pages(file_path: str, start: int, end: int) -> List[Tuple[int, str]]:
+    """
+    Extrait le texte d'une plage de pages (exécuté dans un processus du pool)
+
+    Args:
+        file_path: Chemin du PDF
+        start: Première page (incluse, numérotée à partir de 0)
+        end: Dernière page (exclue)
+
+    Returns:
+        Liste de tuples (numéro de page, texte)
+    """
+    reader = PdfReader(file_path)
+    return [(number, reader.pages[number].extract_text()) for number in range(start, end)]
+
+
+def _page_document(file_path: str, number: int, text: str) -> Document:
+    """Page au format LangChain (mêmes métadonnées que PyPDFLoader)"""
+    return Document(page_content=text, metadata={"source": file_path, "page": number})
+
+
+def iter_pdf_pages(
+    file_path: str,
+    progress: Optional[dict] = None,
+    executor: Optional[Executor] = None
+) -> Iterator[Document]:
+    """
+    Lit les pages d'un PDF dans l'ordre, en parallèle pour les gros documents
+
+    Args:
+        file_path: Chemin du PDF
+        progress: Dictionnaire optionnel mis à jour au fil de la lecture
+            ("pages" lues, "fraction" du document parcourue)
+        executor: Pool de processus à utiliser (par défaut le pool d'extraction partagé)
+
+    Yields:
+        Pages du document (métadonnées `source` et `page`)
+    """
+    progress = progress if progress is not None else {}
+    progress.setdefault("pages", 0)
+    reader = PdfReader(file_path)
+    total_pages = len(reader.pages)
+
+    def emit(pages):
+        for number, text in pages:
+            progress["pages"] += 1
+            progress["fraction"] = min(1.0, progress["pages"] / (total_pages or 1))
+            yield _page_document(file_path, number, text)
+
+    # Petits documents : le démarrage des processus coûterait plus qu'il ne rapporte
+    if config.pdf_extraction_workers <= 1 or total_pages < config.pdf_parallel_min_pages:
+        yield from emit((number, page.extract_text()) for number, page in enumerate(reader.pages))
+        return
+    del reader
+
+    executor = executor or extraction_executor()
+    shard = max(1, config.pdf_pages_per_shard)
+    ranges = deque((start, min(start + shard, total_pages)) for start in range(0, total_pages, shard))
+    # Plages soumises d'avance : assez pour occuper le pool sans tout garder en mémoire
+    max_pending = config.pdf_extraction_workers * 2
+    pending = deque()
+    try:
+        while ranges or pending:
+            while ranges and len(pending) < max_pending:
+                start, end = ranges.popleft()
+                pending.append(executor.submit(extract_pages, file_path, start, end))
+            yield from emit(pending.popleft().result())
+    finally:
+        # Lecture interrompue : ne pas laisser tourner les plages restantes
+        for future in pending:
+            future.cancel()
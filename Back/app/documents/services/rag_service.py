@@ -1,10 +1,16 @@
 """
 Service RAG - Retrieval Augmented Generation
 """
+import asyncio
+import re
 from typing import List, Dict, Iterator, Tuple, Optional
 
+from app.core.concurrency import retrieval_executor, run_in_executor
+from app.core.config import config
+from app.documents.services.context_packer import ContextPacker, PackedContext
 from app.documents.services.document_indexer import DocumentIndexer
 from app.documents.services.mistral_service import MistralService
+from app.documents.services.response_cache import CachedResponse, response_cache
 
 
 class RAGService:
@@ -17,8 +23,10 @@ class RAGService:
         Args:
             chatbot_id: ID du chatbot pour un index spécifique
         """
+        self.chatbot_id = chatbot_id
         self.indexer = DocumentIndexer(chatbot_id=chatbot_id)
         self.mistral = MistralService()
+        self.packer = ContextPacker()
     
     def index_exists(self) -> bool:
         """Vérifie si un index existe pour ce chatbot"""
@@ -43,37 +51,72 @@ class RAGService:
             }
         
         # Récupérer les documents pertinents
-        docs_with_scores = self.indexer.search(question, k=k)
+        results = self.indexer.retrieve(question, k=k, mode=config.retrieval_mode)
         
-        if not docs_with_scores:
+        if not results:
             return {
                 "answer": "Je n'ai pas trouvé d'informations pertinentes dans les documents indexés.",
                 "sources": []
             }
         
-        # Préparer le contexte
-        context = "\n\n".join([
-            f"Document {i+1}:\n{doc.page_content}" 
-            for i, (doc, _) in enumerate(docs_with_scores)
-        ])
+        # Préparer le contexte dans le budget de tokens
+        packed, sources = self._pack(results, question, system_prompt)
         
         # Obtenir la réponse du LLM via Mistral
-        answer = self.mistral.generate_response(context, question, system_prompt=system_prompt)
+        answer, usage = self.mistral.generate_response(packed.context, question, system_prompt=system_prompt)
         
-        # Préparer les sources
-        sources = []
-        for i, (doc, score) in enumerate(docs_with_scores):
-            sources.append({
-                "content": doc.page_content[:200] + "...",
-                "metadata": doc.metadata,
-                "score": float(score),
-                "index": i + 1
-            })
+        return {
+            "answer": answer,
+            "sources": sources,
+            "question": question,
+            "usage": usage
+        }
+    
+    async def aquery(self, question: str, k: int = 4, system_prompt: str = None) -> Dict:
+        """
+        Version asynchrone de query : la recherche tourne dans le pool de threads
+        borné et la génération utilise le client Mistral asynchrone
+        
+        Args:
+            question: Question de l'utilisateur
+            k: Nombre de documents à récupérer
+            system_prompt: Prompt système personnalisé (optionnel)
+            
+        Returns:
+            Dictionnaire avec la réponse et les sources
+        """
+        if self.indexer.vector_store is None:
+            return {
+                "answer": "Aucun document n'a été indexé. Veuillez d'abord uploader des documents.",
+                "sources": []
+            }
+        
+        # Récupérer les documents pertinents (embedding et FAISS hors boucle d'événements)
+        results = await run_in_executor(
+            retrieval_executor,
+            self.indexer.retrieve,
+            question,
+            k=k,
+            mode=config.retrieval_mode
+        )
+        
+        if not results:
+            return {
+                "answer": "Je n'ai pas trouvé d'informations pertinentes dans les documents indexés.",
+                "sources": []
+            }
+        
+        # Préparer le contexte dans le budget de tokens (hors boucle d'événements)
+        packed, sources = await run_in_executor(retrieval_executor, self._pack, results, question, system_prompt)
+        
+        # Obtenir la réponse du LLM via le client Mistral asynchrone
+        answer, usage = await self.mistral.agenerate_response(packed.context, question, system_prompt=system_prompt)
         
         return {
             "answer": answer,
             "sources": sources,
-            "question": question
+            "question": question,
+            "usage": usage
         }
     
     def chat(self, messages: List[Dict[str, str]], k: int = 4) -> Dict:
@@ -122,35 +165,230 @@ class RAGService:
             return empty_stream(), sources, {}
         
         # Récupérer les documents pertinents
-        docs_with_scores = self.indexer.search(question, k=k)
-        
+        results = self.indexer.retrieve(question, k=k, mode=config.retrieval_mode)
         
-        if not docs_with_scores:
+        if not results:
             def no_docs_stream():
                 yield "Je n'ai pas trouvé d'informations pertinentes dans les documents indexés."
             return no_docs_stream(), sources, {}
         
-        # Préparer le contexte des documents
-        context = "\n\n".join([
-            f"Document {i+1}:\n{doc.page_content}" 
-            for i, (doc, _) in enumerate(docs_with_scores)
-        ])
-        
-        # Préparer les sources
-        for i, (doc, score) in enumerate(docs_with_scores):
-            sources.append({
-                "content": doc.page_content[:200] + "...",
-                "metadata": doc.metadata,
-                "score": float(score),
-                "index": i + 1
-            })
+        # Préparer le contexte et l'historique dans le budget de tokens
+        packed, sources = self._pack(results, question, system_prompt, conversation_history)
         
         # Stream la réponse du LLM via Mistral avec l'historique
         response_stream, usage_container = self.mistral.generate_response_stream(
-            context, 
+            packed.context, 
             question, 
             system_prompt=system_prompt,
-            conversation_history=conversation_history
+            conversation_history=packed.history
         )
         
         return response_stream, sources, usage_container
+    
+    async def aquery_stream(self, question: str, k: int = 4, system_prompt: str = None, conversation_history: List[Dict] = None):
+        """
+        Version asynchrone de query_stream.
+        La recherche tourne dans le pool de threads borné et la génération
+        utilise le client Mistral asynchrone.
+        
+        Args:
+            question: Question de l'utilisateur
+            k: Nombre de documents à récupérer
+            system_prompt: Prompt système personnalisé (optionnel)
+            conversation_history: Historique de conversation (optionnel) - Liste de {role, content}
+            
+        Returns:
+            Tuple (AsyncIterator de chunks de réponse, Liste des sources, Usage container)
+            Le usage_container sera rempli après la fin du stream
+        """
+        sources = []
+        
+        if self.indexer.vector_store is None:
+            async def empty_stream():
+                yield "Aucun document n'a été indexé. Veuillez d'abord uploader des documents."
+            return empty_stream(), sources, {}
+        
+        # Embedding de la question (hors boucle d'événements)
+        question_embedding = await run_in_executor(retrieval_executor, self.indexer.embed_query, question)
+        
+        # Cache sémantique : seulement pour les questions sans historique,
+        # dont la réponse ne dépend que de l'index, du prompt système, de k et du mode de recherche
+        use_cache = config.response_cache_enabled and self.chatbot_id and not conversation_history
+        cache_key = (self.indexer.loaded_version, system_prompt or "", k, config.retrieval_mode)
+        if use_cache:
+            cached = response_cache.lookup(self.chatbot_id, cache_key, question_embedding)
+            if cached is not None:
+                return self._replay(cached.answer), list(cached.sources), {}
+        
+        # Récupérer les documents pertinents (FAISS hors boucle d'événements)
+        results = await run_in_executor(
+            retrieval_executor,
+            self.indexer.retrieve,
+            question,
+            k=k,
+            embedding=question_embedding,
+            mode=config.retrieval_mode
+        )
+        
+        if not results:
+            async def no_docs_stream():
+                yield "Je n'ai pas trouvé d'informations pertinentes dans les documents indexés."
+            return no_docs_stream(), sources, {}
+        
+        # Préparer le contexte et l'historique dans le budget de tokens (hors boucle d'événements)
+        packed, sources = await run_in_executor(
+            retrieval_executor,
+            self._pack,
+            results,
+            question,
+            system_prompt,
+            conversation_history
+        )
+        
+        # Stream la réponse du LLM via le client Mistral asynchrone
+        response_stream, usage_container = self.mistral.generate_response_stream_async(
+            packed.context, 
+            question, 
+            system_prompt=system_prompt,
+            conversation_history=packed.history
+        )
+        
+        if use_cache:
+            response_stream = self._store_on_completion(
+                response_stream,
+                cache_key,
+                question,
+                question_embedding,
+                sources,
+                packed.chunk_ids
+            )
+        
+        return response_stream, sources, usage_container
+    
+    async def aquery_batch(self, questions: List[str], k: int = 4, system_prompt: str = None, concurrency: int = None):
+        """
+        Répond à un lot de questions indépendantes (évaluation, tests de régression).
+        Les questions sont cherchées par fenêtres de `batch_query_retrieval_size`
+        (un seul appel au modèle d'embeddings et une seule recherche FAISS par fenêtre),
+        puis les appels au LLM partent en parallèle, au plus `concurrency` à la fois.
+        Le cache sémantique des réponses n'est pas utilisé : chaque question est régénérée.
+        
+        Args:
+            questions: Questions à poser
+            k: Nombre de documents à récupérer par question
+            system_prompt: Prompt système personnalisé (optionnel)
+            concurrency: Appels LLM simultanés (par défaut: config)
+            
+        Yields:
+            Un dictionnaire par question, dans l'ordre où les réponses arrivent :
+            {index, question, answer, sources, usage} ou {index, question, error}
+        """
+        semaphore = asyncio.Semaphore(concurrency or config.batch_query_concurrency)
+        window_size = max(1, config.batch_query_retrieval_size)
+        
+        async def answer(index: int, question: str, results: List[tuple]) -> Dict:
+            if not results:
+                return {
+                    "index": index,
+                    "question": question,
+                    "answer": "Je n'ai pas trouvé d'informations pertinentes dans les documents indexés.",
+                    "sources": [],
+                    "usage": {}
+                }
+            async with semaphore:
+                try:
+                    packed, sources = await run_in_executor(retrieval_executor, self._pack, results, question, system_prompt)
+                    response, usage = await self.mistral.agenerate_response(
+                        packed.context, question, system_prompt=system_prompt
+                    )
+                except Exception as e:
+                    return {"index": index, "question": question, "error": str(e)}
+            return {"index": index, "question": question, "answer": response, "sources": sources, "usage": usage}
+        
+        pending = set()
+        try:
+            for start in range(0, len(questions), window_size):
+                window = questions[start:start + window_size]
+                window_results = await run_in_executor(
+                    retrieval_executor,
+                    self.indexer.retrieve_batch,
+                    window,
+                    k=k,
+                    mode=config.retrieval_mode
+                )
+                for offset, (question, results) in enumerate(zip(window, window_results)):
+                    pending.add(asyncio.create_task(answer(start + offset, question, results)))
+                
+                # Pas plus d'une fenêtre d'avance sur les réponses (mémoire bornée)
+                while len(pending) > window_size:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        yield task.result()
+            
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        finally:
+            # Client déconnecté : abandonner les générations restantes
+            for task in pending:
+                task.cancel()
+    
+    def _pack(
+        self,
+        results: List[tuple],
+        question: str,
+        system_prompt: Optional[str] = None,
+        conversation_history: Optional[List[Dict]] = None
+    ) -> Tuple[PackedContext, List[Dict]]:
+        """
+        Assemble contexte et historique dans le budget `max_prompt_tokens`
+        
+        Args:
+            results: Tuples (id du chunk, document, score) de la recherche
+            question: Question de l'utilisateur
+            system_prompt: Prompt système personnalisé (optionnel)
+            conversation_history: Historique de conversation (optionnel)
+            
+        Returns:
+            Tuple (PackedContext, sources des chunks retenus)
+        """
+        packed = self.packer.pack(
+            results,
+            question,
+            system_prompt=system_prompt or config.system_prompt,
+            conversation_history=conversation_history
+        )
+        sources = [
+            {
+                "content": doc.page_content[:200] + "...",
+                "metadata": doc.metadata,
+                "score": float(score),
+                "index": i + 1
+            }
+            for i, (_, doc, score) in enumerate(packed.results)
+        ]
+        return packed, sources
+    
+    async def _store_on_completion(self, response_stream, cache_key, question, question_embedding, sources, chunk_ids):
+        """Relaie le stream puis met la réponse en cache si elle est arrivée jusqu'au bout"""
+        answer_parts = []
+        async for chunk in response_stream:
+            answer_parts.append(chunk)
+            yield chunk
+        
+        answer = "".join(answer_parts)
+        if answer:
+            response_cache.store(
+                self.chatbot_id,
+                cache_key,
+                question_embedding,
+                CachedResponse(question, answer, sources, chunk_ids)
+            )
+    
+    @staticmethod
+    async def _replay(answer: str):
+        """Rejoue une réponse en cache sous forme de chunks (mot par mot)"""
+        for piece in re.split(r"(?<=\s)(?=\S)", answer):
+            if piece:
+                yield piece
@@ -0,0 +1,212 @@
+"""
+Cache sémantique des réponses, par chatbot
+
+Une question dont l'embedding est très proche d'une question déjà traitée (même
+chatbot, même version d'index, même prompt système) reçoit la réponse en cache
+au lieu de repasser par la recherche et par Mistral.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import config
+
+
+class CachedResponse:
+    """Réponse mise en cache"""
+
+    def __init__(self, question: str, answer: str, sources: List[dict], chunk_ids: List[int]):
+        self.question = question
+        self.answer = answer
+        self.sources = sources
+        self.chunk_ids = chunk_ids
+        self.created_at = time.monotonic()
+
+
+class _ChatbotEntries:
+    """Entrées d'un chatbot : embeddings des questions empilés dans une matrice"""
+
+    def __init__(self):
+        self.keys: List[tuple] = []
+        self.vectors: List[np.ndarray] = []
+        self.responses: List[CachedResponse] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.vstack(self.vectors)
+        return self._matrix
+
+    def append(self, key: tuple, vector: np.ndarray, response: CachedResponse):
+        self.keys.append(key)
+        self.vectors.append(vector)
+        self.responses.append(response)
+        self._matrix = None
+
+    def remove(self, position: int):
+        del self.keys[position]
+        del self.vectors[position]
+        del self.responses[position]
+        self._matrix = None
+
+
+class SemanticResponseCache:
+    """Cache des réponses par similarité de question, avec TTL et limites de taille"""
+
+    def __init__(
+        self,
+        threshold: float,
+        ttl_seconds: float,
+        max_entries_per_chatbot: int,
+        max_chatbots: int
+    ):
+        """
+        Initialise le cache
+
+        Args:
+            threshold: Similarité cosinus minimale pour réutiliser une réponse
+            ttl_seconds: Durée de vie d'une réponse en cache
+            max_entries_per_chatbot: Nombre maximum de réponses gardées par chatbot
+            max_chatbots: Nombre maximum de chatbots ayant des réponses en cache
+        """
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_chatbot = max_entries_per_chatbot
+        self.max_chatbots = max_chatbots
+
+        self._chatbots: "OrderedDict[str, _ChatbotEntries]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def lookup(
+        self,
+        chatbot_id: str,
+        key: tuple,
+        question_embedding: List[float]
+    ) -> Optional[CachedResponse]:
+        """
+        Cherche une réponse à une question similaire
+
+        Args:
+            chatbot_id: ID du chatbot
+            key: Contexte de validité (version d'index en premier, prompt système, k, mode...)
+            question_embedding: Embedding normalisé de la question
+
+        Returns:
+            La réponse en cache, ou None
+        """
+        vector = np.asarray(question_embedding, dtype=np.float32)
+
+        with self._lock:
+            entries = self._chatbots.get(chatbot_id)
+            if entries is None or not entries.responses:
+                self.misses += 1
+                return None
+            self._chatbots.move_to_end(chatbot_id)
+
+            self._expire(entries)
+            if not entries.responses:
+                self.misses += 1
+                return None
+
+            similarities = entries.matrix() @ vector
+            for position in np.argsort(-similarities):
+                if similarities[position] < self.threshold:
+                    break
+                if entries.keys[position] == key:
+                    self.hits += 1
+                    return entries.responses[position]
+
+            self.misses += 1
+            return None
+
+    def store(
+        self,
+        chatbot_id: str,
+        key: tuple,
+        question_embedding: List[float],
+        response: CachedResponse
+    ):
+        """
+        Enregistre une réponse complète
+
+        Args:
+            chatbot_id: ID du chatbot
+            key: Contexte de validité (version d'index en premier, prompt système, k, mode...)
+            question_embedding: Embedding normalisé de la question
+            response: Réponse à mettre en cache
+        """
+        vector = np.asarray(question_embedding, dtype=np.float32)
+
+        with self._lock:
+            entries = self._chatbots.get(chatbot_id)
+            if entries is None:
+                entries = _ChatbotEntries()
+                self._chatbots[chatbot_id] = entries
+                while len(self._chatbots) > self.max_chatbots:
+                    _, evicted = self._chatbots.popitem(last=False)
+                    self.evictions += len(evicted.responses)
+            self._chatbots.move_to_end(chatbot_id)
+
+            # Les entrées d'une ancienne version d'index ne serviront plus
+            stale = [i for i, entry_key in enumerate(entries.keys) if entry_key[0] != key[0]]
+            for position in reversed(stale):
+                entries.remove(position)
+
+            entries.append(key, vector, response)
+            self.stores += 1
+
+            while len(entries.responses) > self.max_entries_per_chatbot:
+                entries.remove(0)
+                self.evictions += 1
+
+    def invalidate(self, chatbot_id: str):
+        """Supprime toutes les réponses en cache d'un chatbot"""
+        with self._lock:
+            self._chatbots.pop(chatbot_id, None)
+
+    def _expire(self, entries: _ChatbotEntries):
+        """Retire les réponses expirées (le verrou doit être détenu)"""
+        deadline = time.monotonic() - self.ttl_seconds
+        expired = [i for i, response in enumerate(entries.responses) if response.created_at < deadline]
+        for position in reversed(expired):
+            entries.remove(position)
+            self.expirations += 1
+
+    def get_stats(self) -> dict:
+        """
+        Retourne les métriques du cache
+
+        Returns:
+            Dictionnaire avec les statistiques
+        """
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = sum(len(chatbot.responses) for chatbot in self._chatbots.values())
+        return {
+            "chatbots": len(self._chatbots),
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+
+# Instance globale du cache de réponses
+response_cache = SemanticResponseCache(
+    threshold=config.response_cache_threshold,
+    ttl_seconds=config.response_cache_ttl_seconds,
+    max_entries_per_chatbot=config.response_cache_max_entries,
+    max_chatbots=config.response_cache_max_chatbots
+)
@@ -0,0 +1,28 @@
+"""
+Caches de la recherche : embeddings des requêtes et résultats exacts par version d'index
+"""
+import unicodedata
+
+from app.core.cache import LRUCache
+from app.core.config import config
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalise une requête pour que les variantes triviales partagent la même entrée
+    (casse, espaces, formes Unicode)
+
+    Args:
+        query: Requête brute
+
+    Returns:
+        Requête normalisée
+    """
+    return " ".join(unicodedata.normalize("NFKC", query).casefold().split())
+
+
+# (modèle, requête normalisée) -> embedding de la requête
+query_embedding_cache = LRUCache(max_size=config.query_embedding_cache_size)
+
+# (index, version de l'index, requête normalisée, k, seuil) -> [(id du chunk, score)]
+retrieval_cache = LRUCache(max_size=config.retrieval_cache_size)
@@ -0,0 +1,170 @@
+"""
+Index vectoriel chargé d'un chatbot : segments FAISS interrogés ensemble + chunk store
+"""
+import os
+from typing import Dict, List, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from app.core.config import config
+from app.documents.services.ann_index import INDEX_HNSW, configure_search, index_type_of
+from app.documents.services.chunk_store import ChunkStore
+
+INDEX_FILE = "index.faiss"
+
+
+def mmap_flags() -> int:
+    """Flags de lecture FAISS : mmap en lecture seule si activé dans la config"""
+    if not config.index_mmap:
+        return 0
+    # IO_FLAG_MMAP_IFC (versions récentes) mappe aussi les codes des index plats
+    return faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+
+def read_segment_index(segment_dir: str, mmap: bool = True) -> faiss.Index:
+    """
+    Ouvre l'index FAISS d'un segment
+
+    Args:
+        segment_dir: Dossier du segment
+        mmap: Projeter le fichier en mémoire (lecture seule) si la config l'autorise
+
+    Returns:
+        L'index FAISS (IndexIDMap), avec les paramètres de recherche appliqués
+    """
+    flags = mmap_flags() if mmap else 0
+    index = faiss.read_index(os.path.join(segment_dir, INDEX_FILE), flags)
+    configure_search(index)
+    return index
+
+
+def write_segment_index(segment_dir: str, index: faiss.Index):
+    """Écrit l'index FAISS d'un segment"""
+    os.makedirs(segment_dir, exist_ok=True)
+    faiss.write_index(index, os.path.join(segment_dir, INDEX_FILE))
+
+
+class Segment:
+    """Segment chargé : nom dans le manifeste et index FAISS"""
+
+    def __init__(self, name: str, index: faiss.Index, mmapped: bool):
+        self.name = name
+        self.index = index
+        self.mmapped = mmapped
+
+
+class VectorIndex:
+    """
+    Ensemble immuable de segments : un ajout produit un nouvel objet, les requêtes
+    en cours continuent sur l'ancien
+    """
+
+    def __init__(self, segments: List[Segment], chunk_store: ChunkStore):
+        """
+        Initialise l'index
+
+        Args:
+            segments: Segments chargés (le premier est le plus gros, issu du compactage)
+            chunk_store: Store des chunks référencés par les ids des segments
+        """
+        self.segments = segments
+        self.chunk_store = chunk_store
+
+    @property
+    def ntotal(self) -> int:
+        return sum(segment.index.ntotal for segment in self.segments)
+
+    @property
+    def d(self) -> int:
+        return self.segments[0].index.d
+
+    @property
+    def metric_type(self) -> int:
+        return self.segments[0].index.metric_type
+
+    @property
+    def index_type(self) -> str:
+        """Type de l'index principal (les segments récents sont des index plats)"""
+        return index_type_of(self.segments[0].index)
+
+    def with_segment(self, segment: Segment) -> "VectorIndex":
+        """Nouvel index comprenant un segment supplémentaire"""
+        return VectorIndex(self.segments + [segment], self.chunk_store)
+
+    def search(self, embedding: List[float], k: int) -> List[Tuple[int, float]]:
+        """
+        Recherche dans tous les segments et fusionne les k meilleurs résultats
+
+        Args:
+            embedding: Embedding de la requête
+            k: Nombre de résultats
+
+        Returns:
+            Liste de tuples (id du chunk, score), du plus proche au plus lointain
+        """
+        vector = np.asarray([embedding], dtype=np.float32)
+        hits = []
+        for segment in self.segments:
+            scores, ids = segment.index.search(vector, k)
+            hits.extend(
+                (int(chunk_id), float(score))
+                for score, chunk_id in zip(scores[0], ids[0])
+                if chunk_id != -1
+            )
+
+        # Distance L2 : plus petit = plus proche ; produit scalaire : l'inverse
+        descending = self.metric_type == faiss.METRIC_INNER_PRODUCT
+        hits.sort(key=lambda hit: hit[1], reverse=descending)
+        return hits[:k]
+
+    def search_batch(self, embeddings: List[List[float]], k: int) -> List[List[Tuple[int, float]]]:
+        """
+        Recherche plusieurs requêtes en une passe : un seul appel FAISS par segment
+        sur la matrice des embeddings (parallélisé en interne par FAISS)
+
+        Args:
+            embeddings: Embeddings des requêtes
+            k: Nombre de résultats par requête
+
+        Returns:
+            Pour chaque requête, liste de tuples (id du chunk, score), du plus proche au plus lointain
+        """
+        if not embeddings:
+            return []
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        hits = [[] for _ in range(len(matrix))]
+        for segment in self.segments:
+            scores, ids = segment.index.search(matrix, k)
+            for row, (row_scores, row_ids) in enumerate(zip(scores, ids)):
+                hits[row].extend(
+                    (int(chunk_id), float(score))
+                    for score, chunk_id in zip(row_scores, row_ids)
+                    if chunk_id != -1
+                )
+
+        descending = self.metric_type == faiss.METRIC_INNER_PRODUCT
+        for row_hits in hits:
+            row_hits.sort(key=lambda hit: hit[1], reverse=descending)
+        return [row_hits[:k] for row_hits in hits]
+
+    def get_documents(self, ids: List[int]) -> Dict[int, Document]:
+        """Lit les chunks des ids donnés"""
+        return self.chunk_store.get_many(ids)
+
+    def memory_bytes(self) -> int:
+        """
+        Estime la mémoire propre au processus : les segments projetés en mémoire
+        sont partagés via le cache de pages de l'OS et ne comptent que pour leurs ids
+        (et le graphe HNSW, toujours chargé)
+        """
+        total = 0
+        for segment in self.segments:
+            index = segment.index
+            total += index.ntotal * 8
+            if not segment.mmapped:
+                total += index.ntotal * index.d * 4
+            if index_type_of(index) == INDEX_HNSW:
+                total += index.ntotal * config.ann_hnsw_m * 2 * 4
+        return total
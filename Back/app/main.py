@@ -1,12 +1,30 @@
-from fastapi import FastAPI
+import asyncio
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.auth import routes as auth_routes
+from app.auth.utils import get_current_user_id, user_cache
+from app.chatbots.public_cache import public_chatbot_cache
 from app.documents import routes as documents_routes
 from app.chatbots import routes as chatbots_routes
 from app.core.mongodb import connect_to_mongo, close_mongo_connection
+from app.core.config import config
+from app.core.concurrency import shutdown_executors
+from app.core.mongo_metrics import command_metrics, mongo_timing_middleware
+from app.core.write_buffer import write_buffer
+from app.documents.services.embedding_registry import embedding_registry
+from app.documents.services.batch_embedder import get_throughput_stats
+from app.documents.services.embedding_cache import embedding_cache
+from app.documents.services.index_cache import index_cache
+from app.documents.services.response_cache import response_cache
+from app.documents.services.retrieval_cache import query_embedding_cache, retrieval_cache
+from app.documents.services.ingestion_jobs import ingestion_queue
+from app.documents.services.document_indexer import run_compaction_loop
 
 app = FastAPI(title="RAG Chatbot API")
 
+# Tâches de fond démarrées avec l'application
+background_tasks = []
+
 # Configuration CORS
 app.add_middleware(
     CORSMiddleware,
@@ -16,17 +34,38 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Temps passé dans MongoDB par route (voir /metrics)
+if config.mongo_monitoring:
+    app.middleware("http")(mongo_timing_middleware)
+
 
 @app.on_event("startup")
 async def startup_event():
     """Événement au démarrage de l'application"""
     await connect_to_mongo()
+    # Écritures différées des conversations et compteurs de tokens
+    await write_buffer.start()
+    # Charger le modèle d'embeddings une seule fois (hors de la boucle d'événements)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(
+        None, embedding_registry.warmup, config.embedding_model, config.embedding_device
+    )
+    # Démarrer les workers d'ingestion (et reprendre les jobs interrompus)
+    await ingestion_queue.start()
+    # Compactage périodique des segments d'index
+    background_tasks.append(asyncio.create_task(run_compaction_loop()))
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Événement à l'arrêt de l'application"""
+    for task in background_tasks:
+        task.cancel()
+    await ingestion_queue.stop()
+    # Écrire les conversations et compteurs en attente avant de fermer MongoDB
+    await write_buffer.stop()
     await close_mongo_connection()
+    shutdown_executors()
 
 
 app.include_router(auth_routes.router)
@@ -37,3 +76,22 @@ app.include_router(chatbots_routes.router)
 @app.get("/")
 async def root():
     return {"message": "RAG Chatbot API", "status": "running"}
+
+
+@app.get("/metrics")
+async def metrics(current_user_id: str = Depends(get_current_user_id)):
+    """Métriques internes du processus (caches, modèles chargés, routes...) : utilisateurs connectés seulement"""
+    return {
+        "embeddings": embedding_registry.get_stats(),
+        "embedding_throughput": get_throughput_stats(),
+        "embedding_cache": embedding_cache.get_stats(),
+        "index_cache": index_cache.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "retrieval_cache": retrieval_cache.get_stats(),
+        "query_embedding_cache": query_embedding_cache.get_stats(),
+        "user_cache": user_cache.get_stats(),
+        "public_chatbot_cache": public_chatbot_cache.get_stats(),
+        "ingestion": ingestion_queue.get_stats(),
+        "write_buffer": write_buffer.get_stats(),
+        "mongo": command_metrics.get_stats()
+    }
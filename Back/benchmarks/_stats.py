@@ -0,0 +1,12 @@
+"""
+Statistiques communes aux benchmarks
+"""
+
+
+def percentile(values, pct):
+    """Percentile simple (plus proche rang) ; NaN si aucune valeur"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
@@ -0,0 +1,111 @@
+"""
+Benchmark rappel / latence des index ANN (IVF-Flat, HNSW, IVF-PQ) face à l'index plat,
+sur un corpus synthétique de vecteurs normalisés regroupés en clusters.
+
+Usage (depuis le dossier Back):
+    python benchmarks/ann_benchmark.py --vectors 500000 --queries 1000 --k 4
+
+Pour chaque type d'index et chaque valeur de nprobe / efSearch, le script affiche
+le recall@k (par rapport à la recherche exacte), la latence p50/p99 par requête
+et le temps de construction.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from _stats import percentile  # noqa: E402
+from app.documents.services.ann_index import (  # noqa: E402
+    INDEX_FLAT, INDEX_HNSW, INDEX_IVF_FLAT, INDEX_IVF_PQ, build_index, configure_search
+)
+
+# Paramètres de recherche balayés pour chaque type d'index
+SWEEPS = {
+    INDEX_IVF_FLAT: ("nprobe", [1, 4, 16, 64]),
+    INDEX_IVF_PQ: ("nprobe", [1, 4, 16, 64]),
+    INDEX_HNSW: ("efSearch", [16, 32, 64, 128]),
+}
+
+
+def synthetic_corpus(vectors: int, queries: int, dimension: int, clusters: int, seed: int = 0):
+    """Vecteurs normalisés autour de centres aléatoires (proche d'embeddings de chunks)"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+
+    def sample(n):
+        points = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dimension)).astype(np.float32)
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(vectors), sample(queries)
+
+
+def measure(index, queries: np.ndarray, k: int):
+    """Recherche requête par requête (comme en production) et retourne (ids, latences en ms)"""
+    ids = np.empty((len(queries), k), dtype=np.int64)
+    latencies = []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids[i] = found[0]
+    return ids, latencies
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    """Proportion des k plus proches voisins exacts retrouvés"""
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rappel / latence des index ANN")
+    parser.add_argument("--vectors", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument(
+        "--types",
+        default=",".join([INDEX_IVF_FLAT, INDEX_HNSW, INDEX_IVF_PQ]),
+        help="Types d'index à comparer à l'index plat"
+    )
+    args = parser.parse_args()
+
+    print(f"Corpus synthétique: {args.vectors} vecteurs, dimension {args.dimension}")
+    corpus, queries = synthetic_corpus(args.vectors, args.queries, args.dimension, args.clusters)
+
+    start = time.perf_counter()
+    flat = build_index(corpus, INDEX_FLAT)
+    build_seconds = time.perf_counter() - start
+    truth, latencies = measure(flat, queries, args.k)
+
+    print(f"\n{'index':<10} {'paramètre':<14} {'recall@k':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'build (s)':>10}")
+    print(
+        f"{INDEX_FLAT:<10} {'-':<14} {1.0:>9.3f} {percentile(latencies, 50):>9.3f} "
+        f"{percentile(latencies, 99):>9.3f} {build_seconds:>10.1f}"
+    )
+
+    for index_type in args.types.split(","):
+        start = time.perf_counter()
+        index = build_index(corpus, index_type)
+        build_seconds = time.perf_counter() - start
+
+        parameter, values = SWEEPS[index_type]
+        for value in values:
+            if parameter == "nprobe":
+                configure_search(index, nprobe=value)
+            else:
+                configure_search(index, ef_search=value)
+            found, latencies = measure(index, queries, args.k)
+            print(
+                f"{index_type:<10} {f'{parameter}={value}':<14} {recall(found, truth):>9.3f} "
+                f"{percentile(latencies, 50):>9.3f} {percentile(latencies, 99):>9.3f} {build_seconds:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
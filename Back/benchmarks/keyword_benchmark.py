@@ -0,0 +1,105 @@
+"""
+Benchmark de l'index lexical BM25 (FTS5) du chunk store : construction incrémentale,
+taille sur disque et latence des requêtes sur un corpus synthétique.
+
+Usage (depuis le dossier Back):
+    python benchmarks/keyword_benchmark.py --chunks 1000000 --queries 500
+
+Les chunks suivent une distribution de Zipf sur un vocabulaire (mots très fréquents
+et termes rares), avec des codes produit / numéros d'erreur. Les requêtes mélangent
+un code et des mots courants. Le script compare la latence p50/p99 sans élagage,
+puis avec l'élagage des termes trop fréquents (`bm25_max_df_ratio`, `bm25_max_postings`).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import config  # noqa: E402
+from app.documents.services.chunk_store import ChunkStore  # noqa: E402
+from _stats import percentile  # noqa: E402
+
+
+def synthetic_chunks(count: int, vocabulary_size: int, words_per_chunk: int, seed: int = 0):
+    """Génère des chunks (Zipf sur le vocabulaire, un code produit par chunk)"""
+    rng = random.Random(seed)
+    vocabulary = [f"mot{i}" for i in range(vocabulary_size)]
+    cumulative, total = [], 0.0
+    for rank in range(vocabulary_size):
+        total += 1.0 / (rank + 1)
+        cumulative.append(total)
+    for i in range(count):
+        words = rng.choices(vocabulary, cum_weights=cumulative, k=words_per_chunk)
+        yield f"Référence XR-{i:07d} erreur E{i % 9973}: " + " ".join(words)
+
+
+def measure(store: ChunkStore, queries, k: int):
+    """Latences (ms) des recherches, une requête à la fois"""
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        store.keyword_search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de l'index lexical BM25")
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--vocabulary", type=int, default=50000)
+    parser.add_argument("--words", type=int, default=150, help="Mots par chunk")
+    parser.add_argument("--batch", type=int, default=5000, help="Chunks par ajout (comme une fenêtre d'ingestion)")
+    parser.add_argument("--k", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ChunkStore(os.path.join(directory, "chunks.db"))
+
+        # Construction incrémentale, par lots, comme pendant l'ingestion
+        start = time.perf_counter()
+        batch = []
+        for text in synthetic_chunks(args.chunks, args.vocabulary, args.words):
+            batch.append(text)
+            if len(batch) == args.batch:
+                store.commit(store.add(batch, [{"filename": "corpus.txt"}] * len(batch)))
+                batch = []
+        if batch:
+            store.commit(store.add(batch, [{"filename": "corpus.txt"}] * len(batch)))
+        build_seconds = time.perf_counter() - start
+        if not store.keyword_search_enabled:
+            print("FTS5 indisponible dans ce SQLite")
+            return
+
+        size_mb = sum(
+            os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+        ) / 1024 / 1024
+        print(f"{args.chunks} chunks indexés en {build_seconds:.1f}s ({args.chunks / build_seconds:.0f} chunks/s)")
+        print(f"Taille de la base (texte + index inversé): {size_mb:.0f} MB")
+
+        rng = random.Random(1)
+        queries = [
+            f"erreur E{rng.randrange(9973)} sur la référence XR-{rng.randrange(args.chunks):07d} mot0 mot1 mot{rng.randrange(100)}"
+            for _ in range(args.queries)
+        ]
+
+        print(f"\n{'élagage':<22} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+        settings = (
+            ("aucun", 1.0, args.chunks * args.words),
+            (f"df > {config.bm25_max_df_ratio:.0%}", config.bm25_max_df_ratio, args.chunks * args.words),
+            (f"+ {config.bm25_max_postings} postings", config.bm25_max_df_ratio, config.bm25_max_postings),
+        )
+        for label, ratio, max_postings in settings:
+            config.bm25_max_df_ratio = ratio
+            config.bm25_max_postings = max_postings
+            measure(store, queries[:20], args.k)  # Préchauffage du cache de pages
+            latencies = measure(store, queries, args.k)
+            print(f"{label:<22} {percentile(latencies, 50):>9.2f} {percentile(latencies, 99):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
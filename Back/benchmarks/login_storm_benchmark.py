@@ -0,0 +1,90 @@
+"""
+Benchmark : latence d'un chat en streaming pendant une rafale de connexions
+
+Usage (depuis le dossier Back):
+    python benchmarks/login_storm_benchmark.py --logins 200 --concurrency 50
+
+Simule dans une même boucle d'événements des chats en streaming (un token toutes
+les `--token-interval-ms`) et une rafale de connexions (vérification bcrypt au coût
+AUTH_BCRYPT_ROUNDS). Mesure le retard des tokens par rapport à leur échéance,
+d'abord sans connexions (référence), puis avec la vérification bcrypt appelée
+directement dans la coroutine (ancien comportement), puis avec `averify_password`
+(pool de threads `password_executor`).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.auth.utils import BCRYPT_ROUNDS, averify_password, pwd_context  # noqa: E402
+from app.core.config import config  # noqa: E402
+from _stats import percentile  # noqa: E402
+
+PASSWORD = "mot-de-passe-de-test"
+
+
+async def chat_stream(tokens: int, interval: float, delays: list):
+    """Chat simulé : attend chaque token et note son retard sur l'échéance (ms)"""
+    deadline = time.perf_counter()
+    for _ in range(tokens):
+        deadline += interval
+        await asyncio.sleep(max(0.0, deadline - time.perf_counter()))
+        delays.append((time.perf_counter() - deadline) * 1000)
+
+
+async def login_inline(hashed: str):
+    """Ancien comportement : bcrypt dans la boucle d'événements"""
+    pwd_context.verify(PASSWORD, hashed)
+
+
+async def login_pooled(hashed: str):
+    """bcrypt dans le pool dédié"""
+    await averify_password(PASSWORD, hashed)
+
+
+async def scenario(login, hashed: str, args) -> tuple:
+    """Lance les chats et la rafale de connexions ; retourne (retards des tokens, durée des connexions)"""
+    delays = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one_login():
+        async with semaphore:
+            await login(hashed)
+
+    chats = [
+        asyncio.create_task(chat_stream(args.tokens, args.token_interval_ms / 1000, delays))
+        for _ in range(args.chats)
+    ]
+    start = time.perf_counter()
+    if login is not None:
+        await asyncio.gather(*(one_login() for _ in range(args.logins)))
+    login_seconds = time.perf_counter() - start
+    await asyncio.gather(*chats)
+    return delays, login_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latence des chats pendant une rafale de connexions")
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50, help="Connexions simultanées")
+    parser.add_argument("--chats", type=int, default=20, help="Chats en streaming simultanés")
+    parser.add_argument("--tokens", type=int, default=300, help="Tokens par chat")
+    parser.add_argument("--token-interval-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    hashed = pwd_context.hash(PASSWORD)
+    print(f"bcrypt rounds: {BCRYPT_ROUNDS}, threads de hachage: {config.password_hash_workers}, "
+          f"{args.logins} connexions, {args.chats} chats\n")
+    print(f"{'scénario':<22} {'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9} {'connexions/s':>13}")
+
+    for label, login in (("sans connexions", None), ("bcrypt dans la boucle", login_inline), ("bcrypt dans le pool", login_pooled)):
+        delays, login_seconds = asyncio.run(scenario(login, hashed, args))
+        rate = f"{args.logins / login_seconds:>13.1f}" if login is not None else f"{'-':>13}"
+        print(f"{label:<22} {percentile(delays, 50):>9.2f} {percentile(delays, 99):>9.2f} {max(delays):>9.2f} {rate}")
+
+
+if __name__ == "__main__":
+    main()
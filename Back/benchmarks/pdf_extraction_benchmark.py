@@ -0,0 +1,121 @@
+"""
+Benchmark de l'extraction du texte des PDF : lecture séquentielle face à
+l'extraction parallèle par plages de pages (pool de processus).
+
+Usage (depuis le dossier Back):
+    python benchmarks/pdf_extraction_benchmark.py --pages 200,500,1000 --workers 2,4,8
+
+Les PDF sont générés (texte Helvetica, une quarantaine de lignes par page). Pour
+chaque taille, le script affiche le temps séquentiel, le temps parallèle pour chaque
+nombre de processus (pool déjà démarré) et vérifie que les pages sont identiques
+et dans le même ordre.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pypdf import PdfReader  # noqa: E402
+
+from app.core.config import config  # noqa: E402
+from app.documents.services.pdf_extraction import extract_pages, iter_pdf_pages  # noqa: E402
+
+WORDS = (
+    "manuel maintenance procédure erreur code produit référence installation réseau "
+    "configuration sécurité capteur moteur pression température calibration module "
+    "firmware version alarme diagnostic remplacement garantie contrôle vanne"
+).split()
+
+
+def generate_pdf(path: str, pages: int, lines_per_page: int = 45, seed: int = 0):
+    """Écrit un PDF minimal de `pages` pages de texte (sans dépendance externe)"""
+    rng = random.Random(seed)
+    page_numbers = [4 + 2 * i for i in range(pages)]
+    kids = " ".join(f"{number} 0 R" for number in page_numbers)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, number in enumerate(page_numbers):
+        lines = [
+            f"Page {i + 1} ligne {line + 1}: " + " ".join(rng.choice(WORDS) for _ in range(12))
+            for line in range(lines_per_page)
+        ]
+        stream = "BT /F1 10 Tf 40 810 Td 17 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        stream = stream.encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {number + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            f.write(b"%010d 00000 n \n" % offset)
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+
+
+def serial_extraction(path: str):
+    """Référence : toutes les pages lues dans le processus courant"""
+    return extract_pages(path, 0, len(PdfReader(path).pages))
+
+
+def parallel_extraction(path: str, executor: ProcessPoolExecutor):
+    """Extraction par plages de pages sur le pool donné"""
+    return [(page.metadata["page"], page.page_content) for page in iter_pdf_pages(path, executor=executor)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extraction PDF séquentielle / parallèle")
+    parser.add_argument("--pages", default="200,500,1000", help="Tailles des PDF générés (pages)")
+    parser.add_argument("--workers", default="2,4", help="Nombres de processus à comparer")
+    parser.add_argument("--shard", type=int, default=config.pdf_pages_per_shard, help="Pages par plage")
+    args = parser.parse_args()
+
+    config.pdf_pages_per_shard = args.shard
+    config.pdf_parallel_min_pages = 0
+    worker_counts = [int(value) for value in args.workers.split(",")]
+
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'pages':>6} {'mode':<14} {'temps (s)':>10} {'pages/s':>9} {'accélération':>13}")
+        for pages in [int(value) for value in args.pages.split(",")]:
+            path = os.path.join(directory, f"manuel_{pages}.pdf")
+            generate_pdf(path, pages)
+
+            start = time.perf_counter()
+            reference = serial_extraction(path)
+            serial_seconds = time.perf_counter() - start
+            print(f"{pages:>6} {'séquentiel':<14} {serial_seconds:>10.2f} {pages / serial_seconds:>9.0f} {1.0:>12.1f}x")
+
+            for workers in worker_counts:
+                config.pdf_extraction_workers = workers
+                with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                    # Démarrage des processus hors mesure
+                    list(executor.map(abs, range(workers)))
+                    start = time.perf_counter()
+                    result = parallel_extraction(path, executor)
+                    seconds = time.perf_counter() - start
+
+                assert result == reference, "Pages différentes ou dans le désordre"
+                print(
+                    f"{pages:>6} {f'{workers} processus':<14} {seconds:>10.2f} "
+                    f"{pages / seconds:>9.0f} {serial_seconds / seconds:>12.1f}x"
+                )
+
+
+if __name__ == "__main__":
+    main()
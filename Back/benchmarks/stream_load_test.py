@@ -0,0 +1,89 @@
+"""
+Test de charge du streaming SSE public : mesure le time-to-first-token (TTFT)
+en fonction du nombre de requêtes concurrentes.
+
+Usage:
+    pip install httpx
+    python benchmarks/stream_load_test.py --share-token <token> --levels 1,10,50,100,200
+
+Le p99 du TTFT doit rester stable quand la concurrence augmente : si un stream
+bloque la boucle d'événements, il grimpe linéairement.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+from _stats import percentile
+
+
+async def one_request(client: httpx.AsyncClient, url: str, question: str) -> tuple:
+    """Envoie une question et retourne (ttft, durée totale) en secondes"""
+    start = time.perf_counter()
+    ttft = None
+    async with client.stream("POST", url, json={"question": question}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            payload = line[len("data: "):]
+            if payload == "[DONE]":
+                break
+            if ttft is None and json.loads(payload).get("type") == "answer":
+                ttft = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return (ttft if ttft is not None else total), total
+
+
+async def run_level(base_url: str, share_token: str, question: str, concurrency: int, rounds: int) -> dict:
+    """Lance `concurrency` streams simultanés, `rounds` fois"""
+    url = f"{base_url}/chatbots/public/{share_token}/query"
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    ttfts, totals, errors = [], [], 0
+
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        for _ in range(rounds):
+            results = await asyncio.gather(
+                *[one_request(client, url, question) for _ in range(concurrency)],
+                return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    errors += 1
+                else:
+                    ttfts.append(result[0])
+                    totals.append(result[1])
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(ttfts) + errors,
+        "errors": errors,
+        "ttft_p50_ms": round(statistics.median(ttfts) * 1000, 1) if ttfts else None,
+        "ttft_p99_ms": round(percentile(ttfts, 99) * 1000, 1) if ttfts else None,
+        "total_p50_ms": round(statistics.median(totals) * 1000, 1) if totals else None,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--share-token", required=True)
+    parser.add_argument("--question", default="Quels sont les points principaux du document ?")
+    parser.add_argument("--levels", default="1,10,50,100")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'concurrence':>12} {'requêtes':>9} {'erreurs':>8} {'TTFT p50':>10} {'TTFT p99':>10} {'total p50':>10}")
+    for level in [int(x) for x in args.levels.split(",")]:
+        stats = await run_level(args.base_url, args.share_token, args.question, level, args.rounds)
+        print(
+            f"{stats['concurrency']:>12} {stats['requests']:>9} {stats['errors']:>8} "
+            f"{stats['ttft_p50_ms']:>9}ms {stats['ttft_p99_ms']:>9}ms {stats['total_p50_ms']:>9}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
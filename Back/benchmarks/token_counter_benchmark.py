@@ -0,0 +1,78 @@
+"""
+Micro-benchmarks du comptage de tokens (app.core.token_counter)
+
+Usage (depuis le dossier Back):
+    python benchmarks/token_counter_benchmark.py --texts 1000 --chars 1000
+
+Compare le coût par appel de l'ancien comptage (tokenizer résolu à chaque appel via
+`tiktoken.encoding_for_model`) au tokenizer mis en cache, puis le comptage texte par
+texte à `count_tokens_batch` (encode_batch multi-threads).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import tiktoken
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import config  # noqa: E402
+from app.core.token_counter import DEFAULT_MODEL, count_tokens, count_tokens_batch, get_encoding  # noqa: E402
+
+WORDS = (
+    "le la les un une des chatbot document question réponse index recherche modèle "
+    "contexte utilisateur paramètre configuration erreur procédure installation"
+).split()
+
+
+def uncached_count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Comptage d'avant le cache : le tokenizer est résolu à chaque appel"""
+    encoding = tiktoken.encoding_for_model(model)
+    return len(encoding.encode(text))
+
+
+def bench(label: str, func, repeat: int, calls: int):
+    """Affiche le meilleur temps moyen par appel (µs) sur `repeat` essais"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<42} {best / calls * 1e6:>10.1f} µs/texte")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks du comptage de tokens")
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--chars", type=int, default=1000, help="Taille approximative des textes")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    texts = []
+    for _ in range(args.texts):
+        words = []
+        while sum(len(word) + 1 for word in words) < args.chars:
+            words.append(rng.choice(WORDS))
+        texts.append(" ".join(words))
+    short_texts = [text[:20] for text in texts]
+
+    get_encoding()  # Chargement initial hors mesure
+    print(f"{args.texts} textes, tokenizer: {config.tokenizer}, threads: {config.tokenizer_threads}\n")
+
+    bench("avant: encoding_for_model + encode (20 car.)",
+          lambda: [uncached_count_tokens(text) for text in short_texts], args.repeat, args.texts)
+    bench("après: count_tokens (20 car.)",
+          lambda: [count_tokens(text) for text in short_texts], args.repeat, args.texts)
+    bench(f"avant: encoding_for_model + encode ({args.chars} car.)",
+          lambda: [uncached_count_tokens(text) for text in texts], args.repeat, args.texts)
+    bench(f"après: count_tokens ({args.chars} car.)",
+          lambda: [count_tokens(text) for text in texts], args.repeat, args.texts)
+    bench(f"après: count_tokens_batch ({args.chars} car.)",
+          lambda: count_tokens_batch(texts), args.repeat, args.texts)
+
+
+if __name__ == "__main__":
+    main()
@@ -79,9 +79,25 @@ function ChatbotDetail({ chatbot, onBack, onUpdate }) {
           headers: { 'Content-Type': 'multipart/form-data' }
         }
       )
-      onUpdate(response.data)
       setFile(null)
       document.getElementById('fileInput').value = ''
+
+      // L'indexation tourne en arrière-plan : suivre la progression du job
+      let job = response.data
+      while (job.status === 'pending' || job.status === 'running') {
+        setUploadMessage(`⏳ Indexation en cours... ${Math.round(job.progress * 100)}%`)
+        await new Promise(resolve => setTimeout(resolve, 1000))
+        const jobResponse = await axios.get(`/chatbots/${chatbot.id}/jobs/${job.id}`)
+        job = jobResponse.data
+      }
+
+      if (job.status === 'failed') {
+        setUploadMessage(`❌ Erreur: ${job.error}`)
+        return
+      }
+
+      const chatbotResponse = await axios.get(`/chatbots/${chatbot.id}`)
+      onUpdate(chatbotResponse.data)
       setUploadMessage('✅ Document indexé avec succès!')
     } catch (error) {
       setUploadMessage(`❌ Erreur: ${error.response?.data?.detail || error.message}`)
@@ -90,6 +106,22 @@ function ChatbotDetail({ chatbot, onBack, onUpdate }) {
     }
   }
 
+  const handleDeleteDocument = async (filename) => {
+    if (!confirm(`Supprimer le document "${filename}" ? Ses passages ne seront plus utilisés pour répondre.`)) {
+      return
+    }
+
+    try {
+      await axios.delete(`/chatbots/${chatbot.id}/documents/${encodeURIComponent(filename)}`)
+      const chatbotResponse = await axios.get(`/chatbots/${chatbot.id}`)
+      onUpdate(chatbotResponse.data)
+      setUploadMessage('✅ Document supprimé!')
+      setTimeout(() => setUploadMessage(''), 3000)
+    } catch (error) {
+      setUploadMessage(`❌ Erreur: ${error.response?.data?.detail || error.message}`)
+    }
+  }
+
   const handleAskQuestion = async () => {
     if (!question.trim()) return
 
@@ -378,6 +410,13 @@ function ChatbotDetail({ chatbot, onBack, onUpdate }) {
                           {doc.chunks_count && ` • ${doc.chunks_count} chunks`}
                         </span>
                       </div>
+                      <button
+                        onClick={() => handleDeleteDocument(doc.filename)}
+                        className="doc-delete-btn"
+                        title="Supprimer le document"
+                      >
+                        🗑️
+                      </button>
                     </li>
                   ))}
                 </ul>